@@ -0,0 +1,86 @@
+"""Runtime of tight while loops with and without fused compare-and-branch.
+
+    poetry run python benchmarks/branch_bench.py [iterations]
+
+Compiles a few loops whose time goes mostly to their conditions at -O1,
+once storing every comparison as a Bool that the branch then tests, and
+once jumping on the flags of the comparison directly. Reports the number of
+instructions in the generated assembly and the best wall time of five runs.
+"""
+import os
+import sys
+import tempfile
+import textwrap
+
+from compiler.assembler import assemble
+from compiler.assembly_generator import generate_assembly
+from compiler.ir_generator import generate_ir
+from compiler.optimizer import optimize
+from compiler.parser import parse
+from compiler.symtab import SymTab, root_types, top_level_symtab
+from compiler.tokenizer import tokenize
+from compiler.type_checker import typecheck
+
+from runtime_bench import count_instructions, run_best
+
+
+def loop_programs(iterations: int) -> dict[str, str]:
+    # Variable declarations must start a line or follow '{' or ';'
+    programs = {
+        'count_up': f'''
+            var i = 0;
+            while i < {iterations} do i = i + 1;
+            i
+        ''',
+        'count_down': f'''
+            var i = {iterations};
+            while not (i <= 0) do i = i - 1;
+            i
+        ''',
+        'branch_in_loop': f'''
+            var i = 0;
+            var odd = 0;
+            while i != {iterations} do {{
+                if i % 2 == 1 then odd = odd + 1;
+                i = i + 1;
+            }}
+            odd
+        ''',
+        'nested_loops': f'''
+            var total = 0;
+            var i = 0;
+            while i < {int(iterations ** 0.5)} do {{
+                var j = i;
+                while j > 0 do {{
+                    j = j - 1;
+                    total = total + 1;
+                }}
+                i = i + 1;
+            }}
+            total
+        ''',
+    }
+    return {name: textwrap.dedent(source) for name, source in programs.items()}
+
+
+def main() -> None:
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000_000
+
+    print(f'{"program":<20} {"instructions":>17} {"time (s)":>17}')
+    with tempfile.TemporaryDirectory(prefix='branch_bench_') as workdir:
+        for name, source in loop_programs(iterations).items():
+            module = parse(tokenize(source))
+            typecheck(module, SymTab(locals=dict(top_level_symtab)))
+            instructions = {fun: optimize(insns, 1) for fun, insns in generate_ir(root_types, module).items()}
+            columns = []
+            for fuse_branches in [False, True]:
+                asm_code = generate_assembly(instructions, peephole=True, fuse_branches=fuse_branches)
+                executable = os.path.join(workdir, f'{name}_{fuse_branches}')
+                assemble(asm_code, executable, workdir)
+                columns.append((count_instructions(asm_code)[0], run_best(executable)))
+            (before_insns, before_time), (after_insns, after_time) = columns
+            print(f'{name:<20} {before_insns:>8} -> {after_insns:<6} {before_time:>8.3f} -> {after_time:.3f}')
+
+
+if __name__ == '__main__':
+    main()
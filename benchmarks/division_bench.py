@@ -0,0 +1,100 @@
+"""Runtime of loops full of `*`, `/` and `%` by constants, with and without
+shift, `lea` and reciprocal multiplication sequences for them.
+
+    poetry run python benchmarks/division_bench.py [iterations]
+
+Compiles each loop at -O1, once with every multiplication and division done by
+imulq and idivq, and once with the intrinsics told which operands are constants.
+Reports the number of idivq instructions in the generated assembly and the best wall
+time of five runs.
+"""
+import os
+import sys
+import tempfile
+import textwrap
+
+from compiler.assembler import assemble
+from compiler.assembly_generator import generate_assembly
+from compiler.ir_generator import generate_ir
+from compiler.optimizer import optimize_module
+from compiler.parser import parse
+from compiler.symtab import SymTab, root_types, top_level_symtab
+from compiler.tokenizer import tokenize
+from compiler.type_checker import typecheck
+
+from runtime_bench import run_best
+
+
+def division_programs(iterations: int) -> dict[str, str]:
+    # Variable declarations must start a line or follow '{' or ';'
+    programs = {
+        'digit_sum': f'''
+            var s = 0;
+            var i = 0;
+            while i < {iterations} do {{
+                var n = i;
+                while n > 0 do {{
+                    s = s + n % 10;
+                    n = n / 10;
+                }}
+                i = i + 1;
+            }}
+            s
+        ''',
+        'hash_mix': f'''
+            var h = 17;
+            var i = 0;
+            while i < {iterations} do {{
+                h = (h * 31 + i % 7) % 1000003;
+                i = i + 1;
+            }}
+            h
+        ''',
+        'power_of_two': f'''
+            var s = 0;
+            var i = -{iterations // 2};
+            while i < {iterations // 2} do {{
+                s = s + i / 16 + i % 8 + i * 4;
+                i = i + 1;
+            }}
+            s
+        ''',
+        'lcg_modulo': f'''
+            var x = 12345;
+            var buckets = 0;
+            var i = 0;
+            while i < {iterations} do {{
+                x = (x * 1103515245 + 12345) % 2147483648;
+                buckets = buckets + x % 3 + x / 1000 % 5;
+                i = i + 1;
+            }}
+            buckets
+        ''',
+    }
+    return {name: textwrap.dedent(source) for name, source in programs.items()}
+
+
+def main() -> None:
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+    programs = division_programs(iterations)
+    programs['digit_sum'] = division_programs(iterations // 10)['digit_sum']
+
+    print(f'{"program":<20} {"idivq":>12} {"time (s)":>17}')
+    with tempfile.TemporaryDirectory(prefix='division_bench_') as workdir:
+        for name, source in programs.items():
+            module = parse(tokenize(source))
+            typecheck(module, SymTab(locals=dict(top_level_symtab)))
+            instructions = optimize_module(generate_ir(root_types, module), 1)
+            columns = []
+            for specialize_constants in [False, True]:
+                asm_code = generate_assembly(instructions, peephole=True, specialize_constants=specialize_constants)
+                executable = os.path.join(workdir, f'{name}_{specialize_constants}')
+                assemble(asm_code, executable, workdir)
+                divisions = sum(1 for line in asm_code.split('\n') if line.strip().startswith('idivq'))
+                columns.append((divisions, run_best(executable)))
+            (before_divs, before_time), (after_divs, after_time) = columns
+            print(f'{name:<20} {before_divs:>4} -> {after_divs:<4} {before_time:>8.3f} -> {after_time:.3f}')
+
+
+if __name__ == '__main__':
+    main()
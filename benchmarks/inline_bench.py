@@ -0,0 +1,102 @@
+"""Calls, instruction counts and runtime with and without inlining.
+
+    poetry run python benchmarks/inline_bench.py [iterations]
+
+Compiles the programs of test_programs/functions.txt, and a few generated
+loops that call small functions, at -O1 and at -O2, which inlines small
+functions into their callers. Reports the number of call instructions and of
+all instructions in the generated assembly, and the best wall time of five
+runs. Programs that read input are skipped.
+"""
+import os
+import sys
+import tempfile
+import textwrap
+
+from compiler.assembler import assemble
+from compiler.assembly_generator import generate_assembly
+from compiler.ir_generator import generate_ir
+from compiler.optimizer import optimize_module
+from compiler.parser import parse
+from compiler.symtab import SymTab, root_types, top_level_symtab
+from compiler.tokenizer import tokenize
+from compiler.type_checker import typecheck
+
+from runtime_bench import count_instructions, heavy_programs, run_best
+
+
+def function_programs() -> dict[str, str]:
+    programs = {}
+    with open(os.path.join(os.path.dirname(__file__), '..', 'test_programs', 'functions.txt')) as f:
+        cases = f.read().split('---')
+    for number, case in enumerate(cases, start=1):
+        lines = [line for line in case.split('\n') if not line.startswith(('prints ', 'input '))]
+        if 'read_int' not in case:
+            programs[f'functions_{number}'] = '\n'.join(lines)
+    return programs
+
+
+def call_programs(iterations: int) -> dict[str, str]:
+    # Variable declarations must start a line or follow '{' or ';'
+    programs = {
+        'helpers': f'''
+            fun clamp(x: Int, low: Int, high: Int): Int {{
+                if x < low then low else if x > high then high else x
+            }}
+            fun abs(x: Int): Int {{
+                if x < 0 then -x else x
+            }}
+            var s = 0;
+            var i = 0;
+            while i < {iterations} do {{
+                s = s + clamp(abs(i % 200 - 100), 10, 90);
+                i = i + 1;
+            }}
+            s
+        ''',
+        'nested_calls': f'''
+            fun square(x: Int): Int {{
+                return x * x
+            }}
+            fun norm(x: Int, y: Int): Int {{
+                return square(x) + square(y)
+            }}
+            var s = 0;
+            var i = 0;
+            while i < {iterations} do {{
+                s = (s + norm(i % 100, i % 37)) % 1000003;
+                i = i + 1;
+            }}
+            s
+        ''',
+    }
+    return {name: textwrap.dedent(source) for name, source in programs.items()}
+
+
+def main() -> None:
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+    heavy = heavy_programs(iterations)
+    programs = function_programs() | call_programs(iterations) | {'call_loop': heavy['call_loop']}
+
+    print(f'{"program":<20} {"calls":>12} {"instructions":>17} {"time (s)":>17}')
+    with tempfile.TemporaryDirectory(prefix='inline_bench_') as workdir:
+        for name, source in programs.items():
+            module = parse(tokenize(source))
+            typecheck(module, SymTab(locals=dict(top_level_symtab)))
+            unoptimized = generate_ir(root_types, module)
+            columns = []
+            for level in [1, 2]:
+                asm_code = generate_assembly(optimize_module(unoptimized, level), peephole=True)
+                executable = os.path.join(workdir, f'{name}_O{level}')
+                assemble(asm_code, executable, workdir)
+                calls = sum(1 for line in asm_code.split('\n') if line.strip().startswith('call '))
+                columns.append((calls, count_instructions(asm_code)[0], run_best(executable)))
+            (before_calls, before_insns, before_time), (after_calls, after_insns, after_time) = columns
+            print(
+                f'{name:<20} {before_calls:>4} -> {after_calls:<4} {before_insns:>8} -> {after_insns:<6}'
+                f' {before_time:>8.3f} -> {after_time:.3f}'
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Instruction counts and runtime of the test programs at each optimization level.
+
+    poetry run python benchmarks/optimization_bench.py [iterations]
+
+Compiles every program in test_programs, and the generated loops of
+runtime_bench.py, at -O0, -O1 and -O2. Reports the number of IR instructions
+and copies, the number of assembly instructions and the best wall time of
+five runs. Programs that read input are skipped.
+"""
+import os
+import sys
+import tempfile
+
+from compiler import ir
+from compiler.assembler import assemble
+from compiler.assembly_generator import generate_assembly
+from compiler.ir_generator import generate_ir
+from compiler.optimizer import optimization_levels, optimize_module
+from compiler.parser import parse
+from compiler.symtab import SymTab, root_types, top_level_symtab
+from compiler.tokenizer import tokenize
+from compiler.type_checker import typecheck
+
+from runtime_bench import count_instructions, heavy_programs, run_best
+
+
+def test_programs() -> dict[str, str]:
+    programs = {}
+    directory = os.path.join(os.path.dirname(__file__), '..', 'test_programs')
+    for filename in sorted(os.listdir(directory)):
+        with open(os.path.join(directory, filename)) as f:
+            cases = f.read().split('---')
+        for number, case in enumerate(cases, start=1):
+            lines = [line for line in case.split('\n') if not line.startswith(('prints ', 'input '))]
+            if 'read_int' not in case:
+                programs[f'{filename[:-4]}_{number}'] = '\n'.join(lines)
+    return programs
+
+
+def main() -> None:
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+    programs = test_programs() | heavy_programs(iterations)
+    levels = ' / '.join(f'-O{level}' for level in optimization_levels)
+
+    print(f'{"program":<20} {"IR instructions":>22} {"IR copies":>18} {"asm instructions":>20} {"time (s)":>24}')
+    print(f'{"":<20} {levels:>22}')
+    totals = [[0, 0, 0, 0.0] for _ in optimization_levels]
+    with tempfile.TemporaryDirectory(prefix='optimization_bench_') as workdir:
+        for name, source in programs.items():
+            module = parse(tokenize(source))
+            typecheck(module, SymTab(locals=dict(top_level_symtab)))
+            unoptimized = generate_ir(root_types, module)
+            columns = []
+            for level, total in zip(optimization_levels, totals):
+                instructions = optimize_module(unoptimized, level)
+                all_instructions = [insn for insns in instructions.values() for insn in insns]
+                asm_code = generate_assembly(instructions, peephole=level >= 1)
+                executable = os.path.join(workdir, f'{name}_O{level}')
+                assemble(asm_code, executable, workdir)
+                column = (
+                    len(all_instructions),
+                    sum(1 for insn in all_instructions if isinstance(insn, ir.Copy)),
+                    count_instructions(asm_code)[0],
+                    run_best(executable)
+                )
+                for i, value in enumerate(column):
+                    total[i] += value
+                columns.append(column)
+            print(f'{name:<20} ' + ' '.join(
+                f'{" / ".join(f"{c[i]:.3f}" if i == 3 else str(c[i]) for c in columns):>{width}}'
+                for i, width in enumerate([22, 18, 20, 24])
+            ))
+
+    print(f'{"total":<20} ' + ' '.join(
+        f'{" / ".join(f"{t[i]:.3f}" if i == 3 else str(t[i]) for t in totals):>{width}}'
+        for i, width in enumerate([22, 18, 20, 24])
+    ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""System calls and runtime of programs that print a lot.
+
+    poetry run python benchmarks/output_bench.py [iterations]
+
+Compiles each program at -O1 and runs it with its output going to a pipe.
+Reports the number of values printed, the number of write system calls the
+program made, read from /proc/<pid>/io once it has exited, and the best wall
+time of five runs. An unbuffered runtime makes one write per value printed.
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import time
+
+from compiler.assembler import assemble
+from compiler.assembly_generator import generate_assembly
+from compiler.ir_generator import generate_ir
+from compiler.optimizer import optimize_module
+from compiler.parser import parse
+from compiler.symtab import SymTab, root_types, top_level_symtab
+from compiler.tokenizer import tokenize
+from compiler.type_checker import typecheck
+
+
+def print_programs(iterations: int) -> dict[str, tuple[str, int]]:
+    """Returns each program with the number of values it prints."""
+    # Variable declarations must start a line or follow '{' or ';'
+    programs = {
+        'print_ints': (f'''
+            var i = 0;
+            while i < {iterations} do {{
+                print_int(i * 7919 - 1000000);
+                i = i + 1;
+            }}
+        ''', iterations),
+        'print_bools': (f'''
+            var i = 0;
+            while i < {iterations} do {{
+                print_bool(i % 3 == 0);
+                i = i + 1;
+            }}
+        ''', iterations),
+        'print_table': (f'''
+            var i = 0;
+            while i < {iterations // 100} do {{
+                var j = 0;
+                while j < 100 do {{
+                    print_int(i * j);
+                    j = j + 1;
+                }}
+                i = i + 1;
+            }}
+        ''', iterations // 100 * 100),
+    }
+    return {name: (textwrap.dedent(source), prints) for name, (source, prints) in programs.items()}
+
+
+def count_writes(executable: str) -> int:
+    process = subprocess.Popen([executable], stdout=subprocess.PIPE)
+    assert process.stdout is not None
+    process.stdout.read()
+    # Waits for the exit without reaping the process, so that its counters stay readable
+    os.waitid(os.P_PID, process.pid, os.WEXITED | os.WNOWAIT)
+    with open(f'/proc/{process.pid}/io') as f:
+        counters = dict(line.split(': ') for line in f.read().splitlines())
+    process.wait()
+    return int(counters['syscw'])
+
+
+def run_best_piped(executable: str, runs: int = 5) -> float:
+    best = float('inf')
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([executable], check=True, stdout=subprocess.PIPE)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+
+    print(f'{"program":<16} {"prints":>10} {"write calls":>12} {"time (s)":>10}')
+    with tempfile.TemporaryDirectory(prefix='output_bench_') as workdir:
+        for name, (source, prints) in print_programs(iterations).items():
+            module = parse(tokenize(source))
+            typecheck(module, SymTab(locals=dict(top_level_symtab)))
+            instructions = optimize_module(generate_ir(root_types, module), 1)
+            executable = os.path.join(workdir, name)
+            assemble(generate_assembly(instructions, peephole=True), executable, workdir)
+            print(f'{name:<16} {prints:>10} {count_writes(executable):>12} {run_best_piped(executable):>10.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""Parser throughput benchmark on deeply nested arithmetic.
+
+    poetry run python benchmarks/parser_bench.py [expression_count] [depth]
+"""
+import gc
+import random
+import sys
+import time
+
+from compiler.parser import parse
+from compiler.tokenizer import tokenize
+
+operators = ['+', '-', '*', '/', '%', '<', '>', '==', 'and', 'or']
+# Parenthesized expressions are parsed from the comparison level down
+parenthesized_operators = ['+', '-', '*', '/', '%', '<', '>']
+
+
+def generate_expression(rng: random.Random, depth: int, ops: list[str] = operators) -> str:
+    if depth == 0:
+        return rng.choice(['1', 'x', '42', 'y', 'true'])
+    left = generate_expression(rng, depth - 1, ops)
+    if rng.random() < 0.3:
+        right = generate_expression(rng, rng.randrange(depth), parenthesized_operators)
+        return f'-{left} {rng.choice(ops)} ({right})'
+    right = generate_expression(rng, rng.randrange(depth), ops)
+    return f'{left} {rng.choice(ops)} {right}'
+
+
+def generate_source(expression_count: int, depth: int) -> str:
+    rng = random.Random(1)
+    return '{\n' + ';\n'.join(
+        f'x = {generate_expression(rng, depth)}' for _ in range(expression_count)
+    ) + '\n}'
+
+
+def main() -> None:
+    expression_count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    depth = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    tokens = tokenize(generate_source(expression_count, depth))
+
+    best = float('inf')
+    for _ in range(10):
+        gc.collect()
+        gc.disable()
+        start = time.perf_counter()
+        parse(tokens)
+        best = min(best, time.perf_counter() - start)
+        gc.enable()
+    print(f'{len(tokens)} tokens in {best:.3f} s, {len(tokens) / best:,.0f} tokens/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""Runtime of compiled loops with and without register allocation.
+
+    poetry run python benchmarks/runtime_bench.py [iterations]
+
+Runs the while loop programs from test_programs and a few heavier generated
+loops. Reports the best wall time of five runs and the number of instructions
+and memory operands in the generated assembly of each program.
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import time
+
+from compiler.assembler import assemble
+from compiler.assembly_generator import generate_assembly
+from compiler.ir_generator import generate_ir
+from compiler.parser import parse
+from compiler.symtab import SymTab, root_types, top_level_symtab
+from compiler.tokenizer import tokenize
+from compiler.type_checker import typecheck
+
+
+def heavy_programs(iterations: int) -> dict[str, str]:
+    # Variable declarations must start a line or follow '{' or ';'
+    programs = {
+        'sum_loop': f'''
+            var s = 0;
+            var i = 0;
+            while i < {iterations} do {{
+                s = s + i % 7;
+                i = i + 1;
+            }}
+            s
+        ''',
+        'call_loop': f'''
+            fun step(x: Int, y: Int): Int {{
+                return (x * 3 + y) % 1000003
+            }}
+            var x = 1;
+            var i = 0;
+            while i < {iterations // 4} do {{
+                x = step(x, i);
+                i = i + 1;
+            }}
+            x
+        ''',
+        'nested_loops': f'''
+            var total = 0;
+            var i = 0;
+            while i < {int(iterations ** 0.5)} do {{
+                var j = 0;
+                while j < {int(iterations ** 0.5)} do {{
+                    if (i + j) % 3 == 0 then total = total + 1;
+                    j = j + 1;
+                }}
+                i = i + 1;
+            }}
+            total
+        ''',
+    }
+    return {name: textwrap.dedent(source) for name, source in programs.items()}
+
+
+def test_program_loops() -> dict[str, str]:
+    programs = {}
+    directory = os.path.join(os.path.dirname(__file__), '..', 'test_programs')
+    for filename in sorted(os.listdir(directory)):
+        with open(os.path.join(directory, filename)) as f:
+            cases = f.read().split('---')
+        for number, case in enumerate(cases, start=1):
+            lines = [line for line in case.split('\n') if not line.startswith(('prints ', 'input '))]
+            if 'while' in case and 'read_int' not in case:
+                programs[f'{filename[:-4]}_{number}'] = '\n'.join(lines)
+    return programs
+
+
+def count_instructions(asm_code: str) -> tuple[int, int]:
+    instructions = [
+        line.strip() for line in asm_code.split('\n')
+        if line.strip() and not line.strip().startswith(('#', '.')) and not line.strip().endswith(':')
+    ]
+    return len(instructions), sum(1 for line in instructions if '(%rbp)' in line)
+
+
+def run_best(executable: str, runs: int = 5) -> float:
+    best = float('inf')
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([executable], check=True, stdout=subprocess.DEVNULL)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+    programs = test_program_loops() | heavy_programs(iterations)
+
+    print(f'{"program":<20} {"instructions":>17} {"memory operands":>17} {"time (s)":>17}')
+    with tempfile.TemporaryDirectory(prefix='runtime_bench_') as workdir:
+        for name, source in programs.items():
+            columns = []
+            for allocate in [False, True]:
+                module = parse(tokenize(source))
+                typecheck(module, SymTab(locals=dict(top_level_symtab)))
+                asm_code = generate_assembly(generate_ir(root_types, module), allocate)
+                executable = os.path.join(workdir, f'{name}_{allocate}')
+                assemble(asm_code, executable, workdir)
+                columns.append((*count_instructions(asm_code), run_best(executable)))
+            (before_insns, before_mem, before_time), (after_insns, after_mem, after_time) = columns
+            print(
+                f'{name:<20} {before_insns:>8} -> {after_insns:<6} {before_mem:>8} -> {after_mem:<6}'
+                f' {before_time:>8.3f} -> {after_time:.3f}'
+            )
+
+
+if __name__ == '__main__':
+    main()
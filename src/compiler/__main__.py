@@ -1,16 +1,15 @@
+import os
 import sys
-from compiler.assembler import assemble
-from compiler.assembly_generator import generate_assembly
-from compiler.interpreter import interpret
-from compiler.ir_generator import generate_ir
-from compiler.symtab import SymTab, top_level_symtab, root_types
-from compiler.tokenizer import tokenize
-from compiler.parser import parse
-from compiler.type_checker import typecheck
+from compiler.batch import compile_batch, find_source_files
+from compiler.cache import CacheStats, CompilationCache, default_max_size
+from compiler.commands import run_command, source_commands
+from compiler.optimizer import OptimizationStats
+from compiler.server import serve_lines, serve_socket
 
 # TODO(student): add more commands as needed
 usage = f"""
 Usage: {sys.argv[0]} <command> [source_code_file]
+       {sys.argv[0]} compile [-j N] [--output-dir=DIR] <source_code_file_or_directory>...
 
 Command 'tokenize':
     Tokenizes source code and prints the tokens.
@@ -22,36 +21,89 @@ Command 'typecheck':
     Typechecks source code and prints its result type.
 Command 'ir':
     Runs the IR generator on source code and prints the IR instructions.
+Command 'cfg':
+    Prints the control flow graph of each function in Graphviz DOT format, e.g. for 'dot -Tsvg -O'.
 Command 'asm':
     Generates assembly code from the source code.
 Command 'compile':
     Runs all of the steps above and assembles source code into executable machine code file 'compiled_program'.
     See result of compilation by running './compiled_program'.
+    Given several files or a directory, compiles them in parallel, each into an executable named
+    after the source file without its extension. Directories contribute the files in them that
+    have an extension. Prints the result of each file and a summary of failures.
+    -j N                    Number of files to compile in parallel. Defaults to the number of CPUs.
+    --output-dir=DIR        Write the executables into DIR instead of next to the source files.
+Command 'serve':
+    Keeps the compiler running and answers requests to run the commands above, one JSON object per line:
+        {{"command": "asm", "source": "...", "output_file": "...", "opt_level": 0}}
+    Responses are {{"ok": true, "output": "..."}} or {{"ok": false, "error": "..."}}.
+    Reads requests from standard input, or from a Unix socket with --socket=PATH.
+    See 'python -m compiler.client' for a client.
 Common arguments:
     source_code_file        Optional. Defaults to standard input if missing.
+    --cache-dir=DIR         Reuse compiled functions cached in DIR for 'ir', 'cfg', 'asm' and 'compile'.
+    --cache-size=BYTES      Maximum size of the cache, least recently used functions are evicted first.
+                            Defaults to {default_max_size}.
+    --cache-stats           Print cache hits, misses and evictions to standard error.
+    -O0, -O1, -O2           Optimization level of 'ir', 'cfg', 'asm' and 'compile'. Defaults to -O0.
+                            -O1 propagates constants, also through branches that are never taken.
+                            -O2 also reuses values computed earlier instead of computing them again.
+                            Both also clean up the assembly code with a peephole optimizer.
+    --opt-stats             Print the number of IR instructions of each function before and after
+                            optimizing, how many each optimization removed, and what the peephole
+                            optimizer removed from the assembly code, to standard error.
  """.strip() + "\n"
 
 
 def main() -> int:
     command: str | None = None
-    input_file: str | None = None
-    symtab = SymTab(locals=dict(top_level_symtab))
-    for arg in sys.argv[1:]:
+    input_files: list[str] = []
+    jobs: int | None = None
+    output_dir: str | None = None
+    cache_dir: str | None = None
+    cache_size = default_max_size
+    cache_stats = False
+    socket_path: str | None = None
+    opt_level = 0
+    opt_stats = False
+    args = iter(sys.argv[1:])
+    for arg in args:
         if arg in ['-h', '--help']:
             print(usage)
             return 0
+        elif arg.startswith('--cache-dir='):
+            cache_dir = arg.split('=', 1)[1]
+        elif arg.startswith('--cache-size='):
+            cache_size = int(arg.split('=', 1)[1])
+        elif arg == '--cache-stats':
+            cache_stats = True
+        elif arg.startswith('--socket='):
+            socket_path = arg.split('=', 1)[1]
+        elif arg == '-j':
+            jobs = int(next(args, '0'))
+        elif arg.startswith('-j'):
+            jobs = int(arg[2:])
+        elif arg.startswith('--output-dir='):
+            output_dir = arg.split('=', 1)[1]
+        elif arg in ['-O0', '-O1', '-O2']:
+            opt_level = int(arg[2:])
+        elif arg == '--opt-stats':
+            opt_stats = True
         elif arg.startswith('-'):
             raise Exception(f"Unknown argument: {arg}")
         elif command is None:
             command = arg
-        elif input_file is None:
-            input_file = arg
         else:
-            raise Exception("Multiple input files not supported")
+            input_files.append(arg)
+
+    if jobs is not None and jobs < 1:
+        raise Exception("-j needs a positive number of jobs")
 
     def read_source_code() -> str:
-        if input_file is not None:
-            with open(input_file) as f:
+        if len(input_files) > 1:
+            raise Exception("Multiple input files are only supported by 'compile'")
+        if input_files:
+            with open(input_files[0]) as f:
                 return f.read()
         else:
             return sys.stdin.read()
@@ -59,49 +111,63 @@ def main() -> int:
     if command is None:
         print(f"Error: command argument missing\n\n{usage}", file=sys.stderr)
         return 1
-
-    source_code = read_source_code()
-    if command == 'interpret':
-        result = interpret(parse(tokenize(source_code)))
-        print(result)
-    elif command == 'tokenize':
-        tokenized_source_code = tokenize(source_code)
-        print('\nTokenized source code:\n')
-        print("\n".join([str(token) for token in tokenized_source_code]))
-    elif command == 'parse':
-        parsed_source_code = parse(tokenize(source_code))
-        print('\nParsed source code:\n')
-        print(parsed_source_code, '\n')
-    elif command == "typecheck":
-        typechecked_source_code = typecheck(parse(tokenize(source_code)), symtab)
-        print('Source code\'s return type:\n')
-        print(typechecked_source_code)
-    elif command == 'ir':
-        tokens = tokenize(source_code)
-        ast_node = parse(tokens)
-        typecheck(ast_node, symtab)
-        ir_instructions = generate_ir(root_types, ast_node)
-        for fun, instrs in ir_instructions.items():
-            print(f"{fun}:")
-            print("\n".join([str(ins) for ins in instrs]))
-    elif command == 'asm':
-        tokens = tokenize(source_code)
-        ast_node = parse(tokens)
-        typecheck(ast_node, symtab)
-        ir_instructions = generate_ir(root_types, ast_node)
-        asm_code = generate_assembly(ir_instructions)
-        print(asm_code)
-    elif command=='compile':
-        tokens = tokenize(source_code)
-        ast_node = parse(tokens)
-        typecheck(ast_node, symtab)
-        ir_instructions = generate_ir(root_types, ast_node)
-        asm_code = generate_assembly(ir_instructions)
-        assemble(asm_code, 'compiled_program')
-    else:
+    if command not in source_commands and command != 'serve':
         print(f"Error: unknown command: {command}\n\n{usage}", file=sys.stderr)
         return 1
+
+    if command == 'compile' and (
+        len(input_files) > 1 or output_dir is not None or any(os.path.isdir(f) for f in input_files)
+    ):
+        return compile_files(input_files, jobs, output_dir, cache_dir, cache_size, cache_stats, opt_level)
+
+    cache = CompilationCache(cache_dir, cache_size) if cache_dir is not None else None
+    if command == 'serve':
+        if socket_path is not None:
+            serve_socket(socket_path, cache)
+        else:
+            serve_lines(sys.stdin, sys.stdout, cache)
+    else:
+        stats: dict[str, OptimizationStats] = {}
+        output = run_command(command, read_source_code(), cache, opt_level=opt_level, opt_stats=stats)
+        if output is not None:
+            print(output)
+        if opt_stats:
+            for name, fun_stats in stats.items():
+                print(f'{name}: {fun_stats}', file=sys.stderr)
+
+    if cache is not None and cache_stats:
+        print(cache.stats, file=sys.stderr)
     return 0
 
+def compile_files(
+    paths: list[str],
+    jobs: int | None,
+    output_dir: str | None,
+    cache_dir: str | None,
+    cache_size: int,
+    cache_stats: bool,
+    opt_level: int
+) -> int:
+    source_files = find_source_files(paths)
+    failures = []
+    total = CacheStats()
+    for result in compile_batch(source_files, jobs, output_dir, cache_dir, cache_size, opt_level):
+        if result.error is None:
+            print(f"ok     {result.source_file} -> {result.output_file} ({result.seconds:.2f}s)")
+        else:
+            print(f"FAILED {result.source_file} ({result.seconds:.2f}s)")
+            failures.append(result)
+        if result.cache_stats is not None:
+            total.hits += result.cache_stats.hits
+            total.misses += result.cache_stats.misses
+            total.evictions += result.cache_stats.evictions
+
+    print(f"\n{len(source_files) - len(failures)} compiled, {len(failures)} failed")
+    for result in failures:
+        print(f"{result.source_file}: {result.error}", file=sys.stderr)
+    if cache_dir is not None and cache_stats:
+        print(total, file=sys.stderr)
+    return 1 if failures else 0
+
 if __name__ == '__main__':
     sys.exit(main())
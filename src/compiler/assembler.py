@@ -36,6 +36,7 @@ def assemble(
 
 stdlib_asm_code: str = """
     .global _start
+    .global flush_output
     .global print_int
     .global print_bool
     .global read_int
@@ -43,14 +44,93 @@ stdlib_asm_code: str = """
     .section .text
 
 # ***** Function '_start' *****
-# Calls function 'main', prints the output value, and halts the program
+# Calls function 'main', writes out the buffered output, and halts the program.
+#
+# Before that, it makes SIGFPE and SIGSEGV flush the output buffer, so that a
+# program that divides by zero or runs out of stack still prints everything it
+# printed before. The handlers run once, on a stack of their own, and then the
+# faulting instruction runs again and kills the program as it would have anyway.
 
 _start:
+    movq $131, %rax          # syscall number for sigaltstack
+    movq $signal_stack_desc, %rdi
+    xorq %rsi, %rsi
+    syscall
+    movq $8, %rdi            # SIGFPE
+    call .Lflush_on_signal
+    movq $11, %rdi           # SIGSEGV
+    call .Lflush_on_signal
+
     call main
+    call flush_output
     movq $60, %rax
     xorq %rdi, %rdi
     syscall
 
+# Sets the handler of the signal in rdi to flush_on_signal
+.Lflush_on_signal:
+    movq $13, %rax           # syscall number for rt_sigaction
+    movq $flush_action, %rsi
+    xorq %rdx, %rdx          # don't need the old action
+    movq $8, %r10            # size of the signal mask
+    syscall
+    ret
+
+flush_on_signal:
+    call flush_output
+    ret                      # to signal_return, which the kernel put on the stack
+
+signal_return:
+    movq $15, %rax           # syscall number for rt_sigreturn
+    syscall
+
+# ***** Function 'flush_output' *****
+# Writes the output buffer to stdout and empties it.
+#
+# A write may take only part of the data, so it writes until everything is
+# written or the write fails, in which case the rest is dropped.
+# Only uses rax, rcx, rdx, rsi, rdi and r11.
+flush_output:
+    movq $output_buffer, %rsi
+    movq output_length, %rdx
+.Lflush_loop:
+    cmpq $0, %rdx
+    jle .Lflush_done
+    movq $1, %rax            # rax = syscall number for write
+    movq $1, %rdi            # rdi = file handle for stdout
+    syscall                  # rax = bytes written, or negative on error
+    cmpq $0, %rax
+    jle .Lflush_done
+    addq %rax, %rsi
+    subq %rax, %rdx
+    jmp .Lflush_loop
+.Lflush_done:
+    movq $0, output_length
+    ret
+
+# ***** Function 'buffer_output' *****
+# Appends rdx bytes at rsi to the output buffer, flushing it first if they
+# don't fit. rdx must be at most the size of the buffer.
+# Only uses rax, rcx, rdx, rsi, rdi and r11.
+buffer_output:
+    movq output_length, %rax
+    leaq (%rax,%rdx), %rcx
+    cmpq $output_buffer_size, %rcx
+    jbe .Lbuffer_fits
+    pushq %rsi
+    pushq %rdx
+    call flush_output
+    popq %rdx
+    popq %rsi
+    xorq %rax, %rax
+.Lbuffer_fits:
+    leaq output_buffer(%rax), %rdi
+    movq %rdx, %rcx
+    rep movsb                # copy rcx bytes from rsi to rdi
+    addq %rdx, %rax
+    movq %rax, output_length
+    ret
+
 # ***** Function 'print_int' *****
 # Prints a 64-bit signed integer followed by a newline.
 #
@@ -68,7 +148,7 @@ _start:
 #         x = x / 10
 #     if negative:
 #         push(minus sign)
-#     syscall 'write' with pushed data
+#     append pushed data to the output buffer
 #     return the original argument
 #
 # Registers:
@@ -130,9 +210,6 @@ print_int:
     decq %rsp
 .Lminus_done:
 
-    # Call syscall 'write'
-    movq $1, %rax            # rax = syscall number for write
-    movq $1, %rdi            # rdi = file handle for stdout
     # rsi = pointer to message
     movq %rsp, %rsi
     incq %rsi
@@ -140,7 +217,7 @@ print_int:
     movq %rbp, %rdx
     subq %rsp, %rdx
     decq %rdx
-    syscall
+    call buffer_output       # pushes below rsp, past the message
 
     # Restore stack registers and return the original input
     movq %rbp, %rsp
@@ -166,13 +243,7 @@ print_bool:
     movq $true_str_len, %rdx
 
 .Lwrite:
-    # Call syscall 'write'
-    movq $1, %rax            # rax = syscall number for write
-    movq $1, %rdi            # rdi = file handle for stdout
-    # rsi = pointer to message (already set above)
-    # rdx = number of bytes (already set above)
-    syscall
-    
+    call buffer_output
     # Restore stack registers and return the original input
     movq %rbp, %rsp
     popq %rbp
@@ -193,7 +264,12 @@ false_str_len = . - false_str
 # makes a syscall to read each byte.
 #
 # It crashes the program if input could not be read.
+#
+# The output buffer is flushed first, so that everything printed before
+# is visible when the program waits for input.
 read_int:
+    call flush_output
+    pushq %r12           # Save r12, which is callee saved
     pushq %rbp           # Save previous stack frame pointer
     movq %rsp, %rbp      # Set stack frame pointer
     subq $16, %rsp       # Reserve space for input
@@ -203,6 +279,7 @@ read_int:
     xorq %r10, %r10      # Clear r10 - it'll accumulate our output
                          # Skip r11 - syscalls destroy it
     xorq %r12, %r12      # Clear r12 - it'll count the number of input bytes read.
+                         # It's saved above, since callers keep variables in it.
 
     # Loop until a newline or end of input is encountered
 .Lloop:
@@ -268,6 +345,7 @@ read_int:
     # Restore stack registers and return the result
     movq %rbp, %rsp
     popq %rbp
+    popq %r12
     movq %r10, %rax
     ret
 
@@ -287,4 +365,25 @@ read_int:
 read_int_error_str:
     .ascii "Error: read_int() failed to read input\\n"
 read_int_error_str_len = . - read_int_error_str
+
+    .section .data
+output_length:
+    .quad 0
+flush_action:                # struct sigaction for flush_on_signal
+    .quad flush_on_signal    # handler
+    .quad 0x8c000000         # flags: SA_RESETHAND | SA_ONSTACK | SA_RESTORER
+    .quad signal_return      # restorer
+    .quad 0                  # mask
+signal_stack_desc:           # stack_t for sigaltstack
+    .quad signal_stack       # stack pointer
+    .quad 0                  # flags
+    .quad signal_stack_size  # size
+
+    .section .bss
+output_buffer_size = 65536
+output_buffer:
+    .skip output_buffer_size
+signal_stack_size = 16384
+signal_stack:
+    .skip signal_stack_size
 """
@@ -1,139 +1,267 @@
-import dataclasses
+import heapq
 from compiler import ir
-from compiler.intrinsics import IntrinsicArgs, all_intrinsics
+from compiler.intrinsics import (
+    RAX, Immediate, IntrinsicArgs, Location, Operand, Register, StackSlot, all_intrinsics, comparison_jumps
+)
+from compiler.peephole import format_assembly, optimize_assembly, parse_assembly
+from compiler.register_allocator import (
+    Interval, allocate_registers, callee_saved_registers, is_function_call, live_intervals, live_variables,
+    uses_and_defs
+)
 
-def generate_assembly(instructions: dict[str, list[ir.Instruction]]) -> str:
+param_registers = ['%rdi', '%rsi', '%rdx', '%rcx', '%r8', '%r9']
+
+def generate_assembly(
+    instructions: dict[str, list[ir.Instruction]],
+    allocate: bool = True,
+    peephole: bool = False,
+    fuse_branches: bool = True,
+    specialize_constants: bool = True
+) -> str:
+    return link_assembly([
+        generate_function_assembly(
+            fun_name, fun_instructions, allocate, peephole,
+            fuse_branches=fuse_branches, specialize_constants=specialize_constants
+        )
+        for fun_name, fun_instructions in instructions.items()
+    ])
+
+def link_assembly(functions: list[str]) -> str:
+    """Joins the assembly code of separately generated functions into one file."""
+    assembly_code_lines = [
+        '.global main',
+        '.type main, @function',
+        '.extern print_int',
+        '.extern print_bool',
+        '.extern read_int',
+        '.section .text',
+    ]
+    return "\n".join(assembly_code_lines + functions)
+
+def generate_function_assembly(
+    fun_name: str,
+    fun_instructions: list[ir.Instruction],
+    allocate: bool = True,
+    peephole: bool = False,
+    peephole_stats: dict[str, int] | None = None,
+    fuse_branches: bool = True,
+    specialize_constants: bool = True
+) -> str:
+    """Generates the assembly code of one function. The result only depends on the
+    function's own IR: stack slots are allocated per function and labels are
+    prefixed with the function name.
+
+    With `allocate`, variables are kept in registers where possible (see
+    `allocate_registers`), and all variables live on the stack otherwise.
+    With `peephole`, the code is cleaned up by `optimize_assembly`, which
+    counts what it removed in `peephole_stats`. With `fuse_branches`, a
+    comparison that is only used by the `CondJump` right after it jumps
+    on the flags it sets instead of storing a Bool. With `specialize_constants`,
+    intrinsics get the arguments that are known constants as immediates, and
+    constants that nothing else reads aren't loaded at all."""
     assembly_code_lines = []
 
     def emit(line: str) -> None: assembly_code_lines.append(line)
 
-    locals = Locals(variables=get_all_ir_variables(instructions))
+    def label(name: str) -> str:
+        return f'.L{fun_name}_{name}'
 
-    emit('.global main')
-    emit('.type main, @function')
-    emit('.extern print_int')
-    emit('.extern print_bool')
-    emit('.extern read_int')
+    live_out = live_variables(fun_instructions)
+    intervals = live_intervals(fun_instructions, live_out)
+    locals = Locals(intervals, allocate_registers(intervals) if allocate else {})
+    param_count = 0
 
-    emit('.section .text')
+    # Variables only ever written by loads of the same Int constant
+    constants: dict[ir.IRVar, int | None] = {}
+    for insn in fun_instructions:
+        for v in uses_and_defs(insn)[1]:
+            value = insn.value if isinstance(insn, ir.LoadIntConst) else None
+            constants[v] = value if constants.get(v, value) == value else None
+    read_by_others = {
+        v for insn in fun_instructions
+        if not (isinstance(insn, ir.Call) and insn.fun.name in all_intrinsics)
+        for v in uses_and_defs(insn)[0]
+    }
+    immediates = {
+        v: Immediate(value) for v, value in constants.items()
+        if value is not None and specialize_constants
+    }
 
-    param_registers = ['%rdi', '%rsi', '%rdx', '%rcx', '%r8', '%r9']
+    def operand(v: ir.IRVar) -> Operand:
+        return immediates.get(v) or locals.get_operand(v)
 
-    for fun_name, fun_instructions in instructions.items():
-        param_count = 0
+    fused_comparisons = {
+        i for i, (insn, next_insn) in enumerate(zip(fun_instructions, fun_instructions[1:]))
+        if fuse_branches
+        and isinstance(insn, ir.Call) and insn.fun.name in comparison_jumps
+        and isinstance(next_insn, ir.CondJump) and next_insn.cond == insn.dest
+        and insn.dest not in live_out[i + 1]
+    }
 
+    emit('')
+    emit(f'{fun_name}:')
+    emit('')
+    emit('pushq %rbp')
+    emit('movq %rsp, %rbp')
+    emit(f'subq ${locals.stack_used()}, %rsp')
+    for register, slot in locals.saved_registers().items():
+        if register in callee_saved_registers:
+            emit(f'movq {register}, {slot}')
+
+    for i, insn in enumerate(fun_instructions):
         emit('')
-        emit(f'{fun_name}:')
-        emit('')
-        emit('pushq %rbp')
-        emit('movq %rsp, %rbp')
-        emit(f'subq ${locals.stack_used()}, %rsp')
-
-        for insn in fun_instructions:
-            emit('')
-            emit('# ' + str(insn))
-            match insn:
-                case ir.Label():
-                    emit('')
-                    emit(f'.L{insn.name}:')
-
-                case ir.LoadIntConst():
-                    if -2**31 <= insn.value < 2**31:
-                        emit(f'movq ${insn.value}, {locals.get_ref(insn.dest)}')
-                    else:
-                        emit(f'movabsq ${insn.value}, %rax')
-                        emit(f'movq %rax, {locals.get_ref(insn.dest)}')
-
-                case ir.LoadBoolConst():
-                    emit(f'movq ${int(insn.value)}, {locals.get_ref(insn.dest)}')
-
-                case ir.Jump():
-                    emit(f'jmp .L{insn.label.name}')
-
-                case ir.CondJump():
-                    emit(f'cmpq $0, {locals.get_ref(insn.cond)}')
-                    emit(f'jne .L{insn.then_label.name}')
-                    emit(f'jmp .L{insn.else_label.name}')
+        emit('# ' + str(insn))
+        match insn:
+            case ir.Label():
+                emit('')
+                emit(f'{label(insn.name)}:')
+
+            case ir.LoadIntConst() if insn.dest in immediates and insn.dest not in read_by_others:
+                pass  # Only read as an immediate
 
-                case ir.Copy():
-                    emit(f'movq {locals.get_ref(insn.source)}, %rax')
+            case ir.LoadIntConst():
+                if -2**31 <= insn.value < 2**31:
+                    emit(f'movq ${insn.value}, {locals.get_ref(insn.dest)}')
+                else:
+                    emit(f'movabsq ${insn.value}, %rax')
                     emit(f'movq %rax, {locals.get_ref(insn.dest)}')
 
-                case ir.Call():
-                    if (instrinsic := all_intrinsics.get(insn.fun.name)) is not None:
-                        args = IntrinsicArgs(
-                            arg_refs=[locals.get_ref(a) for a in insn.args],
-                            result_register='%rax',
-                            emit=emit
-                        )
-                        instrinsic(args)
-                    else:
-                        for i, arg in enumerate(insn.args):
-                            emit(f'movq {locals.get_ref(arg)}, {param_registers[i]}')
-                        emit(f'call {insn.fun.name}')
+            case ir.LoadBoolConst():
+                emit(f'movq ${int(insn.value)}, {locals.get_ref(insn.dest)}')
+
+            case ir.Jump():
+                emit(f'jmp {label(insn.label.name)}')
+
+            case ir.CondJump():
+                if i - 1 in fused_comparisons:
+                    comparison = fun_instructions[i - 1]
+                    assert isinstance(comparison, ir.Call)
+                    operands = IntrinsicArgs([operand(a) for a in comparison.args], RAX, emit)
+                    left, right = operands.args
+                    if isinstance(left, Immediate) or isinstance(left, StackSlot) and isinstance(right, StackSlot):
+                        operands.load(left, RAX)
+                        left = RAX
+                    emit(f'cmpq {operands.source(right)}, {left}')
+                    emit(f'{comparison_jumps[comparison.fun.name]} {label(insn.then_label.name)}')
+                else:
+                    emit(f'cmpq $0, {locals.get_ref(insn.cond)}')
+                    emit(f'jne {label(insn.then_label.name)}')
+                emit(f'jmp {label(insn.else_label.name)}')
+
+            case ir.Copy():
+                source_ref = locals.get_ref(insn.source)
+                dest_ref = locals.get_ref(insn.dest)
+                if source_ref == dest_ref:
+                    pass
+                elif source_ref.startswith('%') or dest_ref.startswith('%'):
+                    emit(f'movq {source_ref}, {dest_ref}')
+                else:
+                    emit(f'movq {source_ref}, %rax')
+                    emit(f'movq %rax, {dest_ref}')
+
+            case ir.Call() if i in fused_comparisons:
+                pass  # Done by the CondJump after it
+
+            case ir.Call():
+                if (instrinsic := all_intrinsics.get(insn.fun.name)) is not None:
+                    instrinsic(IntrinsicArgs(
+                        args=[operand(a) for a in insn.args],
+                        result=locals.get_operand(insn.dest),
+                        emit=emit
+                    ))
+                else:
+                    # Caller saved registers are saved around the call if they are still needed after it
+                    saved = {}
+                    if allocate and is_function_call(insn):
+                        for v in sorted(live_out[i] - {insn.dest}, key=lambda v: v.name):
+                            ref = locals.get_ref(v)
+                            if ref.startswith('%') and ref not in callee_saved_registers:
+                                saved[ref] = locals.saved_registers()[ref]
+                    for register, slot in saved.items():
+                        emit(f'movq {register}, {slot}')
+                    for arg_index, arg in enumerate(insn.args):
+                        emit(f'movq {locals.get_ref(arg)}, {param_registers[arg_index]}')
+                    emit(f'call {insn.fun.name}')
+                    for register, slot in saved.items():
+                        emit(f'movq {slot}, {register}')
                     emit(f'movq %rax, {locals.get_ref(insn.dest)}')
 
-                case ir.LoadIntParam() | ir.LoadBoolParam():
-                    dest_ref = locals.get_ref(insn.dest)
-                    emit(f'movq {param_registers[param_count]}, {dest_ref}')
-                    param_count += 1
-
-                case ir.Return():
-                    emit(f'movq {locals.get_ref(insn.value)}, %rax')
-               
-                case _:
-                    raise Exception(f'Unknown instruction: {type(insn)}')
-                
-        emit('')
-        if fun_name == 'main':
-            emit('movq $0, %rax')
+            case ir.LoadIntParam() | ir.LoadBoolParam():
+                dest_ref = locals.get_ref(insn.dest)
+                emit(f'movq {param_registers[param_count]}, {dest_ref}')
+                param_count += 1
 
-        emit('movq %rbp, %rsp')
-        emit('popq %rbp')
-        emit('ret')
-        emit('')
+            case ir.Return():
+                emit(f'movq {locals.get_ref(insn.value)}, %rax')
+                emit(f'jmp {label("return")}')
+           
+            case _:
+                raise Exception(f'Unknown instruction: {type(insn)}')
+            
+    emit('')
+    emit(f'{label("return")}:')
+    if fun_name == 'main':
+        emit('movq $0, %rax')
 
-    return "\n".join(assembly_code_lines)
+    for register, slot in locals.saved_registers().items():
+        if register in callee_saved_registers:
+            emit(f'movq {slot}, {register}')
+    emit('movq %rbp, %rsp')
+    emit('popq %rbp')
+    emit('ret')
+    emit('')
 
-def get_all_ir_variables(instructions: dict[str, list[ir.Instruction]]) -> list[ir.IRVar]:
-    result_list: list[ir.IRVar] = []
-    result_set: set[ir.IRVar] = set()
-
-    def add(v: ir.IRVar) -> None:
-        if v not in result_set:
-            result_list.append(v)
-            result_set.add(v)
-
-    for fun_instructions in instructions.values():
-        for insn in fun_instructions:
-            for field in dataclasses.fields(insn):
-                value = getattr(insn, field.name)
-                if isinstance(value, ir.IRVar):
-                    add(value)
-                elif isinstance(value, list):
-                    for v in value:
-                        if isinstance(v, ir.IRVar):
-                            add(v)
-    return result_list
+    if peephole:
+        assembly_code_lines = format_assembly(optimize_assembly(parse_assembly(assembly_code_lines), peephole_stats))
+    return "\n".join(assembly_code_lines)
 
 class Locals:
-    """Knows the memory location of every local variable."""
-    _var_to_location: dict[ir.IRVar, str]
+    """Knows the memory location of every local variable.
+    Variables given a register are kept there, the others get a stack slot,
+    shared by variables whose live intervals don't overlap.
+    Each register used also gets a slot where it's saved when needed."""
+    _var_to_location: dict[ir.IRVar, Location]
+    _saved_registers: dict[str, str]
     _stack_used: int
 
-    def __init__(self, variables: list[ir.IRVar]) -> None:
+    def __init__(self, intervals: list[Interval], registers: dict[ir.IRVar, str] = {}) -> None:
         self._var_to_location = {}
+        self._saved_registers = {}
         self._stack_used = 8
-        for v in variables:
-            if v not in self._var_to_location:
-                self._var_to_location[v] = f'-{self._stack_used}(%rbp)'
-                self._stack_used += 8
+
+        def new_slot() -> StackSlot:
+            slot = StackSlot(-self._stack_used)
+            self._stack_used += 8
+            return slot
+
+        free_slots: list[StackSlot] = []
+        active: list[tuple[int, int]] = []  # heap of (interval end, slot offset)
+        for interval in sorted(intervals, key=lambda interval: interval.start):
+            if interval.var in registers:
+                self._var_to_location[interval.var] = Register(registers[interval.var])
+                continue
+            while active and active[0][0] < interval.start:
+                free_slots.append(StackSlot(heapq.heappop(active)[1]))
+            slot = free_slots.pop() if free_slots else new_slot()
+            heapq.heappush(active, (interval.end, slot.offset))
+            self._var_to_location[interval.var] = slot
+
+        for register in sorted(set(registers.values())):
+            self._saved_registers[register] = str(new_slot())
 
     def get_ref(self, v: ir.IRVar) -> str:
         """Returns an Assembly reference like `-24(%rbp)`
         for the memory location that stores the given variable"""
+        return str(self._var_to_location[v])
+
+    def get_operand(self, v: ir.IRVar) -> Location:
+        """Returns the register or stack slot of the given variable."""
         return self._var_to_location[v]
 
+    def saved_registers(self) -> dict[str, str]:
+        """Returns the stack slot of each register used for variables."""
+        return self._saved_registers
+
     def stack_used(self) -> int:
         """Returns the number of bytes of stack space needed for the local variables."""
         return self._stack_used
\ No newline at end of file
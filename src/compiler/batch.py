@@ -0,0 +1,88 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Iterator
+
+from compiler.cache import CacheStats, CompilationCache, default_max_size
+from compiler.commands import run_command
+
+@dataclass
+class BatchResult:
+    source_file: str
+    output_file: str
+    error: str | None
+    seconds: float
+    cache_stats: CacheStats | None = None
+
+def find_source_files(paths: list[str]) -> list[str]:
+    """Expands directories into the files they contain. Only files with an extension
+    are taken from directories, so compiled executables next to them are skipped."""
+    files = []
+    for p in paths:
+        if os.path.isdir(p):
+            for name in sorted(os.listdir(p)):
+                file = os.path.join(p, name)
+                if os.path.isfile(file) and not name.startswith('.') and os.path.splitext(name)[1]:
+                    files.append(file)
+        else:
+            files.append(p)
+    return files
+
+def output_file_for(source_file: str, output_dir: str | None = None) -> str:
+    """The executable of `source_file` is named after it without the extension,
+    next to it or in `output_dir`."""
+    output_file, extension = os.path.splitext(source_file)
+    if not extension:
+        output_file += '.out'
+    if output_dir is not None:
+        output_file = os.path.join(output_dir, os.path.basename(output_file))
+    return output_file
+
+def _compile_file(
+    source_file: str,
+    output_file: str,
+    cache_dir: str | None,
+    cache_size: int,
+    opt_level: int
+) -> BatchResult:
+    start = time.perf_counter()
+    cache = CompilationCache(cache_dir, cache_size) if cache_dir is not None else None
+    error = None
+    try:
+        with open(source_file) as f:
+            source_code = f.read()
+        run_command('compile', source_code, cache, output_file, opt_level)
+    except Exception as e:
+        error = str(e) or type(e).__name__
+    return BatchResult(
+        source_file,
+        output_file,
+        error,
+        time.perf_counter() - start,
+        cache.stats if cache is not None else None
+    )
+
+def compile_batch(
+    source_files: list[str],
+    jobs: int | None = None,
+    output_dir: str | None = None,
+    cache_dir: str | None = None,
+    cache_size: int = default_max_size,
+    opt_level: int = 0
+) -> Iterator[BatchResult]:
+    """Compiles each source file into its own executable, `jobs` files at a time in
+    separate processes. Both the compiler itself and 'as' and 'ld' run in the workers.
+    Yields the results in the order of `source_files`, failures included."""
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+    output_files = [output_file_for(f, output_dir) for f in source_files]
+    cache_dirs = [cache_dir] * len(source_files)
+    cache_sizes = [cache_size] * len(source_files)
+    opt_levels = [opt_level] * len(source_files)
+
+    if jobs == 1 or len(source_files) <= 1:
+        yield from map(_compile_file, source_files, output_files, cache_dirs, cache_sizes, opt_levels)
+        return
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        yield from executor.map(_compile_file, source_files, output_files, cache_dirs, cache_sizes, opt_levels)
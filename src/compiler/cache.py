@@ -0,0 +1,259 @@
+import hashlib
+import os
+import pickle
+import tempfile
+from dataclasses import dataclass, field, is_dataclass
+from typing import Any, Sequence
+
+from compiler import ast, ir
+from compiler.assembly_generator import generate_function_assembly, link_assembly
+from compiler.ir_generator import generate_ir
+from compiler.optimizer import OptimizationStats, inline_level, optimize_module
+from compiler.parser import TopLevelItem, build_module, parse_top_level
+from compiler.symtab import SymTab, root_types, top_level_symtab
+from compiler.tokenizer import Location, Token, tokenize
+from compiler.type_checker import typecheck
+from compiler.types import FunType, Type
+
+default_max_size = 64 * 1024 * 1024
+
+@dataclass
+class CachedFunction:
+    """The compiled output of one function definition."""
+    instructions: list[ir.Instruction]
+    assembly: str
+    stats: OptimizationStats = field(default_factory=OptimizationStats)
+
+class _EntryUnpickler(pickle.Unpickler):
+    """Only loads the classes that cache entries are made of, so that a file
+    put in the cache directory can't make the compiler run arbitrary code."""
+    allowed: dict[tuple[str, str], type] = {
+        (cls.__module__, cls.__qualname__): cls
+        for cls in [
+            CachedFunction, OptimizationStats, Location,
+            *(cls for cls in vars(ir).values() if isinstance(cls, type) and is_dataclass(cls))
+        ]
+    }
+
+    def find_class(self, module: str, name: str) -> Any:
+        cls = self.allowed.get((module, name))
+        if cls is None:
+            raise pickle.UnpicklingError(f'{module}.{name} is not allowed in a cache entry')
+        return cls
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    def __str__(self) -> str:
+        return f'cache: {self.hits} hits, {self.misses} misses, {self.evictions} evicted'
+
+@dataclass
+class CompilationCache:
+    """An on-disk cache of compiled functions, one file per function.
+    When the files take more than `max_size` bytes, the least recently used
+    ones are removed by `evict`."""
+    directory: str
+    max_size: int = default_max_size
+    stats: CacheStats = field(default_factory=CacheStats)
+
+    def __post_init__(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.pickle')
+
+    def get(self, key: str) -> CachedFunction | None:
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                entry = _EntryUnpickler(f).load()
+            os.utime(path)  # the modification time orders entries for eviction
+        except FileNotFoundError:
+            self.stats.misses += 1
+            return None
+        except Exception:  # truncated, written by another compiler version or not an entry at all
+            entry = None
+        if not isinstance(entry, CachedFunction):
+            self.stats.misses += 1
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        self.stats.hits += 1
+        return entry
+
+    def put(self, key: str, entry: CachedFunction) -> None:
+        # Written to a temporary file first, so readers never see a partial entry
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(entry, f)
+            os.replace(temp_path, self._path(key))
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def evict(self) -> None:
+        entries = []
+        total_size = 0
+        with os.scandir(self.directory) as it:
+            for dir_entry in it:
+                if dir_entry.name.endswith('.pickle'):
+                    try:
+                        stat = dir_entry.stat()
+                    except FileNotFoundError:  # evicted by another process
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, dir_entry.path))
+                    total_size += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_size -= size
+            self.stats.evictions += 1
+
+def _compiler_fingerprint() -> str:
+    """Hashes the compiler's own source, so that changing the compiler invalidates the cache."""
+    digest = hashlib.sha256()
+    package_dir = os.path.dirname(__file__)
+    for name in sorted(os.listdir(package_dir)):
+        if name.endswith('.py'):
+            with open(os.path.join(package_dir, name), 'rb') as f:
+                digest.update(name.encode())
+                digest.update(f.read())
+    return digest.hexdigest()
+
+_fingerprint: str | None = None
+
+def function_key(tokens: Sequence[Token], signatures: dict[str, str], options: str = '') -> str:
+    """Computes the cache key of a function from its tokens and the signatures of the
+    functions it refers to. Token locations are not part of the key, so moving a
+    function around in the source doesn't invalidate it."""
+    global _fingerprint
+    if _fingerprint is None:
+        _fingerprint = _compiler_fingerprint()
+
+    digest = hashlib.sha256()
+    digest.update(_fingerprint.encode())
+    digest.update(options.encode())
+    dependencies = set()
+    for token in tokens:
+        digest.update(f'\0{token.type}:{token.text}'.encode())
+        if token.type == 'identifier' and token.text in signatures:
+            dependencies.add(token.text)
+    for name in sorted(dependencies):
+        digest.update(f'\0{signatures[name]}'.encode())
+    return digest.hexdigest()
+
+def _fun_type(fun: ast.FunDefinition) -> FunType:
+    return FunType(
+        [t.convert_to_basic_type() for t in fun.param_types],
+        fun.return_type.convert_to_basic_type()
+    )
+
+def _with_callee_bodies(
+    items: list[TopLevelItem],
+    tokens: Sequence[Token],
+    signatures: dict[str, str]
+) -> dict[str, str]:
+    """Adds the tokens of every function that a function calls, directly or
+    through others, to its signature. A function's code depends on them when
+    calls get inlined, so changing them must change the keys of its callers."""
+    bodies: dict[str, str] = {}
+    calls: dict[str, set[str]] = {}
+    for item in items:
+        if isinstance(item.node, ast.FunDefinition):
+            name = item.node.name.name
+            fun_tokens = tokens[item.start:item.end]
+            bodies[name] = ''.join(f'\0{token.type}:{token.text}' for token in fun_tokens)
+            calls[name] = {token.text for token in fun_tokens if token.type == 'identifier' and token.text in signatures}
+
+    extended = {}
+    for name, signature in signatures.items():
+        reachable = {name}
+        work = [name]
+        while work:
+            for callee in calls[work.pop()] - reachable:
+                reachable.add(callee)
+                work.append(callee)
+        extended[name] = signature + ''.join(bodies[f] for f in sorted(reachable))
+    return extended
+
+def generate_cached(
+    source_code: str,
+    cache: CompilationCache | None = None,
+    opt_level: int = 0,
+    opt_stats: dict[str, OptimizationStats] | None = None
+) -> tuple[dict[str, list[ir.Instruction]], str]:
+    """Compiles source code into IR and assembly code, reusing the output of
+    function definitions found in the cache. Only the functions that miss the
+    cache are type checked and compiled, along with the top level expression.
+    The IR is optimized at `opt_level`, see `optimize`, and from level 1 on
+    the assembly code goes through `optimize_assembly` too. The optimization
+    statistics of each function are stored in `opt_stats` if given."""
+    tokens = tokenize(source_code)
+    items = parse_top_level(tokens)
+    module = build_module([item.node for item in items])
+
+    signatures = {
+        fun.name.name: f'{fun.name.name}: {_fun_type(fun)}'
+        for fun in module.funcs
+    }
+    if opt_level >= inline_level:
+        signatures = _with_callee_bodies(items, tokens, signatures)
+    keys: dict[str, str] = {}
+    cached: dict[str, CachedFunction] = {}
+    for item in items:
+        if isinstance(item.node, ast.FunDefinition):
+            name = item.node.name.name
+            keys[name] = function_key(tokens[item.start:item.end], signatures, f'-O{opt_level}')
+            if cache is not None and (entry := cache.get(keys[name])) is not None:
+                cached[name] = entry
+
+    symtab = SymTab[Type](locals=dict(top_level_symtab))
+    for fun in module.funcs:
+        if fun.name.name in cached:
+            symtab.set_local(fun.name.name, _fun_type(fun))
+    remaining = ast.Module(
+        funcs=[fun for fun in module.funcs if fun.name.name not in cached],
+        expr=module.expr
+    )
+    if remaining.funcs or remaining.expr is not None:
+        typecheck(remaining, symtab)
+    stats: dict[str, OptimizationStats] = {}
+    generated = optimize_module(
+        generate_ir(root_types, remaining), opt_level, stats,
+        compiled={name: entry.instructions for name, entry in cached.items()}
+    )
+
+    instructions: dict[str, list[ir.Instruction]] = {'main': generated['main']}
+    peephole = opt_level >= 1
+    functions = [generate_function_assembly('main', generated['main'], peephole=peephole,
+                                            peephole_stats=stats['main'].peephole)]
+    for fun in module.funcs:
+        name = fun.name.name
+        entry = cached.get(name)
+        if entry is None:
+            assembly = generate_function_assembly(name, generated[name], peephole=peephole,
+                                                  peephole_stats=stats[name].peephole)
+            entry = CachedFunction(generated[name], assembly, stats[name])
+            if cache is not None:
+                cache.put(keys[name], entry)
+        instructions[name] = entry.instructions
+        stats[name] = entry.stats
+        functions.append(entry.assembly)
+    if opt_stats is not None:
+        opt_stats.update((name, stats[name]) for name in instructions)
+
+    if cache is not None:
+        cache.evict()
+    return instructions, link_assembly(functions)
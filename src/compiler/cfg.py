@@ -0,0 +1,217 @@
+from dataclasses import dataclass, field
+
+from compiler import ir
+
+@dataclass
+class BasicBlock:
+    """A maximal run of instructions with one entry at the top and one exit at the bottom.
+    Blocks start at labels and end after jumps and returns."""
+    index: int
+    name: str
+    instructions: list[ir.Instruction]
+    successors: list[int] = field(default_factory=list)
+    predecessors: list[int] = field(default_factory=list)
+
+@dataclass
+class Loop:
+    """A natural loop: the header and every block that reaches a back edge
+    to it without passing through it."""
+    header: int
+    blocks: set[int]
+    parent: 'Loop | None' = None
+    children: list['Loop'] = field(default_factory=list)
+
+    def depth(self) -> int:
+        loop, depth = self.parent, 1
+        while loop is not None:
+            loop, depth = loop.parent, depth + 1
+        return depth
+
+@dataclass
+class ControlFlowGraph:
+    fun_name: str
+    blocks: list[BasicBlock]
+    """The blocks in their original order. The first one is the entry."""
+    idom: list[int | None]
+    """The immediate dominator of each block. None for the entry and unreachable blocks."""
+    loops: list[Loop]
+    """All loops, outer loops before the loops nested in them."""
+
+    def instructions(self) -> list[ir.Instruction]:
+        """Returns the instructions of all blocks as one list, as the IR generator lays them out."""
+        return [insn for block in self.blocks for insn in block.instructions]
+
+    def reachable(self, block: int) -> bool:
+        return block == 0 or self.idom[block] is not None
+
+    def dominates(self, a: int, b: int) -> bool:
+        """Tells whether every path from the entry to block `b` goes through block `a`."""
+        if not self.reachable(b):
+            return False
+        node: int | None = b
+        while node is not None:
+            if node == a:
+                return True
+            node = self.idom[node]
+        return False
+
+    def dominance_frontiers(self) -> list[set[int]]:
+        """Returns the blocks where the dominance of each block ends."""
+        frontiers: list[set[int]] = [set() for _ in self.blocks]
+        for block in self.blocks:
+            preds = [p for p in block.predecessors if self.reachable(p)]
+            if len(preds) < 2:
+                continue
+            for p in preds:
+                runner: int | None = p
+                while runner is not None and runner != self.idom[block.index]:
+                    frontiers[runner].add(block.index)
+                    runner = self.idom[runner]
+        return frontiers
+
+    def loop_depth(self, block: int) -> int:
+        return sum(1 for loop in self.loops if block in loop.blocks)
+
+    def to_dot(self) -> str:
+        """Formats the graph in Graphviz DOT language."""
+        def escape(text: str) -> str:
+            return text.replace('\\', '\\\\').replace('"', '\\"')
+
+        lines = [f'digraph "{escape(self.fun_name)}" {{', '    node [shape=box, fontname="monospace"];']
+        for block in self.blocks:
+            title = block.name
+            if any(loop.header == block.index for loop in self.loops):
+                title += f' (loop header, depth {self.loop_depth(block.index)})'
+            body = ''.join(escape(str(insn)) + '\\l' for insn in block.instructions)
+            lines.append(f'    b{block.index} [label="{escape(title)}\\l{body}"];')
+        for block in self.blocks:
+            last = block.instructions[-1] if block.instructions else None
+            for i, s in enumerate(block.successors):
+                attributes = ''
+                if isinstance(last, ir.CondJump):
+                    attributes = ' [label="then"]' if i == 0 else ' [label="else"]'
+                lines.append(f'    b{block.index} -> b{s}{attributes};')
+        lines.append('}')
+        return '\n'.join(lines)
+
+def is_terminator(insn: ir.Instruction) -> bool:
+    return isinstance(insn, (ir.Jump, ir.CondJump, ir.Return))
+
+def build_cfg(fun_name: str, instructions: list[ir.Instruction]) -> ControlFlowGraph:
+    """Splits a function's instructions into basic blocks and analyzes their control flow."""
+    blocks: list[BasicBlock] = []
+    current: list[ir.Instruction] = []
+
+    def finish_block() -> None:
+        nonlocal current
+        if current or not blocks:
+            first = current[0] if current else None
+            if isinstance(first, ir.Label):
+                name = first.name
+            else:
+                name = 'entry' if not blocks else f'block{len(blocks)}'
+            blocks.append(BasicBlock(len(blocks), name, current))
+        current = []
+
+    for insn in instructions:
+        if isinstance(insn, ir.Label) and current:
+            finish_block()
+        current.append(insn)
+        if is_terminator(insn):
+            finish_block()
+    if current or not blocks:
+        finish_block()
+
+    label_blocks = {
+        block.instructions[0].name: block.index
+        for block in blocks
+        if block.instructions and isinstance(block.instructions[0], ir.Label)
+    }
+    for block in blocks:
+        last = block.instructions[-1] if block.instructions else None
+        match last:
+            case ir.Jump():
+                block.successors = [label_blocks[last.label.name]]
+            case ir.CondJump():
+                block.successors = [label_blocks[last.then_label.name], label_blocks[last.else_label.name]]
+            case ir.Return():
+                block.successors = []
+            case _:
+                block.successors = [block.index + 1] if block.index + 1 < len(blocks) else []
+        for s in block.successors:
+            blocks[s].predecessors.append(block.index)
+
+    idom = _immediate_dominators(blocks)
+    graph = ControlFlowGraph(fun_name, blocks, idom, [])
+    graph.loops = _find_loops(graph)
+    return graph
+
+def _reverse_postorder(blocks: list[BasicBlock]) -> list[int]:
+    order: list[int] = []
+    visited = {0}
+    stack = [(0, iter(blocks[0].successors))]
+    while stack:
+        node, successors = stack[-1]
+        for s in successors:
+            if s not in visited:
+                visited.add(s)
+                stack.append((s, iter(blocks[s].successors)))
+                break
+        else:
+            stack.pop()
+            order.append(node)
+    order.reverse()
+    return order
+
+def _immediate_dominators(blocks: list[BasicBlock]) -> list[int | None]:
+    """Computes dominators with the iterative algorithm of Cooper, Harvey and Kennedy."""
+    order = _reverse_postorder(blocks)
+    position = {b: i for i, b in enumerate(order)}
+    idom: list[int | None] = [None] * len(blocks)
+    idom[0] = 0
+
+    def intersect(a: int, b: int) -> int:
+        while a != b:
+            while position[a] > position[b]:
+                a = idom[a]  # type: ignore[assignment]
+            while position[b] > position[a]:
+                b = idom[b]  # type: ignore[assignment]
+        return a
+
+    changed = True
+    while changed:
+        changed = False
+        for b in order[1:]:
+            processed = [p for p in blocks[b].predecessors if idom[p] is not None]
+            new_idom = processed[0]
+            for p in processed[1:]:
+                new_idom = intersect(p, new_idom)
+            if idom[b] != new_idom:
+                idom[b] = new_idom
+                changed = True
+
+    idom[0] = None
+    return idom
+
+def _find_loops(graph: ControlFlowGraph) -> list[Loop]:
+    loops_by_header: dict[int, Loop] = {}
+    for block in graph.blocks:
+        for s in block.successors:
+            if graph.dominates(s, block.index):  # back edge
+                loop = loops_by_header.setdefault(s, Loop(s, {s}))
+                stack = [block.index]
+                while stack:
+                    b = stack.pop()
+                    if b not in loop.blocks and graph.reachable(b):
+                        loop.blocks.add(b)
+                        stack.extend(graph.blocks[b].predecessors)
+
+    # The parent of a loop is the smallest other loop containing its header
+    loops = sorted(loops_by_header.values(), key=lambda loop: -len(loop.blocks))
+    for i, loop in enumerate(loops):
+        for outer in reversed(loops[:i]):
+            if loop.header in outer.blocks:
+                loop.parent = outer
+                outer.children.append(loop)
+                break
+    return loops
@@ -0,0 +1,108 @@
+import json
+import os
+import socket
+import sys
+from typing import Any
+
+usage = f"""
+Usage: {sys.argv[0]} --socket=PATH [-O0|-O1|-O2] <command> [source_code_file...]
+
+Sends source code files to a compile server started with 'serve --socket=PATH'
+and prints the results. Reads standard input if no files are given.
+'compile' writes each executable next to its source file, without the extension,
+or to 'compiled_program' for standard input.
+""".strip() + "\n"
+
+class CompileClient:
+    """Sends requests to a compile server over its Unix socket.
+    One connection is reused for all requests."""
+
+    def __init__(self, socket_path: str) -> None:
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.connect(socket_path)
+        self._reader = self._socket.makefile('r', encoding='utf-8')
+        self._writer = self._socket.makefile('w', encoding='utf-8')
+
+    def request(
+        self,
+        command: str,
+        source_code: str,
+        output_file: str | None = None,
+        opt_level: int = 0
+    ) -> str | None:
+        """Runs a command on the server and returns its output.
+        Raises an exception with the server's error message if the command failed."""
+        request: dict[str, Any] = {'command': command, 'source': source_code, 'opt_level': opt_level}
+        if output_file is not None:
+            request['output_file'] = output_file
+        self._writer.write(json.dumps(request) + '\n')
+        self._writer.flush()
+
+        line = self._reader.readline()
+        if not line:
+            raise Exception('Compile server closed the connection')
+        response = json.loads(line)
+        if not response['ok']:
+            raise Exception(response['error'])
+        output: str | None = response['output']
+        return output
+
+    def close(self) -> None:
+        self._reader.close()
+        self._writer.close()
+        self._socket.close()
+
+    def __enter__(self) -> 'CompileClient':
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+def main() -> int:
+    socket_path: str | None = None
+    command: str | None = None
+    input_files: list[str] = []
+    opt_level = 0
+    for arg in sys.argv[1:]:
+        if arg in ['-h', '--help']:
+            print(usage)
+            return 0
+        elif arg.startswith('--socket='):
+            socket_path = arg.split('=', 1)[1]
+        elif arg in ['-O0', '-O1', '-O2']:
+            opt_level = int(arg[2:])
+        elif arg.startswith('-'):
+            raise Exception(f"Unknown argument: {arg}")
+        elif command is None:
+            command = arg
+        else:
+            input_files.append(arg)
+
+    if socket_path is None or command is None:
+        print(f"Error: socket or command argument missing\n\n{usage}", file=sys.stderr)
+        return 1
+
+    failures = 0
+    with CompileClient(socket_path) as client:
+        sources = [(f, None) for f in input_files] if input_files else [(None, sys.stdin.read())]
+        for input_file, source_code in sources:
+            output_file = 'compiled_program'
+            if input_file is not None:
+                with open(input_file) as f:
+                    source_code = f.read()
+                output_file, extension = os.path.splitext(input_file)
+                if not extension:
+                    output_file += '.out'
+            assert source_code is not None
+            try:
+                output = client.request(command, source_code, os.path.abspath(output_file), opt_level)
+            except Exception as e:
+                print(f"{input_file or '<stdin>'}: {e}", file=sys.stderr)
+                failures += 1
+                continue
+            if output is not None:
+                print(output)
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
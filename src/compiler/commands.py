@@ -0,0 +1,55 @@
+from compiler.assembler import assemble
+from compiler.cache import CompilationCache, generate_cached
+from compiler.cfg import build_cfg
+from compiler.interpreter import interpret
+from compiler.optimizer import OptimizationStats
+from compiler.parser import parse
+from compiler.symtab import SymTab, top_level_symtab
+from compiler.tokenizer import tokenize
+from compiler.type_checker import typecheck
+
+source_commands = ['tokenize', 'interpret', 'parse', 'typecheck', 'ir', 'cfg', 'asm', 'compile']
+
+def run_command(
+    command: str,
+    source_code: str,
+    cache: CompilationCache | None = None,
+    output_file: str = 'compiled_program',
+    opt_level: int = 0,
+    opt_stats: dict[str, OptimizationStats] | None = None
+) -> str | None:
+    """Runs one of `source_commands` on source code and returns the text it prints,
+    or None if it prints nothing. 'compile' writes an executable to `output_file`.
+    'ir', 'cfg', 'asm' and 'compile' optimize at `opt_level`, and store
+    the optimization statistics of each function in `opt_stats` if given."""
+    symtab = SymTab(locals=dict(top_level_symtab))
+    if command == 'interpret':
+        result = interpret(parse(tokenize(source_code)))
+        return str(result)
+    elif command == 'tokenize':
+        tokenized_source_code = tokenize(source_code)
+        return '\nTokenized source code:\n\n' + "\n".join([str(token) for token in tokenized_source_code])
+    elif command == 'parse':
+        parsed_source_code = parse(tokenize(source_code))
+        return f'\nParsed source code:\n\n{parsed_source_code} \n'
+    elif command == "typecheck":
+        typechecked_source_code = typecheck(parse(tokenize(source_code)), symtab)
+        return f'Source code\'s return type:\n\n{typechecked_source_code}'
+    elif command == 'ir':
+        ir_instructions, _ = generate_cached(source_code, cache, opt_level, opt_stats)
+        return "\n".join(
+            f"{fun}:\n" + "\n".join([str(ins) for ins in instrs])
+            for fun, instrs in ir_instructions.items()
+        )
+    elif command == 'cfg':
+        ir_instructions, _ = generate_cached(source_code, cache, opt_level, opt_stats)
+        return "\n\n".join(build_cfg(fun, instrs).to_dot() for fun, instrs in ir_instructions.items())
+    elif command == 'asm':
+        _, asm_code = generate_cached(source_code, cache, opt_level, opt_stats)
+        return asm_code
+    elif command == 'compile':
+        _, asm_code = generate_cached(source_code, cache, opt_level, opt_stats)
+        assemble(asm_code, output_file)
+        return None
+    else:
+        raise Exception(f"Unknown command: {command}")
@@ -0,0 +1,126 @@
+from compiler import ir
+from compiler.intrinsics import all_intrinsics
+
+def fold_call(fun: str, args: list[int | bool]) -> int | bool | None:
+    """Computes the result of an intrinsic on constant arguments like the generated
+    code would, with 64-bit wraparound. Returns None for divisions that would trap."""
+    def wrap(n: int) -> int:
+        return (n + 2**63) % 2**64 - 2**63
+
+    match fun, args:
+        case 'unary_-', [int(a)]:
+            return wrap(-a)
+        case 'unary_not', [bool(a)]:
+            return not a
+        case '==', [a, b]:
+            return a == b
+        case '!=', [a, b]:
+            return a != b
+    if not all(isinstance(a, int) and not isinstance(a, bool) for a in args) or len(args) != 2:
+        return None
+    a, b = args
+    match fun:
+        case '+':
+            return wrap(a + b)
+        case '-':
+            return wrap(a - b)
+        case '*':
+            return wrap(a * b)
+        case '/' | '%':
+            if b == 0 or (a == -2**63 and b == -1):
+                return None
+            quotient = abs(a) // abs(b) * (1 if (a < 0) == (b < 0) else -1)
+            return quotient if fun == '/' else a - b * quotient
+        case '<':
+            return a < b
+        case '<=':
+            return a <= b
+        case '>':
+            return a > b
+        case '>=':
+            return a >= b
+    return None
+
+
+def _is_int(value: int | bool | None, n: int) -> bool:
+    return type(value) is int and value == n
+
+def _simplify(
+    insn: ir.Call,
+    constants: dict[ir.IRVar, int | bool]
+) -> ir.Instruction | None:
+    """Simplifies a call with some constant arguments, or the same variable
+    as both arguments, into a copy or a constant. Never removes a division
+    that could trap."""
+    if len(insn.args) != 2:
+        return None
+    a, b = insn.args
+    ca, cb = constants.get(a), constants.get(b)
+
+    def copy(source: ir.IRVar) -> ir.Instruction:
+        return ir.Copy(insn.location, source, insn.dest)
+
+    def load(value: int | bool) -> ir.Instruction:
+        if isinstance(value, bool):
+            return ir.LoadBoolConst(insn.location, value, insn.dest)
+        return ir.LoadIntConst(insn.location, value, insn.dest)
+
+    match insn.fun.name:
+        case '+' if _is_int(ca, 0):
+            return copy(b)
+        case '+' | '-' if _is_int(cb, 0):
+            return copy(a)
+        case '*' if _is_int(ca, 0) or _is_int(cb, 0):
+            return load(0)
+        case '*' if _is_int(ca, 1):
+            return copy(b)
+        case '*' | '/' if _is_int(cb, 1):
+            return copy(a)
+        case '%' if _is_int(cb, 1):
+            return load(0)
+        case '-' if a == b:
+            return load(0)
+        case '==' if cb is True:
+            return copy(a)
+        case '!=' if cb is False:
+            return copy(a)
+        case '==' | '<=' | '>=' if a == b:
+            return load(True)
+        case '!=' | '<' | '>' if a == b:
+            return load(False)
+    return None
+
+def fold_constants(instructions: list[ir.Instruction]) -> list[ir.Instruction]:
+    """Folds intrinsic calls on constants into constant loads, and simplifies
+    identities like `x * 1` and `x - x`. Expects SSA form, where a variable
+    loaded with a constant has that value everywhere it is read."""
+    constants: dict[ir.IRVar, int | bool] = {}
+    changed = True
+    while changed:
+        changed = False
+        result: list[ir.Instruction] = []
+        for insn in instructions:
+            if isinstance(insn, ir.Call) and insn.fun.name in all_intrinsics:
+                args = [constants.get(a) for a in insn.args]
+                folded = None
+                if all(a is not None for a in args):
+                    folded = fold_call(insn.fun.name, args)  # type: ignore[arg-type]
+                if isinstance(folded, bool):
+                    insn = ir.LoadBoolConst(insn.location, folded, insn.dest)
+                elif folded is not None:
+                    insn = ir.LoadIntConst(insn.location, folded, insn.dest)
+                else:
+                    insn = _simplify(insn, constants) or insn
+                changed = changed or not isinstance(insn, ir.Call)
+            if isinstance(insn, ir.Copy) and insn.source in constants and insn.dest not in constants:
+                value = constants[insn.source]
+                if isinstance(value, bool):
+                    insn = ir.LoadBoolConst(insn.location, value, insn.dest)
+                else:
+                    insn = ir.LoadIntConst(insn.location, value, insn.dest)
+                changed = True
+            if isinstance(insn, (ir.LoadIntConst, ir.LoadBoolConst)):
+                constants[insn.dest] = insn.value
+            result.append(insn)
+        instructions = result
+    return instructions
@@ -0,0 +1,70 @@
+from compiler import ir
+from compiler.register_allocator import live_variables, uses_and_defs
+from compiler.ssa import map_vars
+
+def propagate_copies(instructions: list[ir.Instruction]) -> list[ir.Instruction]:
+    """Makes the readers of a copy read its source instead and removes the copy.
+    Expects SSA form, where neither variable of a copy is written again."""
+    sources: dict[ir.IRVar, ir.IRVar] = {}
+    for insn in instructions:
+        if isinstance(insn, ir.Copy):
+            sources[insn.dest] = insn.source
+
+    def original(v: ir.IRVar) -> ir.IRVar:
+        seen = {v}
+        while v in sources and sources[v] not in seen:
+            v = sources[v]
+            seen.add(v)
+        return v
+
+    return [
+        map_vars(insn, original, lambda v: v)
+        for insn in instructions
+        if not isinstance(insn, ir.Copy)
+    ]
+
+def coalesce_copies(instructions: list[ir.Instruction]) -> list[ir.Instruction]:
+    """Gives both variables of a copy the same name when they are never live
+    at the same time, which turns the copy into a self copy that is removed.
+    Meant for the copies left over from phis when leaving SSA form."""
+    live_out = live_variables(instructions)
+
+    # A variable interferes with the ones live where it's written,
+    # except with the source of a copy into it, which holds the same value
+    interference: dict[ir.IRVar, set[ir.IRVar]] = {}
+    for insn in instructions:
+        uses, defs = uses_and_defs(insn)
+        for v in uses + defs:
+            interference.setdefault(v, set())
+    for insn, live in zip(instructions, live_out):
+        for d in uses_and_defs(insn)[1]:
+            for v in live:
+                if v != d and not (isinstance(insn, ir.Copy) and v == insn.source):
+                    interference[d].add(v)
+                    interference[v].add(d)
+
+    names: dict[ir.IRVar, ir.IRVar] = {}
+
+    def name(v: ir.IRVar) -> ir.IRVar:
+        while v in names:
+            v = names[v]
+        return v
+
+    for insn in instructions:
+        if not isinstance(insn, ir.Copy):
+            continue
+        source, dest = name(insn.source), name(insn.dest)
+        if source == dest or dest in interference[source]:
+            continue
+        names[dest] = source
+        for v in interference.pop(dest):
+            interference[v].discard(dest)
+            interference[v].add(source)
+            interference[source].add(v)
+
+    result = []
+    for insn in instructions:
+        insn = map_vars(insn, name, name)
+        if not (isinstance(insn, ir.Copy) and insn.source == insn.dest):
+            result.append(insn)
+    return result
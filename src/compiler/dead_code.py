@@ -0,0 +1,50 @@
+from compiler import ir
+from compiler.cfg import build_cfg
+from compiler.intrinsics import all_intrinsics
+from compiler.register_allocator import uses_and_defs
+
+# Division and remainder stay even when their result is unused, since they trap on zero
+pure_intrinsics = set(all_intrinsics) - {'/', '%'}
+
+def remove_unreachable_blocks(instructions: list[ir.Instruction]) -> list[ir.Instruction]:
+    """Drops the blocks that no path from the start of the function reaches,
+    like code after `return`, `break` or `continue`."""
+    if not instructions:
+        return instructions
+    graph = build_cfg('', instructions)
+    return [
+        insn
+        for block in graph.blocks if graph.reachable(block.index)
+        for insn in block.instructions
+    ]
+
+def has_side_effects(insn: ir.Instruction) -> bool:
+    """Tells whether an instruction must stay even if nothing reads what it writes.
+    Parameter loads stay too, since their order tells which parameter they load."""
+    match insn:
+        case ir.LoadIntConst() | ir.LoadBoolConst() | ir.Copy() | ir.Phi():
+            return False
+        case ir.Call():
+            return insn.fun.name not in pure_intrinsics
+        case _:
+            return True
+
+def eliminate_dead_code(instructions: list[ir.Instruction]) -> list[ir.Instruction]:
+    """Removes the instructions whose results are never used, in SSA form.
+    Instructions with side effects are live, and so are the definitions of the
+    variables that live instructions read. Everything else is removed, including
+    values that only feed each other around a loop."""
+    definitions: dict[ir.IRVar, int] = {}
+    for i, insn in enumerate(instructions):
+        for v in uses_and_defs(insn)[1]:
+            definitions[v] = i
+
+    work = [i for i, insn in enumerate(instructions) if has_side_effects(insn)]
+    live = set(work)
+    while work:
+        for v in uses_and_defs(instructions[work.pop()])[0]:
+            d = definitions.get(v)
+            if d is not None and d not in live:
+                live.add(d)
+                work.append(d)
+    return [insn for i, insn in enumerate(instructions) if i in live]
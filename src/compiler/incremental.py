@@ -0,0 +1,174 @@
+import dataclasses
+from array import array
+from dataclasses import dataclass
+from typing import Any
+
+from compiler import ast
+from compiler.parser import TopLevelItem, build_module, parse_top_level
+from compiler.tokenizer import Location, TokenArray, TokenBuffer, scan, token_types, tokenize_compact
+
+@dataclass(frozen=True)
+class TextEdit:
+    """Replaces the characters `start:end` of the source with `text`."""
+    start: int
+    end: int
+    text: str
+
+@dataclass
+class ParsedSource:
+    """Source code with its tokens, top level items and module,
+    as needed by `reparse`."""
+    source_code: str
+    tokens: TokenArray
+    items: list[TopLevelItem]
+    module: ast.Module
+
+def parse_incremental(source_code: str) -> ParsedSource:
+    """Parses source code from scratch, keeping what `reparse` needs."""
+    tokens = tokenize_compact(source_code)
+    items = parse_top_level(tokens)
+    return ParsedSource(source_code, tokens, items, build_module([item.node for item in items]))
+
+def reparse(previous: ParsedSource, edit: TextEdit) -> ParsedSource:
+    """Applies an edit to previously parsed source code.
+
+    Only the tokens around the edit are lexed again, and only the top level
+    items they belong to are parsed again. Other items keep their AST nodes,
+    whose locations are updated in place if the edit moved them, so
+    `previous` must not be used afterwards.
+    The result is equal to parsing the edited source from scratch."""
+    old_source = previous.source_code
+    old_tokens = previous.tokens
+    source_code = old_source[:edit.start] + edit.text + old_source[edit.end:]
+    delta = len(edit.text) - (edit.end - edit.start)
+    edit_end = edit.start + len(edit.text)
+
+    # Tokens that end before the edit can't change, so lexing restarts
+    # from the end of the last of them.
+    first_changed = _first_token_ending_at_or_after(old_tokens, edit.start)
+    if first_changed > 0:
+        last = first_changed - 1
+        position = old_tokens.starts[last] + old_tokens.lengths[last]
+        line = old_tokens.lines[last]
+        column = old_tokens.columns[last] + old_tokens.lengths[last]
+    else:
+        position, line, column = 0, 1, 1
+
+    # Lex until a token lines up with an old token after the edit.
+    # From there on the old tokens are valid, only shifted.
+    relexed: list[tuple[int, int, int, int, int]] = []
+    first_reused = len(old_tokens)
+    old_index = first_changed
+    for token_type, start, end, line, column in scan(source_code, position, line, column):
+        if start >= edit_end:
+            while old_index < len(old_tokens) and old_tokens.starts[old_index] + delta < start:
+                old_index += 1
+            if (
+                old_index < len(old_tokens)
+                and old_tokens.starts[old_index] + delta == start
+                and old_tokens.lengths[old_index] == end - start
+                and token_types[old_tokens.type_ids[old_index]] == token_type
+                and source_code[start:end] == old_source[start - delta:end - delta]
+            ):
+                first_reused = old_index
+                break
+        relexed.append((token_types.index(token_type), start, end - start, line, column))
+
+    if first_reused < len(old_tokens):
+        line_shift = line - old_tokens.lines[first_reused]
+        column_shift = column - old_tokens.columns[first_reused]
+        shifted_line = old_tokens.lines[first_reused]
+    else:
+        line_shift = column_shift = shifted_line = 0
+
+    tokens = _splice_tokens(
+        source_code, old_tokens, first_changed, relexed, first_reused,
+        delta, line_shift, column_shift, shifted_line
+    )
+    token_shift = first_changed + len(relexed) - first_reused
+
+    # The item before the edit is parsed again too, since new tokens may continue it
+    old_items = previous.items
+    first_item = 0
+    while first_item < len(old_items) and old_items[first_item].end < first_changed:
+        first_item += 1
+    parse_start = old_items[first_item].start if first_item < len(old_items) else len(tokens)
+    reused_from = first_reused + token_shift
+    old_item_starts = {item.start: i for i, item in enumerate(old_items)}
+
+    def can_reuse_from(position: int) -> bool:
+        return position > reused_from and position - token_shift in old_item_starts
+
+    new_items = parse_top_level(
+        TokenBuffer(
+            (tokens[i] for i in range(parse_start, len(tokens))),
+            previous=tokens[parse_start - 1] if parse_start > 0 else None,
+            position=parse_start
+        ),
+        stop=can_reuse_from
+    ) if parse_start < len(tokens) else []
+
+    items = old_items[:first_item] + new_items
+    parsed_until = new_items[-1].end if new_items else parse_start
+    if parsed_until < len(tokens):
+        for item in old_items[old_item_starts[parsed_until - token_shift]:]:
+            if line_shift != 0 or column_shift != 0:
+                _shift_locations(item.node, line_shift, column_shift, shifted_line)
+            item.start += token_shift
+            item.end += token_shift
+            items.append(item)
+
+    return ParsedSource(source_code, tokens, items, build_module([item.node for item in items]))
+
+def _first_token_ending_at_or_after(tokens: TokenArray, offset: int) -> int:
+    low, high = 0, len(tokens)
+    while low < high:
+        middle = (low + high) // 2
+        if tokens.starts[middle] + tokens.lengths[middle] < offset:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+def _splice_tokens(
+    source_code: str,
+    old: TokenArray,
+    first_changed: int,
+    relexed: list[tuple[int, int, int, int, int]],
+    first_reused: int,
+    delta: int,
+    line_shift: int,
+    column_shift: int,
+    shifted_line: int
+) -> TokenArray:
+    tokens = TokenArray(source_code)
+    tokens.type_ids = old.type_ids[:first_changed] + array('B', (t[0] for t in relexed)) + old.type_ids[first_reused:]
+    tokens.starts = old.starts[:first_changed] + array('I', (t[1] for t in relexed)) \
+        + array('I', (s + delta for s in old.starts[first_reused:]))
+    tokens.lengths = old.lengths[:first_changed] + array('I', (t[2] for t in relexed)) + old.lengths[first_reused:]
+    tokens.lines = old.lines[:first_changed] + array('I', (t[3] for t in relexed)) \
+        + array('I', (l + line_shift for l in old.lines[first_reused:]))
+    tokens.columns = old.columns[:first_changed] + array('I', (t[4] for t in relexed)) + array('I', (
+        c + column_shift if l == shifted_line else c
+        for l, c in zip(old.lines[first_reused:], old.columns[first_reused:])
+    ))
+    return tokens
+
+def _shift_locations(node: Any, line_shift: int, column_shift: int, shifted_line: int) -> None:
+    """Moves the locations of all nodes in a subtree. Only nodes on `shifted_line`
+    move sideways, since the edit ends on that line."""
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+        elif dataclasses.is_dataclass(node) and not isinstance(node, type):
+            loc = getattr(node, 'loc', None)
+            if isinstance(loc, Location):
+                setattr(node, 'loc', Location(
+                    line=loc.line + line_shift,
+                    column=loc.column + column_shift if loc.line == shifted_line else loc.column
+                ))
+            for field in dataclasses.fields(node):
+                if field.name not in ('loc', 'type'):
+                    stack.append(getattr(node, field.name))
@@ -0,0 +1,145 @@
+from dataclasses import replace
+from typing import Callable
+
+from compiler import ir
+from compiler.register_allocator import is_function_call, uses_and_defs
+from compiler.ssa import map_vars
+
+# The largest callee, in instructions other than labels, that is inlined
+inline_budget = 40
+
+def call_graph(instructions: dict[str, list[ir.Instruction]]) -> dict[str, set[str]]:
+    """Returns the functions of the module that each function calls."""
+    return {
+        name: {
+            insn.fun.name for insn in fun_instructions
+            if isinstance(insn, ir.Call) and is_function_call(insn) and insn.fun.name in instructions
+        }
+        for name, fun_instructions in instructions.items()
+    }
+
+def bottom_up_order(graph: dict[str, set[str]]) -> list[list[str]]:
+    """Groups the functions into strongly connected components, the sets of
+    functions that call each other, ordered so that a component comes after
+    every component whose functions it calls. Uses Tarjan's algorithm."""
+    index: dict[str, int] = {}
+    lowlink: dict[str, int] = {}
+    on_stack: set[str] = set()
+    stack: list[str] = []
+    components: list[list[str]] = []
+
+    for root in graph:
+        if root in index:
+            continue
+        work = [(root, iter(sorted(graph[root])))]
+        index[root] = lowlink[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        while work:
+            node, callees = work[-1]
+            for callee in callees:
+                if callee not in index:
+                    index[callee] = lowlink[callee] = len(index)
+                    stack.append(callee)
+                    on_stack.add(callee)
+                    work.append((callee, iter(sorted(graph[callee]))))
+                    break
+                if callee in on_stack:
+                    lowlink[node] = min(lowlink[node], index[callee])
+            else:
+                work.pop()
+                if work:
+                    lowlink[work[-1][0]] = min(lowlink[work[-1][0]], lowlink[node])
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(sorted(component))
+    return components
+
+def _size(instructions: list[ir.Instruction]) -> int:
+    return sum(1 for insn in instructions if not isinstance(insn, ir.Label))
+
+def inline_calls(
+    instructions: list[ir.Instruction],
+    callees: dict[str, list[ir.Instruction]],
+    budget: int = inline_budget
+) -> tuple[list[ir.Instruction], int]:
+    """Replaces the calls to the given functions that fit in the budget with
+    their bodies. The callee's variables and labels get a prefix unique to
+    the call, its parameter loads become copies of the arguments and its
+    returns become copies into the call's result and jumps past the body.
+    Returns the new instructions and the number of calls inlined."""
+    result: list[ir.Instruction] = []
+    inlined = 0
+    for call in instructions:
+        body = callees.get(call.fun.name) if isinstance(call, ir.Call) else None
+        if body is None or _size(body) > budget:
+            result.append(call)
+            continue
+        assert isinstance(call, ir.Call)
+        inlined += 1
+        prefix = f'{inlined}_{call.fun.name}_'
+        local_vars = {v for insn in body for v in uses_and_defs(insn)[1]}
+
+        def rename(v: ir.IRVar) -> ir.IRVar:
+            return ir.IRVar(prefix + v.name) if v in local_vars else v
+
+        def rename_label(label: ir.Label) -> ir.Label:
+            return replace(label, name=prefix + label.name)
+
+        end = ir.Label(call.location, f'{prefix}return')
+        param_index = 0
+        for insn in body:
+            match insn:
+                case ir.LoadIntParam() | ir.LoadBoolParam():
+                    result.append(ir.Copy(insn.location, call.args[param_index], rename(insn.dest)))
+                    param_index += 1
+                case ir.Return():
+                    result.append(ir.Copy(insn.location, rename(insn.value), call.dest))
+                    result.append(ir.Jump(insn.location, end))
+                case ir.Label():
+                    result.append(rename_label(insn))
+                case ir.Jump():
+                    result.append(replace(insn, label=rename_label(insn.label)))
+                case ir.CondJump():
+                    result.append(replace(
+                        insn,
+                        cond=rename(insn.cond),
+                        then_label=rename_label(insn.then_label),
+                        else_label=rename_label(insn.else_label)
+                    ))
+                case _:
+                    result.append(map_vars(insn, rename, rename))
+        result.append(end)
+    return result, inlined
+
+def inline_functions(
+    instructions: dict[str, list[ir.Instruction]],
+    optimize: Callable[[str, list[ir.Instruction], int], list[ir.Instruction]],
+    compiled: dict[str, list[ir.Instruction]] = {},
+    budget: int = inline_budget
+) -> dict[str, list[ir.Instruction]]:
+    """Inlines small functions across a module and optimizes every function
+    with `optimize(name, instructions, calls_inlined)`. Callees are done
+    before their callers, so what gets inlined is the callee's optimized body,
+    with its own callees already inlined. Functions that call each other,
+    directly or through others, aren't inlined into each other, so recursion
+    is never unrolled. `compiled` holds the final IR of functions that are
+    not compiled again, like the ones found in a cache."""
+    done = dict(compiled)
+    graph = call_graph(instructions | compiled)
+    for component in bottom_up_order(graph):
+        callees = {
+            name: done[name] for name in set().union(*(graph[f] for f in component))
+            if name not in component and name != 'main'
+        }
+        for name in component:
+            if name in instructions:
+                inlined_instructions, count = inline_calls(instructions[name], callees, budget)
+                done[name] = optimize(name, inlined_instructions, count)
+    return {name: done[name] for name in instructions}
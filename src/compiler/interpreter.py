@@ -1,18 +1,19 @@
 from typing import Any
 from compiler import ast
+from compiler.trampoline import Step, run_steps
 
 Value = int | bool | None
 
 def interpret(node: ast.Module) -> Value:
     expr = node.expr
-    def interpret_expr(node: ast.Expression | None) -> Value:
+    def interpret_expr(node: ast.Expression | None) -> Step[Value]:
         match node:
             case ast.Literal():
                 return node.value
             
             case ast.BinaryOp():
-                a: Any = interpret_expr(node.left)
-                b: Any = interpret_expr(node.right)
+                a: Any = yield interpret_expr(node.left)
+                b: Any = yield interpret_expr(node.right)
                 if node.op == '+':
                     return a + b
                 elif node.op == '-':
@@ -32,15 +33,15 @@ def interpret(node: ast.Module) -> Value:
                 
             case ast.IfExpression():
                 if node.else_clause is not None:
-                    if interpret_expr(node.cond):
-                        return interpret_expr(node.then_clause)
+                    if (yield interpret_expr(node.cond)):
+                        return (yield interpret_expr(node.then_clause))
                     else:
-                        return interpret_expr(node.else_clause)
+                        return (yield interpret_expr(node.else_clause))
                 else:
-                    if interpret_expr(node.cond):                        
-                        return interpret_expr(node.then_clause)
+                    if (yield interpret_expr(node.cond)):                        
+                        return (yield interpret_expr(node.then_clause))
                     return None
             
             case _:
                 raise Exception(f"Unsupported AST node {node}")
-    return interpret_expr(expr)
\ No newline at end of file
+    return run_steps(interpret_expr(expr))
\ No newline at end of file
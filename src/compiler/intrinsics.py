@@ -2,12 +2,79 @@ from dataclasses import dataclass
 from typing import Callable
 
 
+@dataclass(frozen=True)
+class Register:
+    name: str
+
+    def __str__(self) -> str:
+        return self.name
+
+
+@dataclass(frozen=True)
+class StackSlot:
+    """A variable's place in the stack frame, relative to the frame pointer."""
+    offset: int
+
+    def __str__(self) -> str:
+        return f'{self.offset}(%rbp)'
+
+
+@dataclass(frozen=True)
+class Immediate:
+    value: int
+
+    def __str__(self) -> str:
+        return f'${self.value}'
+
+    def fits_in_32_bits(self) -> bool:
+        """Tells whether the value can be an operand of other instructions than movabsq."""
+        return -2**31 <= self.value < 2**31
+
+
+Location = Register | StackSlot
+Operand = Register | StackSlot | Immediate
+
+RAX = Register('%rax')
+RDX = Register('%rdx')
+
+
 @dataclass
 class IntrinsicArgs():
-    arg_refs: list[str]
-    result_register: str
+    """The operands of an intrinsic. The arguments may be in registers, in stack
+    slots or known constants, and the result goes straight to its location.
+    Intrinsics may use rax and rdx for themselves, which never hold variables."""
+    args: list[Operand]
+    result: Location
     emit: Callable[[str], None]
 
+    def load(self, operand: Operand, register: Register) -> None:
+        """Copies an operand to a register, unless it's already there."""
+        if isinstance(operand, Immediate) and not operand.fits_in_32_bits():
+            self.emit(f'movabsq {operand}, {register}')
+        elif operand != register:
+            self.emit(f'movq {operand}, {register}')
+
+    def source(self, operand: Operand, scratch: Register = RDX) -> str:
+        """Returns the operand as the source of an instruction other than movq,
+        moving an immediate that doesn't fit there to `scratch` first."""
+        if isinstance(operand, Immediate) and not operand.fits_in_32_bits():
+            self.load(operand, scratch)
+            return str(scratch)
+        return str(operand)
+
+    def work_register(self, *read_later: Operand) -> Register:
+        """Returns the register to compute the result in: the result's own
+        register, if it is one and none of the operands read after the
+        result is first written are in it, rax otherwise."""
+        if isinstance(self.result, Register) and self.result not in read_later:
+            return self.result
+        return RAX
+
+    def store(self, register: Register) -> None:
+        """Moves the result from the register it was computed in to its location."""
+        if register != self.result:
+            self.emit(f'movq {register}, {self.result}')
+
 
 Intrinsic = Callable[[IntrinsicArgs], None]
 
@@ -25,54 +92,196 @@ def _intrinsic(name: str) -> Callable[[Intrinsic], Intrinsic]:
 
 @_intrinsic("unary_-")
 def unary_minus(a: IntrinsicArgs) -> None:
-    a.emit(f'movq {a.arg_refs[0]}, {a.result_register}')
-    a.emit(f'negq {a.result_register}')
+    r = a.work_register()
+    a.load(a.args[0], r)
+    a.emit(f'negq {r}')
+    a.store(r)
 
 
 @_intrinsic("unary_not")
 def unary_not(a: IntrinsicArgs) -> None:
-    a.emit(f'movq {a.arg_refs[0]}, {a.result_register}')
-    a.emit(f'xorq $1, {a.result_register}')
+    r = a.work_register()
+    a.load(a.args[0], r)
+    a.emit(f'xorq $1, {r}')
+    a.store(r)
+
+
+def _two_operand(a: IntrinsicArgs, opcode: str) -> None:
+    r = a.work_register(a.args[1])
+    a.load(a.args[0], r)
+    a.emit(f'{opcode} {a.source(a.args[1])}, {r}')
+    a.store(r)
 
 
 @_intrinsic("+")
 def plus(a: IntrinsicArgs) -> None:
-    if a.result_register != a.arg_refs[0]:
-        a.emit(f'movq {a.arg_refs[0]}, {a.result_register}')
-    a.emit(f'addq {a.arg_refs[1]}, {a.result_register}')
+    _two_operand(a, 'addq')
 
 
 @_intrinsic("-")
 def minus(a: IntrinsicArgs) -> None:
-    if a.result_register != a.arg_refs[0]:
-        a.emit(f'movq {a.arg_refs[0]}, {a.result_register}')
-    a.emit(f'subq {a.arg_refs[1]}, {a.result_register}')
+    _two_operand(a, 'subq')
 
 
 @_intrinsic("*")
 def multiply(a: IntrinsicArgs) -> None:
-    if a.result_register != a.arg_refs[0]:
-        a.emit(f'movq {a.arg_refs[0]}, {a.result_register}')
-    a.emit(f'imulq {a.arg_refs[1]}, {a.result_register}')
+    left, right = a.args
+    if isinstance(left, Immediate) and not isinstance(right, Immediate):
+        left, right = right, left
+    if isinstance(right, Immediate):
+        r = a.work_register()
+        _multiply_by_constant(a, left, r, right.value)
+        a.store(r)
+    else:
+        _two_operand(IntrinsicArgs([left, right], a.result, a.emit), 'imulq')
+
+
+def _specialized_divisor(a: IntrinsicArgs) -> int | None:
+    """Returns the divisor if it's a constant that division and remainder
+    can be done by without idivq. They need idivq for 0 and -1, to trap like
+    it does on division by zero and on the smallest Int divided by -1."""
+    dividend, divisor = a.args
+    if isinstance(divisor, Immediate) and divisor.value not in [0, -1] and not isinstance(dividend, Immediate):
+        return divisor.value
+    return None
+
+
+def _idivq(a: IntrinsicArgs) -> None:
+    """Divides the first argument by the second, leaving the quotient
+    in rax and the remainder in rdx."""
+    divisor = a.args[1]
+    if isinstance(divisor, Immediate):
+        # idivq can't take an immediate and rax and rdx are taken, so it goes on the stack
+        a.emit(f'pushq {a.source(divisor, RAX)}')
+    a.load(a.args[0], RAX)
+    a.emit('cqto')  # Sign extends rax into rdx, which idivq divides along with rax
+    if isinstance(divisor, Immediate):
+        a.emit('idivq (%rsp)')
+        a.emit('addq $8, %rsp')
+    else:
+        a.emit(f'idivq {divisor}')
 
 
 @_intrinsic("/")
 def divide(a: IntrinsicArgs) -> None:
-    a.emit(f'movq {a.arg_refs[0]}, %rax')
-    a.emit('cqto')  # TODO: explain
-    a.emit(f'idivq {a.arg_refs[1]}')
-    if a.result_register != '%rax':
-        a.emit(f'movq %rax, {a.result_register}')
+    if (d := _specialized_divisor(a)) is not None:
+        _divide_by_constant(a, d)
+    else:
+        _idivq(a)
+    a.store(RAX)
 
 
 @_intrinsic("%")
 def remainder(a: IntrinsicArgs) -> None:
-    # Same as division, but remainder is in register 'rdx'
-    a.emit(f'movq {a.arg_refs[0]}, %rax')
-    a.emit('cqto')
-    a.emit(f'idivq {a.arg_refs[1]}')
-    if a.result_register != '%rdx':
-        a.emit(f'movq %rdx, {a.result_register}')
+    if (d := _specialized_divisor(a)) is not None:
+        # a % d = a - a / d * d, and the sign of d doesn't matter
+        d = abs(d)
+        if d == 1:
+            a.emit(f'movq $0, {a.result}')
+            return
+        if d & (d - 1) == 0:
+            k = d.bit_length() - 1
+            _round_toward_zero(a, k)
+            a.emit(f'sarq ${k}, %rax')
+            a.emit(f'shlq ${k}, %rax')
+        else:
+            _divide_by_constant(a, d)
+            _multiply_by_constant(a, RAX, RAX, d)
+        a.emit(f'movq {a.args[0]}, %rdx')
+        a.emit('subq %rax, %rdx')
+    else:
+        _idivq(a)
+    a.store(RDX)
+
+
+def _multiply_by_constant(a: IntrinsicArgs, operand: Operand, r: Register, c: int) -> None:
+    """Multiplies the operand by `c` into register `r`,
+    with a shift, `lea` or an immediate operand where possible."""
+    if c == 0:
+        a.emit(f'movq $0, {r}')
+        return
+    a.load(operand, r)
+    if c == 1:
+        pass
+    elif c == -1:
+        a.emit(f'negq {r}')
+    elif abs(c) & (abs(c) - 1) == 0:
+        a.emit(f'shlq ${abs(c).bit_length() - 1}, {r}')
+        if c < 0:
+            a.emit(f'negq {r}')
+    elif c in [3, 5, 9]:
+        a.emit(f'leaq ({r},{r},{c - 1}), {r}')
+    else:
+        a.emit(f'imulq {a.source(Immediate(c))}, {r}')
+
+
+def _round_toward_zero(a: IntrinsicArgs, k: int) -> None:
+    """Loads the first argument into rax, plus 2^k - 1 if it's negative, so that
+    an arithmetic shift right by k rounds toward zero like idivq does."""
+    a.load(a.args[0], RAX)
+    a.emit('movq %rax, %rdx')
+    a.emit('sarq $63, %rdx')
+    a.emit(f'shrq ${64 - k}, %rdx')
+    a.emit('addq %rdx, %rax')
+
+
+def _divide_by_constant(a: IntrinsicArgs, d: int) -> None:
+    """Divides the first argument, which is not an immediate,
+    by `d` into rax without idivq, rounding toward zero."""
+    if d == 1:
+        a.load(a.args[0], RAX)
+    elif abs(d) & (abs(d) - 1) == 0:
+        k = abs(d).bit_length() - 1
+        _round_toward_zero(a, k)
+        a.emit(f'sarq ${k}, %rax')
+        if d < 0:
+            a.emit('negq %rax')
+    else:
+        # Multiplies by a fixed point reciprocal and keeps the high half,
+        # see Hacker's Delight, chapter 10
+        magic, shift = signed_magic(d)
+        a.emit(f'movabsq ${magic}, %rax')
+        a.emit(f'imulq {a.args[0]}')
+        if d > 0 and magic < 0:
+            a.emit(f'addq {a.args[0]}, %rdx')
+        elif d < 0 and magic > 0:
+            a.emit(f'subq {a.args[0]}, %rdx')
+        if shift > 0:
+            a.emit(f'sarq ${shift}, %rdx')
+        # Adds one if the quotient is negative
+        a.emit('movq %rdx, %rax')
+        a.emit('shrq $63, %rax')
+        a.emit('addq %rdx, %rax')
+
+
+def signed_magic(d: int) -> tuple[int, int]:
+    """Returns the multiplier and shift that divide a signed 64-bit integer by `d`,
+    which isn't 0, 1, -1 or a power of two in absolute value."""
+    two63 = 2**63
+    mask = 2**64 - 1
+    ad = abs(d)
+    t = two63 + (1 if d < 0 else 0)
+    anc = t - 1 - t % ad
+    p = 63
+    q1, r1 = divmod(two63, anc)
+    q2, r2 = divmod(two63, ad)
+    while True:
+        p += 1
+        q1, r1 = (2 * q1) & mask, (2 * r1) & mask
+        if r1 >= anc:
+            q1, r1 = (q1 + 1) & mask, (r1 - anc) & mask
+        q2, r2 = (2 * q2) & mask, (2 * r2) & mask
+        if r2 >= ad:
+            q2, r2 = (q2 + 1) & mask, (r2 - ad) & mask
+        delta = ad - r2
+        if not (q1 < delta or q1 == delta and r1 == 0):
+            break
+    magic = (q2 + 1) & mask
+    if d < 0:
+        magic = -magic & mask
+    if magic >= two63:
+        magic -= 2**64
+    return magic, p - 64
 
 
 @_intrinsic("==")
@@ -105,12 +314,23 @@ def ge(a: IntrinsicArgs) -> None:
     _int_comparison(a, 'setge')
 
 
+# The conditional jump taken when each comparison is true,
+# for comparisons whose result is only used to branch on
+comparison_jumps = {
+    '==': 'je',
+    '!=': 'jne',
+    '<': 'jl',
+    '<=': 'jle',
+    '>': 'jg',
+    '>=': 'jge',
+}
+
+
 def _int_comparison(a: IntrinsicArgs, setcc_insn: str) -> None:
-    # We use 'al' and 'eax' below, which means the lower bytes of 'rax'
-    a.emit('xor %rax, %rax')  # Clear all bits of rax
-    a.emit(f'movq {a.arg_refs[0]}, %rdx')
-    a.emit(f'cmpq {a.arg_refs[1]}, %rdx')
-    # Set lowest byte of 'rax' to comparison result
+    a.load(a.args[0], RDX)
+    a.emit(f'cmpq {a.source(a.args[1], RAX)}, %rdx')
+    # Set lowest byte of 'rax' to comparison result, and clear the rest
     a.emit(f'{setcc_insn} %al')
-    if a.result_register != '%rax':
-        a.emit(f'movq %rax, {a.result_register}')
+    r = a.work_register()
+    a.emit(f'movzbq %al, {r}')
+    a.store(r)
@@ -77,4 +77,12 @@ class LoadBoolParam(Instruction):
 
 @dataclass(frozen=True)
 class Return(Instruction):
-    value: IRVar
\ No newline at end of file
+    value: IRVar
+
+@dataclass(frozen=True)
+class Phi(Instruction):
+    """Only found in SSA form, at the start of a block after its label.
+    Takes the value of the source whose label is the block control came from."""
+    sources: list[IRVar]
+    labels: list[str]
+    dest: IRVar
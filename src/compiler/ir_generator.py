@@ -2,6 +2,7 @@ from compiler import ast, ir
 from compiler.ir import IRVar
 from compiler.symtab import SymTab
 from compiler.tokenizer import Location
+from compiler.trampoline import Step, run_steps
 from compiler.types import Bool, Int, Type, Unit
 
 def generate_ir(root_types: dict[IRVar, Type], root_node: ast.Module) -> dict[str, list[ir.Instruction]]:
@@ -29,8 +30,22 @@ def generate_ir(root_types: dict[IRVar, Type], root_node: ast.Module) -> dict[st
     instructions: dict[str, list[ir.Instruction]] = {'main': []}
 
     loop_labels: list[tuple[ir.Label, ir.Label]] = []
-
-    def visit_expr(st: SymTab[IRVar], node: ast.Expression, func_name: str) -> IRVar:
+    main_exit: tuple[IRVar, ir.Label] | None = None
+
+    def visit_condition(
+        st: SymTab[IRVar], node: ast.Expression, func_name: str, l_then: ir.Label, l_else: ir.Label
+    ) -> Step[None]:
+        """Jumps to `l_then` if the condition is true, otherwise to `l_else`.
+        A `not` swaps the labels, so a comparison under it still ends up
+        right before the CondJump, where it can be fused with it."""
+        while isinstance(node, ast.UnaryOp) and node.op == 'not':
+            node = node.right
+            l_then, l_else = l_else, l_then
+        var_cond = yield visit_expr(st, node, func_name)
+        instructions[func_name].append(ir.CondJump(node.loc, var_cond, l_then, l_else))
+
+    def visit_expr(st: SymTab[IRVar], node: ast.Expression, func_name: str) -> Step[IRVar]:
+        nonlocal main_exit
         loc = node.loc
 
         match node:
@@ -59,8 +74,8 @@ def generate_ir(root_types: dict[IRVar, Type], root_node: ast.Module) -> dict[st
                 if not isinstance(node.left, ast.Identifier):
                     raise Exception(f"{loc}: Left side of assignment must be a variable name")
 
-                var_right = visit_expr(st, node.right, func_name)
-                var_left = visit_expr(st, node.left, func_name)
+                var_right = yield visit_expr(st, node.right, func_name)
+                var_left = yield visit_expr(st, node.left, func_name)
                 instructions[func_name].append(ir.Copy(
                     loc, var_right, var_left
                 ))
@@ -71,11 +86,11 @@ def generate_ir(root_types: dict[IRVar, Type], root_node: ast.Module) -> dict[st
                 l_right = new_label('or_right')
                 l_end = new_label('or_end')
 
-                var_left = visit_expr(st, node.left, func_name)
+                var_left = yield visit_expr(st, node.left, func_name)
                 instructions[func_name].append(ir.CondJump(loc, var_left, l_skip, l_right))
 
                 instructions[func_name].append(l_right)
-                var_right = visit_expr(st, node.right, func_name)
+                var_right = yield visit_expr(st, node.right, func_name)
                 var_result = new_var(Bool)
                 instructions[func_name].append(ir.Copy(loc, var_right, var_result))
                 instructions[func_name].append(ir.Jump(loc, l_end))
@@ -91,11 +106,11 @@ def generate_ir(root_types: dict[IRVar, Type], root_node: ast.Module) -> dict[st
                 l_skip = new_label('and_skip')
                 l_end = new_label('and_end')
 
-                var_left = visit_expr(st, node.left, func_name)
+                var_left = yield visit_expr(st, node.left, func_name)
                 instructions[func_name].append(ir.CondJump(loc, var_left, l_right, l_skip))
 
                 instructions[func_name].append(l_right)
-                var_right = visit_expr(st, node.right, func_name)
+                var_right = yield visit_expr(st, node.right, func_name)
                 var_result = new_var(Bool)
                 instructions[func_name].append(ir.Copy(loc, var_right, var_result))
                 instructions[func_name].append(ir.Jump(loc, l_end))
@@ -108,8 +123,8 @@ def generate_ir(root_types: dict[IRVar, Type], root_node: ast.Module) -> dict[st
 
             case ast.BinaryOp():
                 var_op = st.get_symbol(node.op)
-                var_left = visit_expr(st, node.left, func_name)
-                var_right = visit_expr(st, node.right, func_name)
+                var_left = yield visit_expr(st, node.left, func_name)
+                var_right = yield visit_expr(st, node.right, func_name)
                 var_result = new_var(node.type)
                 instructions[func_name].append(ir.Call(
                     location=loc,
@@ -124,12 +139,10 @@ def generate_ir(root_types: dict[IRVar, Type], root_node: ast.Module) -> dict[st
                     l_then = new_label('then')
                     l_end = new_label('if_end')
 
-                    var_cond = visit_expr(st, node.cond, func_name)
-
-                    instructions[func_name].append(ir.CondJump(loc, var_cond, l_then, l_end))
+                    yield visit_condition(st, node.cond, func_name, l_then, l_end)
                     
                     instructions[func_name].append(l_then)
-                    visit_expr(st, node.then_clause, func_name)
+                    yield visit_expr(st, node.then_clause, func_name)
                     instructions[func_name].append(l_end)
                     return var_unit
                 else:
@@ -137,22 +150,21 @@ def generate_ir(root_types: dict[IRVar, Type], root_node: ast.Module) -> dict[st
                     l_else = new_label('else')
                     l_end = new_label('if_end')
 
-                    var_cond = visit_expr(st, node.cond, func_name)
-                    instructions[func_name].append(ir.CondJump(loc, var_cond, l_then, l_else))
+                    yield visit_condition(st, node.cond, func_name, l_then, l_else)
 
                     instructions[func_name].append(l_then)
-                    var_result = visit_expr(st, node.then_clause, func_name)
+                    var_result = yield visit_expr(st, node.then_clause, func_name)
                     instructions[func_name].append(ir.Jump(loc, l_end))
 
                     instructions[func_name].append(l_else)
-                    var_else_result = visit_expr(st, node.else_clause, func_name)
+                    var_else_result = yield visit_expr(st, node.else_clause, func_name)
                     instructions[func_name].append(ir.Copy(loc, var_else_result, var_result))
 
                     instructions[func_name].append(l_end)
                     return var_result
                 
             case ast.VariableDec():
-                var_value = visit_expr(st, node.value, func_name)
+                var_value = yield visit_expr(st, node.value, func_name)
                 var_result = new_var(var_types[var_value])
 
                 st.set_local(node.variable.name, var_result)
@@ -164,7 +176,7 @@ def generate_ir(root_types: dict[IRVar, Type], root_node: ast.Module) -> dict[st
                 block_st = st.create_inner_tab()
                 if node.expressions is not None:
                     for e in node.expressions:
-                        var_result = visit_expr(block_st, e, func_name)
+                        var_result = yield visit_expr(block_st, e, func_name)
                     return var_result
                 return new_var(Unit)
             
@@ -176,7 +188,7 @@ def generate_ir(root_types: dict[IRVar, Type], root_node: ast.Module) -> dict[st
                     st.set_local(node.call.name, var_call)
                 var_args = []
                 for expr in node.args:
-                    var_arg = visit_expr(st, expr, func_name)
+                    var_arg = yield visit_expr(st, expr, func_name)
                     var_args.append(var_arg)
                 var_result = new_var(node.type)
                 instructions[func_name].append(ir.Call(loc, var_call, var_args, var_result))
@@ -190,11 +202,10 @@ def generate_ir(root_types: dict[IRVar, Type], root_node: ast.Module) -> dict[st
                 loop_labels.append((l_cond, l_end))
 
                 instructions[func_name].append(l_cond)
-                var_cond = visit_expr(st, node.cond, func_name)
-                instructions[func_name].append(ir.CondJump(loc, var_cond, l_body, l_end))
+                yield visit_condition(st, node.cond, func_name, l_body, l_end)
 
                 instructions[func_name].append(l_body)
-                visit_expr(st, node.do, func_name)
+                yield visit_expr(st, node.do, func_name)
                 instructions[func_name].append(ir.Jump(loc, l_cond))
 
                 instructions[func_name].append(l_end)
@@ -204,7 +215,7 @@ def generate_ir(root_types: dict[IRVar, Type], root_node: ast.Module) -> dict[st
                 return var_unit
             
             case ast.UnaryOp():
-                var_right = visit_expr(st, node.right, func_name)
+                var_right = yield visit_expr(st, node.right, func_name)
                 var_result = new_var(var_types[var_right])
                 var_op = st.get_symbol(f'unary_{node.op}')
                 instructions[func_name].append(ir.Call(
@@ -214,12 +225,18 @@ def generate_ir(root_types: dict[IRVar, Type], root_node: ast.Module) -> dict[st
             
             case ast.Return():
                 if node.value:
-                    var_result = visit_expr(st, node.value, func_name)
-                    instructions[func_name].append(ir.Return(loc, var_result))
-                    return var_result
+                    var_result = yield visit_expr(st, node.value, func_name)
                 else:
-                    instructions[func_name].append(ir.Return(loc, var_unit))
-                    return var_unit
+                    var_result = var_unit
+                if func_name == 'main':
+                    # The value returned from the top level is the result of the program
+                    if main_exit is None:
+                        main_exit = (new_var(var_types[var_result]), new_label('main_exit'))
+                    instructions[func_name].append(ir.Copy(loc, var_result, main_exit[0]))
+                    instructions[func_name].append(ir.Jump(loc, main_exit[1]))
+                else:
+                    instructions[func_name].append(ir.Return(loc, var_result))
+                return var_result
                 
             case ast.BreakContinue():
                 if loop_labels == []:
@@ -235,8 +252,16 @@ def generate_ir(root_types: dict[IRVar, Type], root_node: ast.Module) -> dict[st
             case _:
                 raise Exception(f"Unsupported AST node: {node}")
     
+    def reset_numbering() -> None:
+        """Variables and labels are numbered per function, so that a function's IR
+        doesn't depend on the other functions in the module."""
+        nonlocal next_var_number, next_label_number
+        next_var_number = 1
+        next_label_number = 1
+
     def visit_func(st: SymTab[IRVar], funcs: list[ast.FunDefinition]) -> None:
         for fun in funcs:
+            reset_numbering()
             loc = fun.loc
             func_name = fun.name.name
             st.set_local(func_name, IRVar(func_name))
@@ -251,7 +276,9 @@ def generate_ir(root_types: dict[IRVar, Type], root_node: ast.Module) -> dict[st
                     instructions[func_name].append(ir.LoadBoolParam(loc, IRVar(param.name), var_param))
                 func_st.set_local(param.name, var_param)
 
-            visit_expr(func_st, fun.body, func_name)
+            var_result = run_steps(visit_expr(func_st, fun.body, func_name))
+            if not instructions[func_name] or not isinstance(instructions[func_name][-1], ir.Return):
+                instructions[func_name].append(ir.Return(loc, var_result))
     
     root_symtab = SymTab[IRVar](locals={}, parent=None)
     for v in root_types.keys():
@@ -260,7 +287,13 @@ def generate_ir(root_types: dict[IRVar, Type], root_node: ast.Module) -> dict[st
     visit_func(root_symtab, root_node.funcs)
 
     if root_node.expr:
-        var_result = visit_expr(root_symtab, root_node.expr, 'main')
+        reset_numbering()
+        var_result = run_steps(visit_expr(root_symtab, root_node.expr, 'main'))
+        if main_exit is not None:
+            var_exit, l_exit = main_exit
+            instructions['main'].append(ir.Copy(Location(line=0, column=0), var_result, var_exit))
+            instructions['main'].append(l_exit)
+            var_result = var_exit
 
         if var_types[var_result] == Int:
             instructions['main'].append(ir.Call(
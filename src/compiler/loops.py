@@ -0,0 +1,192 @@
+from dataclasses import replace
+
+from compiler import ir
+from compiler.cfg import BasicBlock, Loop, build_cfg, is_terminator
+from compiler.dead_code import pure_intrinsics
+from compiler.register_allocator import uses_and_defs
+from compiler.ssa import label_name, map_vars
+
+def optimize_loops(instructions: list[ir.Instruction]) -> list[ir.Instruction]:
+    """Gives every loop a preheader, a block that runs once before the loop,
+    moves the computations that give the same result on every iteration there
+    and replaces multiplications of induction variables with additions.
+    Inner loops go first, so that invariants move out of as many loops as they can.
+    Expects SSA form."""
+    if not instructions:
+        return instructions
+    graph = build_cfg('', instructions)
+    headers = [label_name(graph.blocks[loop.header].instructions[0]) for loop in reversed(graph.loops)]
+    for header in headers:
+        preheader = _preheader_name(instructions, header)
+        instructions = _add_preheader(instructions, header, preheader)
+        instructions = hoist_invariants(instructions, header)
+        instructions = reduce_strength(instructions, header, preheader)
+    return instructions
+
+def _preheader_name(instructions: list[ir.Instruction], header: str) -> str:
+    """Names the preheader of a loop after its header. A loop inlined from
+    another function already has a preheader by that name, so the new one
+    gets a number after it."""
+    labels = {insn.name for insn in instructions if isinstance(insn, ir.Label)}
+    name = f'{header}_preheader'
+    number = 1
+    while name in labels:
+        number += 1
+        name = f'{header}_preheader{number}'
+    return name
+
+def _find_loop(instructions: list[ir.Instruction], header: str) -> tuple[list[BasicBlock], Loop]:
+    graph = build_cfg('', instructions)
+    loop = next(loop for loop in graph.loops if label_name(graph.blocks[loop.header].instructions[0]) == header)
+    return graph.blocks, loop
+
+def _add_preheader(instructions: list[ir.Instruction], header: str, preheader_name: str) -> list[ir.Instruction]:
+    """Adds an empty block right before the loop header, which the edges
+    into the loop go through. The values the header's phis get from outside
+    the loop come through it, merged by a phi of its own if needed."""
+    blocks, loop = _find_loop(instructions, header)
+    header_label = blocks[loop.header].instructions[0]
+    assert isinstance(header_label, ir.Label)
+    preheader = ir.Label(header_label.location, preheader_name)
+    outside = {p for p in blocks[loop.header].predecessors if p not in loop.blocks}
+    outside_labels = {label_name(blocks[p].instructions[0]) for p in outside}
+
+    def retarget(label: ir.Label) -> ir.Label:
+        return preheader if label.name == header else label
+
+    result: list[ir.Instruction] = []
+    preheader_phis: list[ir.Instruction] = []
+    for block in blocks:
+        if block.index == loop.header:
+            if result and not is_terminator(result[-1]) and block.index - 1 in loop.blocks:
+                result.append(ir.Jump(header_label.location, header_label))  # used to fall through
+            result.append(preheader)
+            header_start = len(result)
+
+        for insn in block.instructions:
+            if block.index in outside and isinstance(insn, ir.Jump):
+                insn = replace(insn, label=retarget(insn.label))
+            elif block.index in outside and isinstance(insn, ir.CondJump):
+                insn = replace(insn, then_label=retarget(insn.then_label), else_label=retarget(insn.else_label))
+            elif block.index == loop.header and isinstance(insn, ir.Phi):
+                entering = [(s, l) for s, l in zip(insn.sources, insn.labels) if l in outside_labels]
+                inside = [(s, l) for s, l in zip(insn.sources, insn.labels) if l not in outside_labels]
+                if len(entering) == 1:
+                    source = entering[0][0]
+                else:
+                    source = ir.IRVar(f'{insn.dest.name}_pre')
+                    preheader_phis.append(ir.Phi(
+                        insn.location, [s for s, _ in entering], [l for _, l in entering], source
+                    ))
+                insn = replace(
+                    insn,
+                    sources=[source, *(s for s, _ in inside)],
+                    labels=[preheader.name, *(l for _, l in inside)]
+                )
+            result.append(insn)
+
+    result[header_start:header_start] = preheader_phis
+    return result
+
+def _can_hoist(insn: ir.Instruction) -> bool:
+    """Tells whether an instruction can be moved to run once before the loop.
+    Division and remainder can't, since the preheader runs even when the
+    loop body doesn't, and they would trap where the program didn't."""
+    match insn:
+        case ir.LoadIntConst() | ir.LoadBoolConst() | ir.Copy():
+            return True
+        case ir.Call():
+            return insn.fun.name in pure_intrinsics
+        case _:
+            return False
+
+def hoist_invariants(instructions: list[ir.Instruction], header: str) -> list[ir.Instruction]:
+    """Moves the computations in a loop that only read variables written
+    outside it, or by other such computations, to the end of its preheader."""
+    blocks, loop = _find_loop(instructions, header)
+    loop_insns = [insn for b in sorted(loop.blocks) for insn in blocks[b].instructions]
+    defined_in_loop = {v for insn in loop_insns for v in uses_and_defs(insn)[1]}
+
+    hoisted: list[ir.Instruction] = []
+    hoisted_ids: set[int] = set()
+    changed = True
+    while changed:
+        changed = False
+        for insn in loop_insns:
+            if id(insn) in hoisted_ids or not _can_hoist(insn):
+                continue
+            uses, defs = uses_and_defs(insn)
+            if not defined_in_loop.intersection(uses):
+                hoisted.append(insn)
+                hoisted_ids.add(id(insn))
+                defined_in_loop.difference_update(defs)
+                changed = True
+
+    result = [insn for insn in instructions if id(insn) not in hoisted_ids]
+    header_index = next(i for i, insn in enumerate(result) if isinstance(insn, ir.Label) and insn.name == header)
+    result[header_index:header_index] = hoisted
+    return result
+
+def reduce_strength(instructions: list[ir.Instruction], header: str, preheader: str) -> list[ir.Instruction]:
+    """Replaces `i * k` in a loop, where `k` is written outside the loop and `i`
+    is a basic induction variable, one that the header sets to `i + c` or `i - c`
+    on every back edge, with a new induction variable that starts at `i * k`
+    in the preheader and changes by `c * k` on every iteration."""
+    blocks, loop = _find_loop(instructions, header)
+    loop_insns = [insn for b in sorted(loop.blocks) for insn in blocks[b].instructions]
+    definitions = {v: insn for insn in loop_insns for v in uses_and_defs(insn)[1]}
+
+    # Basic induction variables, with their phi and the step on the back edges
+    induction: dict[ir.IRVar, tuple[ir.Phi, ir.Call]] = {}
+    for phi in blocks[loop.header].instructions:
+        if not isinstance(phi, ir.Phi):
+            continue
+        back = {s for s, l in zip(phi.sources, phi.labels) if l != preheader}
+        step = definitions.get(back.pop()) if len(back) == 1 else None
+        if not isinstance(step, ir.Call) or step.fun.name not in ['+', '-']:
+            continue
+        a, b = step.args
+        if a == phi.dest and b not in definitions or step.fun.name == '+' and b == phi.dest and a not in definitions:
+            induction[phi.dest] = (phi, step)
+
+    preheader_code: list[ir.Instruction] = []
+    header_phis: list[ir.Instruction] = []
+    increments: dict[int, list[ir.Instruction]] = {}
+    reduced: dict[tuple[ir.IRVar, ir.IRVar], ir.IRVar] = {}
+    replaced: dict[ir.IRVar, ir.IRVar] = {}
+    for insn in loop_insns:
+        if not (isinstance(insn, ir.Call) and insn.fun.name == '*'):
+            continue
+        a, b = insn.args
+        i, k = (a, b) if a in induction else (b, a)
+        if i not in induction or k in definitions:
+            continue
+        if (i, k) not in reduced:
+            phi, step = induction[i]
+            c = step.args[1] if step.args[0] == i else step.args[0]
+            t, t_start, t_step, t_next = [
+                ir.IRVar(f'{insn.dest.name}_{suffix}') for suffix in ['iv', 'iv_start', 'iv_step', 'iv_next']
+            ]
+            preheader_code.append(ir.Call(insn.location, insn.fun, [phi.sources[phi.labels.index(preheader)], k], t_start))
+            preheader_code.append(ir.Call(insn.location, insn.fun, [c, k], t_step))
+            header_phis.append(ir.Phi(
+                insn.location, [t_start if l == preheader else t_next for l in phi.labels], phi.labels, t
+            ))
+            increments.setdefault(id(step), []).append(ir.Call(step.location, step.fun, [t, t_step], t_next))
+            reduced[i, k] = t
+        replaced[insn.dest] = reduced[i, k]
+
+    if not replaced:
+        return instructions
+
+    result: list[ir.Instruction] = []
+    for insn in instructions:
+        if isinstance(insn, ir.Label) and insn.name == header:
+            result.extend(preheader_code)
+        if isinstance(insn, ir.Call) and insn.dest in replaced:
+            continue
+        result.append(map_vars(insn, lambda v: replaced.get(v, v), lambda v: v))
+        if isinstance(insn, ir.Label) and insn.name == header:
+            result.extend(header_phis)
+        result.extend(increments.get(id(insn), []))
+    return result
@@ -0,0 +1,100 @@
+from dataclasses import dataclass, field
+from typing import Callable
+
+from compiler import ir
+from compiler.constant_folding import fold_constants
+from compiler.copy_propagation import coalesce_copies, propagate_copies
+from compiler.dead_code import eliminate_dead_code, remove_unreachable_blocks
+from compiler.inliner import inline_functions
+from compiler.loops import optimize_loops
+from compiler.ssa import from_ssa, gvn, sccp, to_ssa
+from compiler.tail_calls import eliminate_tail_calls
+
+optimization_levels = [0, 1, 2]
+
+# The level from which small functions are inlined into their callers
+inline_level = 2
+
+@dataclass
+class OptimizationStats:
+    """The number of IR instructions in a function before and after optimizing,
+    how many calls were inlined into it, how many instructions each pass
+    removed, and what the peephole optimizer changed in its assembly code."""
+    inlined_calls: int = 0
+    instructions_before: int = 0
+    instructions_after: int = 0
+    removed: dict[str, int] = field(default_factory=dict)
+    peephole: dict[str, int] = field(default_factory=dict)
+
+    def __str__(self) -> str:
+        removed = ', '.join(f'{count} by {name}' for name, count in self.removed.items() if count)
+        peephole = ', '.join(f'{count} {name}' for name, count in self.peephole.items() if count)
+        return f'{self.instructions_before} -> {self.instructions_after} instructions' \
+            + (f', inlined {self.inlined_calls} calls' if self.inlined_calls else '') \
+            + (f', removed {removed}' if removed else '') \
+            + (f'; assembly: {peephole}' if peephole else '')
+
+def optimize(
+    instructions: list[ir.Instruction],
+    level: int,
+    stats: OptimizationStats | None = None
+) -> list[ir.Instruction]:
+    """Optimizes the IR of one function. Level 0 leaves it as it is.
+    Level 1 removes unreachable and dead code, propagates and folds constants
+    and removes copies in SSA form, then coalesces the copies that leaving
+    SSA form adds. Level 2 also reuses values that were already computed,
+    moves loop invariant code out of loops and replaces multiplications
+    of induction variables with additions."""
+    if level not in optimization_levels:
+        raise Exception(f"Unknown optimization level: {level}")
+    if stats is None:
+        stats = OptimizationStats()
+    stats.instructions_before = len(instructions)
+
+    def run(name: str, optimization: Callable[[list[ir.Instruction]], list[ir.Instruction]]) -> None:
+        nonlocal instructions
+        optimized = optimization(instructions)
+        stats.removed[name] = stats.removed.get(name, 0) + len(instructions) - len(optimized)
+        instructions = optimized
+
+    if level >= 1:
+        run('unreachable code', remove_unreachable_blocks)
+        instructions = to_ssa(instructions)
+        run('constant propagation', sccp)
+        run('constant folding', fold_constants)
+        if level >= 2:
+            run('value numbering', gvn)
+        run('copy propagation', propagate_copies)
+        if level >= 2:
+            instructions = optimize_loops(instructions)
+        run('dead code', eliminate_dead_code)
+        instructions = from_ssa(instructions)
+        run('copy coalescing', coalesce_copies)
+
+    stats.instructions_after = len(instructions)
+    return instructions
+
+def optimize_module(
+    instructions: dict[str, list[ir.Instruction]],
+    level: int,
+    stats: dict[str, OptimizationStats] | None = None,
+    compiled: dict[str, list[ir.Instruction]] = {}
+) -> dict[str, list[ir.Instruction]]:
+    """Optimizes every function of a module with `optimize`. From level 1 on,
+    calls of functions to themselves in tail position become jumps first, see
+    `eliminate_tail_calls`. From `inline_level` on, small functions are also
+    inlined into their callers, see `inline_functions`, which may use the final
+    IR of the functions in `compiled` as well.
+    The statistics of each function are stored in `stats` if given."""
+    if stats is None:
+        stats = {}
+
+    def optimize_function(name: str, fun_instructions: list[ir.Instruction], inlined_calls: int) -> list[ir.Instruction]:
+        stats[name] = OptimizationStats(inlined_calls=inlined_calls)
+        if level >= 1:
+            fun_instructions = eliminate_tail_calls(name, fun_instructions)
+        return optimize(fun_instructions, level, stats[name])
+
+    if level < inline_level:
+        return {name: optimize_function(name, insns, 0) for name, insns in instructions.items()}
+    return inline_functions(instructions, optimize_function, compiled)
@@ -1,17 +1,73 @@
-from typing import List
+from dataclasses import dataclass
+from typing import Callable, Iterable, List
 from compiler import ast
-from compiler.tokenizer import Location, Token
-
-def parse(tokens: list[Token]) -> ast.Module:
-    pos = 0
-
-    def peek(offset: int = 0) -> Token:
-        index = offset + pos
-        if 0 <= index < len(tokens):
-            return tokens[index]
+from compiler.tokenizer import Location, Token, TokenBuffer
+from compiler.trampoline import Step, run_steps
+
+# Binary operator: (precedence, right associative, node located at the operator token).
+# Nodes not located at the operator take the location of their left operand.
+binary_operators: dict[str, tuple[int, bool, bool]] = {
+    '=': (1, True, False),
+    'or': (2, False, False),
+    'and': (3, False, False),
+    '==': (4, False, True),
+    '!=': (4, False, True),
+    '<': (5, False, True),
+    '>': (5, False, True),
+    '<=': (5, False, True),
+    '>=': (5, False, True),
+    '+': (6, False, True),
+    '-': (6, False, True),
+    '*': (7, False, False),
+    '/': (7, False, False),
+    '%': (7, False, False),
+}
+comparison_precedence = binary_operators['<'][0]
+unary_operators = {'not', '-'}
+
+@dataclass
+class TopLevelItem:
+    """A function definition or top level expression and its token index range.
+    The range includes the semicolon that ends the item, if any."""
+    node: ast.FunDefinition | ast.Expression
+    start: int
+    end: int
+
+def parse(tokens: Iterable[Token] | TokenBuffer) -> ast.Module:
+    """Parses a token list, or any token iterable such as `tokenize_stream`,
+    which is then consumed through a bounded `TokenBuffer`.
+
+    Nested constructs are parsed as `Step`s on an explicit stack,
+    so deeply nested input doesn't hit Python's recursion limit."""
+    return build_module([item.node for item in parse_top_level(tokens)])
+
+def build_module(items: list[ast.FunDefinition | ast.Expression]) -> ast.Module:
+    expressions: List[ast.Expression] = []
+    funcs: List[ast.FunDefinition] = []
+    for item in items:
+        if isinstance(item, ast.FunDefinition):
+            funcs.append(item)
         else:
-            return Token(type='end', text='', loc=tokens[-1].loc)
-        
+            expressions.append(item)
+
+    if len(expressions) == 1: # one top level expression
+        return ast.Module(funcs=funcs, expr=expressions[0])
+    elif len(expressions) == 0 and len(funcs) > 0: # only function definition(s)
+        return ast.Module(funcs=funcs, expr=None)
+    elif len(expressions) == 0 and len(funcs) == 0:
+        raise Exception('Empty input!')
+
+    return ast.Module(funcs=funcs, expr=ast.Block(Location(line=1, column=1), expressions))
+
+def parse_top_level(
+    tokens: Iterable[Token] | TokenBuffer,
+    stop: Callable[[int], bool] | None = None
+) -> list[TopLevelItem]:
+    """Parses function definitions and top level expressions until the end of input,
+    or until `stop` returns True for the token position after an item."""
+    token_buffer = tokens if isinstance(tokens, TokenBuffer) else TokenBuffer(tokens)
+    peek = token_buffer.peek
+
     def consume(expected: str | list[str] | None = None) -> Token:
         token = peek()
         if isinstance(expected, str) and token.text != expected:
@@ -19,39 +75,34 @@ def parse(tokens: list[Token]) -> ast.Module:
         if isinstance(expected, list) and token.text not in expected:
             comma_separated = ", ".join([f'"{e}"' for e in expected])
             raise Exception(f'{token.loc}: expected one of: {comma_separated}')
-        nonlocal pos
-        pos += 1
+        token_buffer.advance()
         return token
 
-    def parse_module() -> ast.Module:
-        expressions: List[ast.Expression] = []
-        funcs: List[ast.FunDefinition] = []
+    def parse_items() -> Step[list[TopLevelItem]]:
+        items: List[TopLevelItem] = []
 
-        while pos < len(tokens):
+        while peek().type != 'end':
+            start = token_buffer.position
+            item: ast.FunDefinition | ast.Expression
             if peek().text == 'fun':
-                fun = parse_fun_definition()
-                funcs.append(fun)
+                item = yield parse_fun_definition()
             else:
-                expression = parse_expression(parse_or())
-                expressions.append(expression)
+                item = yield parse_expression()
 
                 if peek().text == ';':
                     consume(';')
                 elif peek(-1).text in [';', '}']: # previous expression ends in a block
-                    continue
-                elif pos < len(tokens):
+                    pass
+                elif peek().type != 'end':
                     raise Exception(f'{peek().loc}: Expected ; between expressions, got {peek().text}')
-            
-        if len(expressions) == 1: # one top level expression
-            return ast.Module(funcs=funcs, expr=expressions[0])
-        elif len(expressions) == 0 and len(funcs) > 0: # only function definition(s)
-            return ast.Module(funcs=funcs, expr=None)
-        elif len(expressions) == 0 and len(funcs) == 0:
-            raise Exception('Empty input!')
 
-        return ast.Module(funcs=funcs, expr=ast.Block(Location(line=1, column=1), expressions))
+            items.append(TopLevelItem(item, start, token_buffer.position))
+            if stop is not None and stop(token_buffer.position):
+                break
+
+        return items
 
-    def parse_fun_definition() -> ast.FunDefinition:
+    def parse_fun_definition() -> Step[ast.FunDefinition]:
         loc = peek().loc
         consume('fun')
         name = parse_identifier()
@@ -75,7 +126,7 @@ def parse(tokens: list[Token]) -> ast.Module:
 
         return_type = ast.BasicTypeExpr(consume().text)
 
-        body = parse_block()
+        body = yield parse_block()
 
         return ast.FunDefinition(
             loc,
@@ -86,127 +137,43 @@ def parse(tokens: list[Token]) -> ast.Module:
             return_type
         )
 
-    def parse_expression(left: ast.Expression) -> ast.Expression:
-        if peek().text == '=':
-            operator = consume().text
-            right = parse_expression(parse_or())
-            return ast.BinaryOp(
-                left.loc,
-                left,
-                operator,
-                right
-            )
-        else:
-            return left
-
-    def parse_or() -> ast.Expression:
-        left = parse_and()
-        loc = left.loc
-
-        while peek().text == 'or':
-            operator = consume().text
-            right = parse_and()
-            left = ast.BinaryOp(
-                loc,
-                left,
-                operator,
-                right
-            )
-        return left
-
-    def parse_and() -> ast.Expression:
-        left = parse_eq_comparison()
-        loc = left.loc
+    def parse_expression(min_precedence: int = 0) -> Step[ast.Expression]:
+        left = parse_leaf()
+        if left is None:
+            left = yield parse_unary()
 
-        while peek().text == 'and':
-            operator = consume().text
-            right = parse_eq_comparison()
-            left = ast.BinaryOp(
-                loc,
-                left,
-                operator,
-                right
-            )
-        return left
-    
-    def parse_eq_comparison() -> ast.Expression:
-        left = parse_comparison()
-        loc = left.loc
-
-        while peek().text in ['!=', '==']:
-            operator_token = consume()
-            operator = operator_token.text
-            loc = operator_token.loc
-
-            right = parse_comparison()
-            left = ast.BinaryOp(
-                loc,
-                left,
-                operator,
-                right
-            )
-        return left
-
-    def parse_comparison() -> ast.Expression:
-        left = parse_polynomial()
-        loc = left.loc
-
-        while peek().text in ['<', '>', '<=', '>=', '>=']:
+        while (operator := binary_operators.get(peek().text)) is not None:
+            precedence, right_associative, located_at_operator = operator
+            if precedence < min_precedence:
+                break
             operator_token = consume()
-            operator = operator_token.text
-            loc = operator_token.loc
-
-            right = parse_polynomial()
-
+            right = yield parse_expression(precedence if right_associative else precedence + 1)
             left = ast.BinaryOp(
-                loc,
+                operator_token.loc if located_at_operator else left.loc,
                 left,
-                operator,
+                operator_token.text,
                 right
             )
         return left
-    
-    def parse_polynomial() -> ast.Expression:
-        left = parse_term()
-        loc = left.loc
-
-        while peek().text in ['+', '-']:
-            operator_token = consume()
-            operator = operator_token.text
-            loc = operator_token.loc
 
-            right = parse_term()
-            left = ast.BinaryOp(
-                loc,
-                left,
-                operator,
-                right
-            )
-        return left
-
-    def parse_term() -> ast.Expression:
-        left = parse_unary()
-        loc = left.loc
+    def parse_leaf() -> ast.Expression | None:
+        """Parses a factor that contains no other expressions without a parser step.
+        Returns None if the next factor is something else."""
+        token = peek()
+        if token.type == 'int_literal':
+            return parse_int_literal()
+        elif token.type == 'identifier':
+            return parse_identifier() if peek(1).text != '(' else None
+        leaf_parser = leaf_factors.get(token.text)
+        return leaf_parser() if leaf_parser is not None else None
 
-        while peek().text in ['*', '/', '%']:
-            operator_token = consume()
-            operator = operator_token.text
-            right = parse_unary()
-            left = ast.BinaryOp(
-                loc,
-                left,
-                operator,
-                right
-            )
-        return left
-    
-    def parse_unary() -> ast.Expression:
-        if peek().text in ['not', '-']:
+    def parse_unary() -> Step[ast.Expression]:
+        if peek().text in unary_operators:
             operator_token = consume()
             operator = operator_token.text
             loc = operator_token.loc
 
-            right = parse_unary()
+            right = yield parse_unary()
             left = ast.UnaryOp(
                 loc,
                 operator,
@@ -214,34 +181,23 @@ def parse(tokens: list[Token]) -> ast.Module:
             )
             return left
         else:
-            return parse_factor()
-
-    def parse_factor() -> ast.Expression:
-        if peek().text == 'var':
-            return parse_variable_dec()
-        elif peek().text == '(':
-            return parse_parenthesized()
-        elif peek().text == 'if':
-            return parse_if()
-        elif peek().text in ['true', 'false']:
-            return parse_bool_literal()
-        elif peek().text == 'while':
-            return parse_while_loop()
-        elif peek().text in ['break', 'continue']:
-            return parse_break_and_continue()
-        elif peek().type == 'int_literal':
-            return parse_int_literal()
-        elif peek().type == 'identifier':
+            return (yield parse_factor())
+
+    def parse_factor() -> Step[ast.Expression]:
+        token = peek()
+        if token.type == 'identifier':
             identifier = parse_identifier()
             if peek().text == '(': # function call
-                return parse_arguments(identifier)
+                return (yield parse_arguments(identifier))
             return identifier
-        elif peek().text == '{':
-            return parse_block()
+        elif (step_parser := step_factors.get(token.text)) is not None:
+            return (yield step_parser())
+        elif (leaf := parse_leaf()) is not None:
+            return leaf
         else:
-            raise Exception(f'Unknown syntax at {peek().loc}')
+            raise Exception(f'Unknown syntax at {token.loc}')
 
-    def parse_variable_dec() -> ast.VariableDec:
+    def parse_variable_dec() -> Step[ast.VariableDec]:
         loc = peek().loc
         if peek().loc.column == 1 or peek(-1).text in ['{', ';']:
             consume('var')
@@ -253,7 +209,7 @@ def parse(tokens: list[Token]) -> ast.Module:
                 var_type = parse_type_expression()
 
             consume('=')
-            value = parse_expression(parse_or())
+            value = yield parse_expression()
             return ast.VariableDec(loc, identifier, value, var_type)
         else:
             raise Exception("Variable declaration should only appear as a top level expression!")
@@ -280,30 +236,30 @@ def parse(tokens: list[Token]) -> ast.Module:
 
         return ast.FunTypeExpr(parameters, return_type) # type: ignore[arg-type]
 
-    def parse_if() -> ast.Expression:
+    def parse_if() -> Step[ast.Expression]:
         loc = peek().loc
         consume('if')
-        cond = parse_expression(parse_or())
+        cond = yield parse_expression()
         consume('then')
-        then_clause = parse_expression(parse_or())
+        then_clause = yield parse_expression()
         if peek().text == "else":
             consume('else')
-            else_clause = parse_expression(parse_or())
+            else_clause = yield parse_expression()
         else:
             else_clause = None
         return ast.IfExpression(loc, cond, then_clause, else_clause)
 
-    def parse_while_loop() -> ast.Expression:
+    def parse_while_loop() -> Step[ast.Expression]:
         loc = peek().loc
         consume('while')
-        cond = parse_expression(parse_or())
+        cond = yield parse_expression()
         consume('do')
-        do = parse_expression(parse_or())
+        do = yield parse_expression()
         return ast.WhileLoop(loc, cond, do)
     
-    def parse_parenthesized() -> ast.Expression:
+    def parse_parenthesized() -> Step[ast.Expression]:
         consume('(')
-        expr = parse_comparison()
+        expr = yield parse_expression(comparison_precedence)
         consume(')')
         return expr
     
@@ -336,13 +292,13 @@ def parse(tokens: list[Token]) -> ast.Module:
         else:
             raise Exception(f'Expected integer literal, found "{token.text}"')
         
-    def parse_return() -> ast.Return:
+    def parse_return() -> Step[ast.Return]:
         loc = peek().loc
         consume('return')
         if peek().text == '}':
             value = None
         else:
-            value = parse_expression(parse_or())
+            value = yield parse_expression()
         if peek().text != '}':
             raise Exception(f'Return statement must be the last statement in a block')
         return ast.Return(loc, value)
@@ -355,7 +311,7 @@ def parse(tokens: list[Token]) -> ast.Module:
         else:
             raise Exception(f'Expected identifier, found "{token.text}"')
     
-    def parse_arguments(call: ast.Identifier) -> ast.FunctionCall:
+    def parse_arguments(call: ast.Identifier) -> Step[ast.FunctionCall]:
         loc = peek().loc
         consume('(')
         args: List[ast.Expression] = []
@@ -363,22 +319,22 @@ def parse(tokens: list[Token]) -> ast.Module:
         while peek().text != ')':
             if args:
                 consume(',')
-            arg = parse_expression(parse_or())
+            arg = yield parse_expression()
             args.append(arg)
         consume(')')
         return ast.FunctionCall(loc, call, args)
     
-    def parse_block() -> ast.Block:
+    def parse_block() -> Step[ast.Block]:
         loc = peek().loc
         consume('{')
         expressions: List[ast.Expression] = []
 
         while peek().text != '}':
             if peek().text == 'return':
-                expressions.append(parse_return())
+                expressions.append((yield parse_return()))
                 semicolon = False
             else:
-                expression = parse_expression(parse_or())
+                expression = yield parse_expression()
                 expressions.append(expression)
 
                 semicolon = False
@@ -409,4 +365,20 @@ def parse(tokens: list[Token]) -> ast.Module:
 
         return ast.Block(loc, expressions)
 
-    return parse_module()
+    # Factors starting with a keyword or punctuation token, by the token's text.
+    # Identifier tokens are never looked up here.
+    step_factors: dict[str, Callable[[], Step[ast.Expression]]] = {
+        'var': parse_variable_dec,
+        '(': parse_parenthesized,
+        'if': parse_if,
+        'while': parse_while_loop,
+        '{': parse_block,
+    }
+    leaf_factors: dict[str, Callable[[], ast.Expression]] = {
+        'true': parse_bool_literal,
+        'false': parse_bool_literal,
+        'break': parse_break_and_continue,
+        'continue': parse_break_and_continue,
+    }
+
+    return run_steps(parse_items())
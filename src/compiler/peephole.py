@@ -0,0 +1,248 @@
+from dataclasses import dataclass
+
+@dataclass
+class AsmInstruction:
+    opcode: str
+    operands: list[str]
+
+    def __str__(self) -> str:
+        return f'{self.opcode} {", ".join(self.operands)}' if self.operands else self.opcode
+
+@dataclass
+class AsmLabel:
+    name: str
+
+    def __str__(self) -> str:
+        return f'{self.name}:'
+
+@dataclass
+class AsmText:
+    """A comment, directive or empty line, kept as it is."""
+    text: str
+
+    def __str__(self) -> str:
+        return self.text
+
+AsmLine = AsmInstruction | AsmLabel | AsmText
+
+conditional_jumps = {
+    'je': 'jne', 'jne': 'je',
+    'jl': 'jge', 'jge': 'jl',
+    'jg': 'jle', 'jle': 'jg',
+}
+
+# Opcodes whose last operand is the only location they write
+_writes_last_operand = {
+    'movq', 'movabsq', 'movzbq', 'leaq', 'addq', 'subq', 'imulq',
+    'andq', 'orq', 'xorq', 'xor', 'negq', 'notq', 'sete', 'setne',
+    'setl', 'setle', 'setg', 'setge', 'shlq', 'sarq', 'shrq',
+}
+_writes_nothing = {'cmpq', 'testq'}
+
+_subregisters = {'%eax': '%rax', '%al': '%rax', '%edx': '%rdx', '%dl': '%rdx'}
+
+def _split_operands(text: str) -> list[str]:
+    operands = []
+    depth = 0
+    current = ''
+    for c in text:
+        if c == ',' and depth == 0:
+            operands.append(current.strip())
+            current = ''
+            continue
+        depth += (c == '(') - (c == ')')
+        current += c
+    if current.strip():
+        operands.append(current.strip())
+    return operands
+
+def parse_assembly(lines: list[str]) -> list[AsmLine]:
+    """Parses assembly code as emitted by the assembly generator,
+    one instruction, label, comment or directive per line."""
+    parsed: list[AsmLine] = []
+    for line in lines:
+        text = line.strip()
+        if not text or text.startswith(('#', '.')) and not text.endswith(':'):
+            parsed.append(AsmText(line))
+        elif text.endswith(':'):
+            parsed.append(AsmLabel(text[:-1]))
+        else:
+            opcode, _, operands = text.partition(' ')
+            parsed.append(AsmInstruction(opcode, _split_operands(operands)))
+    return parsed
+
+def format_assembly(lines: list[AsmLine]) -> list[str]:
+    return [str(line) for line in lines]
+
+def _is_jump(line: AsmLine) -> bool:
+    return isinstance(line, AsmInstruction) and (line.opcode == 'jmp' or line.opcode in conditional_jumps)
+
+def _ends_block(line: AsmLine) -> bool:
+    return isinstance(line, AsmInstruction) and line.opcode in ['jmp', 'ret']
+
+def _next_code(lines: list[AsmLine], i: int) -> int:
+    """Returns the index of the first label or instruction after index `i`."""
+    i += 1
+    while i < len(lines) and isinstance(lines[i], AsmText):
+        i += 1
+    return i
+
+def _labels_at(lines: list[AsmLine], i: int) -> set[str]:
+    """Returns the labels between index `i` and the next instruction."""
+    labels = set()
+    while i < len(lines) and not isinstance(lines[i], AsmInstruction):
+        line = lines[i]
+        if isinstance(line, AsmLabel):
+            labels.add(line.name)
+        i += 1
+    return labels
+
+def _remove_unreachable(lines: list[AsmLine], stats: dict[str, int]) -> list[AsmLine]:
+    result: list[AsmLine] = []
+    reachable = True
+    for line in lines:
+        if isinstance(line, AsmLabel):
+            reachable = True
+        elif isinstance(line, AsmInstruction) and not reachable:
+            stats['unreachable instructions'] += 1
+            continue
+        result.append(line)
+        if _ends_block(line):
+            reachable = False
+    return result
+
+def _thread_jumps(lines: list[AsmLine], stats: dict[str, int]) -> list[AsmLine]:
+    """Makes jumps to a `jmp` go straight to where that one goes."""
+    jump_at_label: dict[str, str] = {}
+    for i, line in enumerate(lines):
+        if isinstance(line, AsmLabel):
+            j = i
+            while j < len(lines) and not isinstance(lines[j], AsmInstruction):
+                j += 1
+            first = lines[j] if j < len(lines) else None
+            if isinstance(first, AsmInstruction) and first.opcode == 'jmp':
+                jump_at_label[line.name] = first.operands[0]
+
+    result: list[AsmLine] = []
+    for line in lines:
+        if _is_jump(line):
+            assert isinstance(line, AsmInstruction)
+            target = line.operands[0]
+            seen = {target}
+            while target in jump_at_label and jump_at_label[target] not in seen:
+                target = jump_at_label[target]
+                seen.add(target)
+            if target != line.operands[0]:
+                stats['jump chains shortened'] += 1
+                line = AsmInstruction(line.opcode, [target])
+        result.append(line)
+    return result
+
+def _simplify_branches(lines: list[AsmLine], stats: dict[str, int]) -> list[AsmLine]:
+    """Turns `jne A; jmp B; A:` into `je B; A:`, and removes jumps to the next line."""
+    result: list[AsmLine] = []
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if isinstance(line, AsmInstruction) and line.opcode in conditional_jumps:
+            j = _next_code(lines, i)
+            following = lines[j] if j < len(lines) else None
+            if (
+                isinstance(following, AsmInstruction) and following.opcode == 'jmp'
+                and line.operands[0] in _labels_at(lines, _next_code(lines, j))
+            ):
+                stats['branches inverted'] += 1
+                result.append(AsmInstruction(conditional_jumps[line.opcode], following.operands))
+                result.extend(lines[i + 1:j])
+                i = j + 1
+                continue
+        if isinstance(line, AsmInstruction) and _is_jump(line) and line.operands[0] in _labels_at(lines, i + 1):
+            stats['jumps to next line'] += 1
+            i += 1
+            continue
+        result.append(line)
+        i += 1
+    return result
+
+def _remove_unused_labels(lines: list[AsmLine], stats: dict[str, int]) -> list[AsmLine]:
+    """Removes the local labels that nothing jumps to. Function labels stay."""
+    used = {line.operands[0] for line in lines if isinstance(line, AsmInstruction) and _is_jump(line)}
+    result: list[AsmLine] = []
+    for line in lines:
+        if isinstance(line, AsmLabel) and line.name.startswith('.L') and line.name not in used:
+            stats['unused labels'] += 1
+            continue
+        result.append(line)
+    return result
+
+def _remove_redundant_moves(lines: list[AsmLine], stats: dict[str, int]) -> list[AsmLine]:
+    """Removes moves of a value into a location that already holds it, like
+    the load in `movq %rax, -8(%rbp); movq -8(%rbp), %rax`. Which locations
+    hold the same value is tracked until the next label, jump or call."""
+    same: set[frozenset[str]] = set()
+
+    def register(operand: str) -> str:
+        return _subregisters.get(operand, operand)
+
+    def overwrite(location: str) -> None:
+        location = register(location)
+        if location in ['%rbp', '%rsp']:
+            same.clear()
+        else:
+            # Also forgets memory operands addressed through a register
+            same.difference_update({pair for pair in same if any(location in p for p in pair)})
+
+    result: list[AsmLine] = []
+    for line in lines:
+        if isinstance(line, AsmLabel):
+            same.clear()
+        elif isinstance(line, AsmInstruction):
+            if line.opcode == 'movq' and len(line.operands) == 2:
+                source, dest = line.operands
+                if source == dest or frozenset((source, dest)) in same:
+                    stats['redundant moves'] += 1
+                    continue
+                overwrite(dest)
+                if not ('(' in source and '(' in dest):
+                    same.add(frozenset((source, dest)))
+            elif line.opcode == 'idivq' or line.opcode == 'imulq' and len(line.operands) == 1:
+                overwrite('%rax')
+                overwrite('%rdx')
+            elif line.opcode in _writes_last_operand and line.operands:
+                overwrite(line.operands[-1])
+            elif line.opcode == 'cqto':
+                overwrite('%rdx')
+            elif line.opcode not in _writes_nothing:
+                same.clear()
+        result.append(line)
+    return result
+
+peephole_passes = [
+    _remove_unreachable,
+    _thread_jumps,
+    _simplify_branches,
+    _remove_unused_labels,
+    _remove_redundant_moves,
+]
+
+def optimize_assembly(lines: list[AsmLine], stats: dict[str, int] | None = None) -> list[AsmLine]:
+    """Runs peephole optimizations over the assembly code of a function until
+    none of them changes it. Counts what each of them removed or changed in `stats`."""
+    counts = {
+        'unreachable instructions': 0,
+        'jump chains shortened': 0,
+        'branches inverted': 0,
+        'jumps to next line': 0,
+        'unused labels': 0,
+        'redundant moves': 0,
+    }
+    while True:
+        before = sum(counts.values())
+        for peephole_pass in peephole_passes:
+            lines = peephole_pass(lines, counts)
+        if sum(counts.values()) == before:
+            break
+    if stats is not None:
+        for name, count in counts.items():
+            stats[name] = stats.get(name, 0) + count
+    return lines
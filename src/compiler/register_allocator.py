@@ -0,0 +1,143 @@
+from dataclasses import dataclass
+
+from compiler import ir
+from compiler.cfg import build_cfg
+from compiler.intrinsics import all_intrinsics
+
+# %rax and %rdx are scratch registers of the generated code and the intrinsics,
+# and %rdi, %rsi, %rcx, %r8 and %r9 carry function arguments.
+callee_saved_registers = ['%rbx', '%r12', '%r13', '%r14', '%r15']
+caller_saved_registers = ['%r10', '%r11']
+allocatable_registers = callee_saved_registers + caller_saved_registers
+
+@dataclass
+class Interval:
+    """The range of instruction indices where a variable is defined or live."""
+    var: ir.IRVar
+    start: int
+    end: int
+    crosses_call: bool = False
+
+def uses_and_defs(insn: ir.Instruction) -> tuple[list[ir.IRVar], list[ir.IRVar]]:
+    """Returns the variables an instruction reads and writes. Function names of calls
+    and parameter symbols aren't variables."""
+    match insn:
+        case ir.Call():
+            return insn.args, [insn.dest]
+        case ir.LoadIntConst() | ir.LoadBoolConst() | ir.LoadIntParam() | ir.LoadBoolParam():
+            return [], [insn.dest]
+        case ir.Copy():
+            return [insn.source], [insn.dest]
+        case ir.CondJump():
+            return [insn.cond], []
+        case ir.Return():
+            return [insn.value], []
+        case ir.Phi():
+            return insn.sources, [insn.dest]
+        case _:
+            return [], []
+
+def live_variables(instructions: list[ir.Instruction]) -> list[set[ir.IRVar]]:
+    """Computes the variables live after each instruction. The dataflow is solved
+    over basic blocks, then spread to the instructions inside them."""
+    graph = build_cfg('', instructions)
+
+    block_uses: list[set[ir.IRVar]] = []
+    block_defs: list[set[ir.IRVar]] = []
+    for block in graph.blocks:
+        uses: set[ir.IRVar] = set()
+        defs: set[ir.IRVar] = set()
+        for insn in block.instructions:
+            insn_uses, insn_defs = uses_and_defs(insn)
+            uses.update(v for v in insn_uses if v not in defs)
+            defs.update(insn_defs)
+        block_uses.append(uses)
+        block_defs.append(defs)
+
+    live_in: list[set[ir.IRVar]] = [set() for _ in graph.blocks]
+    changed = True
+    while changed:
+        changed = False
+        for block in reversed(graph.blocks):
+            out = set().union(*(live_in[s] for s in block.successors))
+            new_in = block_uses[block.index] | (out - block_defs[block.index])
+            if new_in != live_in[block.index]:
+                live_in[block.index] = new_in
+                changed = True
+
+    live_out: list[set[ir.IRVar]] = []
+    for block in graph.blocks:
+        live: set[ir.IRVar] = set().union(*(live_in[s] for s in block.successors))
+        block_live_out = []
+        for insn in reversed(block.instructions):
+            block_live_out.append(set(live))
+            insn_uses, insn_defs = uses_and_defs(insn)
+            live.difference_update(insn_defs)
+            live.update(insn_uses)
+        live_out.extend(reversed(block_live_out))
+    return live_out
+
+def is_function_call(insn: ir.Instruction) -> bool:
+    return isinstance(insn, ir.Call) and insn.fun.name not in all_intrinsics
+
+def live_intervals(instructions: list[ir.Instruction], live_out: list[set[ir.IRVar]]) -> list[Interval]:
+    """Computes one interval per variable, sorted by start. Variables read before
+    they are written on some path are live from the start of the function."""
+    intervals: dict[ir.IRVar, Interval] = {}
+
+    def extend(v: ir.IRVar, i: int) -> None:
+        interval = intervals.get(v)
+        if interval is None:
+            intervals[v] = Interval(v, i, i)
+        else:
+            interval.start = min(interval.start, i)
+            interval.end = max(interval.end, i)
+
+    live_in_first: set[ir.IRVar] = set()
+    if instructions:
+        uses, defs = uses_and_defs(instructions[0])
+        live_in_first = set(uses) | (live_out[0] - set(defs))
+    for v in live_in_first:
+        extend(v, 0)
+
+    for i, insn in enumerate(instructions):
+        uses, defs = uses_and_defs(insn)
+        for v in uses + defs:
+            extend(v, i)
+        for v in live_out[i]:
+            extend(v, i)
+        if is_function_call(insn):
+            for v in live_out[i] - set(defs):
+                intervals[v].crosses_call = True
+
+    return sorted(intervals.values(), key=lambda interval: (interval.start, interval.end))
+
+def allocate_registers(intervals: list[Interval]) -> dict[ir.IRVar, str]:
+    """Assigns registers to variables by linear scan over their live intervals,
+    and returns the variables kept in a register. The others are spilled to the stack.
+    When no register is free, the interval that ends last is spilled.
+    Intervals live across a function call prefer callee saved registers,
+    the others prefer caller saved ones."""
+    registers: dict[ir.IRVar, str] = {}
+    active: list[Interval] = []
+    free = list(allocatable_registers)
+
+    for interval in intervals:
+        for old in [a for a in active if a.end < interval.start]:
+            active.remove(old)
+            free.append(registers[old.var])
+
+        if free:
+            preferred = callee_saved_registers if interval.crosses_call else caller_saved_registers
+            register = next((r for r in free if r in preferred), free[0])
+            free.remove(register)
+            registers[interval.var] = register
+            active.append(interval)
+        else:
+            longest = max(active, key=lambda a: a.end)
+            if longest.end > interval.end:
+                registers[interval.var] = registers.pop(longest.var)
+                active.remove(longest)
+                active.append(interval)
+
+    return registers
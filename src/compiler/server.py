@@ -0,0 +1,84 @@
+import json
+import os
+import socketserver
+import threading
+from contextlib import nullcontext
+from typing import IO, Any, ContextManager
+
+from compiler.cache import CompilationCache
+from compiler.commands import run_command, source_commands
+
+def handle_request(request: Any, cache: CompilationCache | None = None) -> dict[str, Any]:
+    """Runs one request of the form
+    `{"command": "asm", "source": "...", "output_file": "...", "opt_level": 1, "id": ...}`,
+    where "output_file", "opt_level" and "id" are optional. Returns
+    `{"ok": true, "output": ...}` or `{"ok": false, "error": "..."}`,
+    with the request's "id" if it had one."""
+    response: dict[str, Any]
+    try:
+        if not isinstance(request, dict):
+            raise Exception('Request must be a JSON object')
+        command = request.get('command')
+        source_code = request.get('source')
+        if command not in source_commands:
+            raise Exception(f'Unknown command: {command}')
+        if not isinstance(source_code, str):
+            raise Exception('Request is missing "source"')
+        output_file = request.get('output_file', 'compiled_program')
+        opt_level = request.get('opt_level', 0)
+        if not isinstance(opt_level, int):
+            raise Exception('"opt_level" must be an integer')
+        output = run_command(command, source_code, cache, str(output_file), opt_level)
+        response = {'ok': True, 'output': output}
+    except Exception as e:
+        response = {'ok': False, 'error': str(e)}
+
+    if isinstance(request, dict) and 'id' in request:
+        response['id'] = request['id']
+    return response
+
+def serve_lines(
+    input: IO[str],
+    output: IO[str],
+    cache: CompilationCache | None = None,
+    lock: ContextManager[Any] = nullcontext()
+) -> None:
+    """Answers JSON line requests from `input` until it ends, one response line per request.
+    Each request is handled inside `lock`."""
+    for line in input:
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError as e:
+            response: dict[str, Any] = {'ok': False, 'error': f'Invalid JSON: {e}'}
+        else:
+            with lock:
+                response = handle_request(request, cache)
+        output.write(json.dumps(response) + '\n')
+        output.flush()
+
+def make_server(socket_path: str, cache: CompilationCache | None = None) -> socketserver.UnixStreamServer:
+    """Creates a server that answers JSON line requests on a Unix socket,
+    each connection in its own thread. Requests are compiled one at a time,
+    since the threads share the cache, its statistics and the output files."""
+    lock = threading.Lock()
+
+    class Handler(socketserver.BaseRequestHandler):
+        def handle(self) -> None:
+            with (
+                self.request.makefile('r', encoding='utf-8') as input,
+                self.request.makefile('w', encoding='utf-8') as output
+            ):
+                serve_lines(input, output, cache, lock)
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    return socketserver.ThreadingUnixStreamServer(socket_path, Handler)
+
+def serve_socket(socket_path: str, cache: CompilationCache | None = None) -> None:
+    with make_server(socket_path, cache) as server:
+        try:
+            server.serve_forever()
+        finally:
+            os.remove(socket_path)
@@ -0,0 +1,446 @@
+from dataclasses import replace
+from typing import Callable
+
+from compiler import ir
+from compiler.cfg import build_cfg, is_terminator
+from compiler.constant_folding import fold_call
+from compiler.dead_code import remove_unreachable_blocks
+from compiler.intrinsics import all_intrinsics
+from compiler.register_allocator import uses_and_defs
+from compiler.tokenizer import Location
+
+# Every block starts with a label in SSA form, so that phis can name their predecessors.
+# The entry block gets this one, and loses it again when leaving SSA form.
+entry_label_name = 'entry'
+
+commutative_intrinsics = {'+', '*', '==', '!='}
+
+def map_vars(
+    insn: ir.Instruction,
+    use: Callable[[ir.IRVar], ir.IRVar],
+    define: Callable[[ir.IRVar], ir.IRVar]
+) -> ir.Instruction:
+    """Returns the instruction with `use` applied to the variables it reads
+    and then `define` applied to the variables it writes."""
+    match insn:
+        case ir.Call():
+            return replace(insn, args=[use(a) for a in insn.args], dest=define(insn.dest))
+        case ir.LoadIntConst() | ir.LoadBoolConst() | ir.LoadIntParam() | ir.LoadBoolParam():
+            return replace(insn, dest=define(insn.dest))
+        case ir.Copy():
+            return replace(insn, source=use(insn.source), dest=define(insn.dest))
+        case ir.CondJump():
+            return replace(insn, cond=use(insn.cond))
+        case ir.Return():
+            return replace(insn, value=use(insn.value))
+        case ir.Phi():
+            return replace(insn, sources=[use(s) for s in insn.sources], dest=define(insn.dest))
+        case _:
+            return insn
+
+def _block_labels(instructions: list[ir.Instruction]) -> list[ir.Instruction]:
+    """Adds the entry label and drops the blocks that can't be reached,
+    after which every block starts with a label."""
+    if not instructions:
+        return instructions
+    first = instructions[0]
+    if not (isinstance(first, ir.Label) and first.name == entry_label_name):
+        instructions = [ir.Label(first.location, entry_label_name), *instructions]
+    return remove_unreachable_blocks(instructions)
+
+def label_name(insn: ir.Instruction) -> str:
+    """Returns the name of the label that starts a block."""
+    assert isinstance(insn, ir.Label), 'blocks in SSA form start with a label'
+    return insn.name
+
+def to_ssa(instructions: list[ir.Instruction]) -> list[ir.Instruction]:
+    """Converts a function's IR into static single assignment form, where each
+    variable is written by one instruction. A variable written in several blocks
+    gets a phi on the dominance frontiers of those blocks, if it is read in some
+    other block than where it is written. Variables then get a new name with a
+    numeric suffix for each write.
+
+    Variables read where no write reaches them, like `unit`, keep their names."""
+    instructions = _block_labels(instructions)
+    if not instructions:
+        return instructions
+    graph = build_cfg('', instructions)
+    blocks = graph.blocks
+    labels = [label_name(block.instructions[0]) for block in blocks]
+
+    defsites: dict[ir.IRVar, set[int]] = {}
+    read_across_blocks: set[ir.IRVar] = set()
+    for block in blocks:
+        written: set[ir.IRVar] = set()
+        for insn in block.instructions:
+            uses, defs = uses_and_defs(insn)
+            read_across_blocks.update(v for v in uses if v not in written)
+            written.update(defs)
+            for v in defs:
+                defsites.setdefault(v, set()).add(block.index)
+
+    frontiers = graph.dominance_frontiers()
+    phi_vars: list[list[ir.IRVar]] = [[] for _ in blocks]
+    for v in sorted(read_across_blocks & defsites.keys(), key=lambda v: v.name):
+        has_phi: set[int] = set()
+        seen = set(defsites[v])
+        work = list(seen)
+        while work:
+            for d in frontiers[work.pop()]:
+                if d not in has_phi:
+                    has_phi.add(d)
+                    phi_vars[d].append(v)
+                    if d not in seen:
+                        seen.add(d)
+                        work.append(d)
+
+    # Rename by walking the dominator tree, with a stack of names for each variable
+    children: list[list[int]] = [[] for _ in blocks]
+    for b, parent in enumerate(graph.idom):
+        if parent is not None:
+            children[parent].append(b)
+
+    stacks: dict[ir.IRVar, list[ir.IRVar]] = {}
+    counts: dict[ir.IRVar, int] = {}
+    pushed: list[ir.IRVar] = []
+    pushed_by_block: dict[int, list[ir.IRVar]] = {}
+    phi_dests: list[list[ir.IRVar]] = [[] for _ in blocks]
+    phi_sources: list[list[dict[str, ir.IRVar]]] = [[{} for _ in phi_vars[b]] for b in range(len(blocks))]
+    renamed: list[list[ir.Instruction]] = [[] for _ in blocks]
+
+    def current(v: ir.IRVar) -> ir.IRVar:
+        stack = stacks.get(v)
+        return stack[-1] if stack else v
+
+    def fresh(v: ir.IRVar) -> ir.IRVar:
+        counts[v] = counts.get(v, 0) + 1
+        new = ir.IRVar(f'{v.name}_{counts[v]}')
+        stacks.setdefault(v, []).append(new)
+        pushed.append(v)
+        return new
+
+    work_stack = [(0, True)]
+    while work_stack:
+        b, entering = work_stack.pop()
+        if not entering:
+            for v in pushed_by_block.pop(b):
+                stacks[v].pop()
+            continue
+
+        pushed = []
+        label, *body = blocks[b].instructions
+        phi_dests[b] = [fresh(v) for v in phi_vars[b]]
+        renamed[b] = [label, *(map_vars(insn, current, fresh) for insn in body)]
+        for s in blocks[b].successors:
+            for v, sources in zip(phi_vars[s], phi_sources[s]):
+                sources[labels[b]] = current(v)
+
+        pushed_by_block[b] = pushed
+        work_stack.append((b, False))
+        work_stack.extend((c, True) for c in reversed(children[b]))
+
+    result: list[ir.Instruction] = []
+    for block in blocks:
+        label, *body = renamed[block.index]
+        pred_labels = [labels[p] for p in block.predecessors]
+        result.append(label)
+        for dest, sources in zip(phi_dests[block.index], phi_sources[block.index]):
+            result.append(ir.Phi(label.location, [sources[p] for p in pred_labels], pred_labels, dest))
+        result.extend(body)
+    return result
+
+def sequentialize(
+    moves: list[tuple[ir.IRVar, ir.IRVar]],
+    location: Location,
+    new_temp: Callable[[], ir.IRVar]
+) -> list[ir.Instruction]:
+    """Orders (dest, source) copies that happen at the same time, like those of
+    phis, so that no copy overwrites a source of a later one. Cycles like swaps
+    go through a temporary variable."""
+    pending = [(d, s) for d, s in moves if d != s]
+    copies: list[ir.Instruction] = []
+    while pending:
+        sources = {s for _, s in pending}
+        for i, (d, s) in enumerate(pending):
+            if d not in sources:
+                copies.append(ir.Copy(location, s, d))
+                del pending[i]
+                break
+        else:
+            d, _ = pending[0]
+            temp = new_temp()
+            copies.append(ir.Copy(location, d, temp))
+            pending = [(d2, temp if s2 == d else s2) for d2, s2 in pending]
+    return copies
+
+def from_ssa(instructions: list[ir.Instruction]) -> list[ir.Instruction]:
+    """Replaces phis with copies at the end of the predecessor blocks.
+    An edge from a block with two successors to a block with phis gets
+    a block of its own for the copies, placed before the target block."""
+    if not instructions:
+        return instructions
+    graph = build_cfg('', instructions)
+    blocks = graph.blocks
+    labels = [label_name(block.instructions[0]) for block in blocks]
+    bodies = [[insn for insn in block.instructions if not isinstance(insn, ir.Phi)] for block in blocks]
+    edge_blocks: list[list[ir.Instruction]] = [[] for _ in blocks]
+    temp_count = 0
+
+    def new_temp() -> ir.IRVar:
+        nonlocal temp_count
+        temp_count += 1
+        return ir.IRVar(f'ssa_tmp{temp_count}')
+
+    for block in blocks:
+        phis = [insn for insn in block.instructions if isinstance(insn, ir.Phi)]
+        if not phis:
+            continue
+        label = block.instructions[0]
+        assert isinstance(label, ir.Label)
+        for p in dict.fromkeys(block.predecessors):
+            moves = [(phi.dest, phi.sources[phi.labels.index(labels[p])]) for phi in phis]
+            copies = sequentialize(moves, label.location, new_temp)
+            pred_body = bodies[p]
+            if len(blocks[p].successors) == 1:
+                if is_terminator(pred_body[-1]):
+                    pred_body[-1:-1] = copies
+                else:
+                    pred_body.extend(copies)
+            else:
+                edge_label = ir.Label(label.location, f'{labels[p]}_to_{label.name}')
+                jump = pred_body[-1]
+                assert isinstance(jump, ir.CondJump)
+                pred_body[-1] = replace(
+                    jump,
+                    then_label=edge_label if jump.then_label.name == label.name else jump.then_label,
+                    else_label=edge_label if jump.else_label.name == label.name else jump.else_label
+                )
+                edge_blocks[block.index].extend([edge_label, *copies, ir.Jump(label.location, label)])
+
+    result: list[ir.Instruction] = []
+    for block in blocks:
+        if edge_blocks[block.index]:
+            label = block.instructions[0]
+            assert isinstance(label, ir.Label)
+            if result and not is_terminator(result[-1]):
+                result.append(ir.Jump(label.location, label))  # used to fall through
+            result.extend(edge_blocks[block.index])
+        result.extend(bodies[block.index])
+
+    first = result[0]
+    if isinstance(first, ir.Label) and first.name == entry_label_name:
+        result = result[1:]
+    return result
+
+class _Unknown:
+    """The value of a variable whose definition hasn't been evaluated yet."""
+
+_unknown = _Unknown()
+
+def sccp(instructions: list[ir.Instruction]) -> list[ir.Instruction]:
+    """Sparse conditional constant propagation on SSA form, after Wegman and Zadeck.
+    Follows only the branches that can be taken with the constants known so far,
+    so constants reach through conditions that are themselves constant.
+    Writes of constants become constant loads, constant conditions become jumps
+    and blocks that are never reached are removed."""
+    if not instructions:
+        return instructions
+    graph = build_cfg('', instructions)
+    blocks = graph.blocks
+    label_blocks = {label_name(block.instructions[0]): block.index for block in blocks}
+
+    defined: set[ir.IRVar] = set()
+    users: dict[ir.IRVar, list[tuple[int, ir.Instruction]]] = {}
+    for block in blocks:
+        for insn in block.instructions:
+            uses, defs = uses_and_defs(insn)
+            defined.update(defs)
+            for v in uses:
+                users.setdefault(v, []).append((block.index, insn))
+
+    # Absent: unknown yet. None: not a constant.
+    values: dict[ir.IRVar, int | bool | None] = {}
+    executable_edges: set[tuple[int, int]] = set()
+    executable_blocks: set[int] = set()
+    edge_work: list[tuple[int, int]] = [(-1, 0)]
+    insn_work: list[tuple[int, ir.Instruction]] = []
+
+    def value_of(v: ir.IRVar) -> int | bool | None | _Unknown:
+        return values.get(v, _unknown) if v in defined else None
+
+    def mark_edge(a: int, b: int) -> None:
+        if (a, b) not in executable_edges:
+            executable_edges.add((a, b))
+            edge_work.append((a, b))
+
+    def meet(a: int | bool | None | _Unknown, b: int | bool | None | _Unknown) -> int | bool | None | _Unknown:
+        if isinstance(a, _Unknown):
+            return b
+        if isinstance(b, _Unknown):
+            return a
+        if a is None or b is None or type(a) is not type(b) or a != b:
+            return None
+        return a
+
+    def evaluate(b: int, insn: ir.Instruction) -> int | bool | None | _Unknown:
+        match insn:
+            case ir.LoadIntConst() | ir.LoadBoolConst():
+                return insn.value
+            case ir.Copy():
+                return value_of(insn.source)
+            case ir.Phi():
+                result: int | bool | None | _Unknown = _unknown
+                for source, label in zip(insn.sources, insn.labels):
+                    if (label_blocks[label], b) in executable_edges:
+                        result = meet(result, value_of(source))
+                return result
+            case ir.Call() if insn.fun.name in all_intrinsics:
+                args = [value_of(a) for a in insn.args]
+                if any(a is None for a in args):
+                    return None
+                if any(isinstance(a, _Unknown) for a in args):
+                    return _unknown
+                return fold_call(insn.fun.name, args)  # type: ignore[arg-type]
+            case _:
+                return None
+
+    def visit(b: int, insn: ir.Instruction) -> None:
+        if isinstance(insn, ir.CondJump):
+            cond = value_of(insn.cond)
+            then_block = label_blocks[insn.then_label.name]
+            else_block = label_blocks[insn.else_label.name]
+            if isinstance(cond, bool):
+                mark_edge(b, then_block if cond else else_block)
+            elif cond is None:
+                mark_edge(b, then_block)
+                mark_edge(b, else_block)
+            return
+        _, defs = uses_and_defs(insn)
+        for dest in defs:
+            new = evaluate(b, insn)
+            old = value_of(dest)
+            if not isinstance(new, _Unknown) and (isinstance(old, _Unknown) or (old is not None and new is None)):
+                values[dest] = new
+                insn_work.extend(users.get(dest, []))
+
+    while edge_work or insn_work:
+        if edge_work:
+            a, b = edge_work.pop()
+            first_visit = b not in executable_blocks
+            executable_blocks.add(b)
+            for insn in blocks[b].instructions:
+                if first_visit or isinstance(insn, ir.Phi):
+                    visit(b, insn)
+            if first_visit and not isinstance(blocks[b].instructions[-1], ir.CondJump):
+                for s in blocks[b].successors:
+                    mark_edge(b, s)
+        else:
+            b, insn = insn_work.pop()
+            if b in executable_blocks:
+                visit(b, insn)
+
+    def load(insn: ir.Instruction, value: int | bool, dest: ir.IRVar) -> ir.Instruction:
+        if isinstance(value, bool):
+            return ir.LoadBoolConst(insn.location, value, dest)
+        return ir.LoadIntConst(insn.location, value, dest)
+
+    result: list[ir.Instruction] = []
+    for block in blocks:
+        if block.index not in executable_blocks:
+            continue
+        for insn in block.instructions:
+            match insn:
+                case ir.CondJump():
+                    cond = value_of(insn.cond)
+                    if isinstance(cond, bool):
+                        insn = ir.Jump(insn.location, insn.then_label if cond else insn.else_label)
+                case ir.Phi():
+                    value = value_of(insn.dest)
+                    if isinstance(value, (int, bool)):
+                        insn = load(insn, value, insn.dest)
+                    else:
+                        kept = [
+                            (source, label)
+                            for source, label in zip(insn.sources, insn.labels)
+                            if (label_blocks[label], block.index) in executable_edges
+                        ]
+                        if len(kept) == 1:
+                            insn = ir.Copy(insn.location, kept[0][0], insn.dest)
+                        else:
+                            insn = replace(insn, sources=[s for s, _ in kept], labels=[l for _, l in kept])
+                case ir.Copy() | ir.Call():  # calls of functions are never constant
+                    value = value_of(insn.dest)
+                    if isinstance(value, (int, bool)):
+                        insn = load(insn, value, insn.dest)
+            result.append(insn)
+    return result
+
+def gvn(instructions: list[ir.Instruction]) -> list[ir.Instruction]:
+    """Global value numbering on SSA form. Walks the dominator tree and replaces
+    each intrinsic call that computes the same operation on the same values as
+    a call in a dominating position with a copy of that call's result.
+    Constants are numbered by their value, but their loads are kept, since loading
+    a constant again is cheaper than keeping it in a variable."""
+    if not instructions:
+        return instructions
+    graph = build_cfg('', instructions)
+    blocks = graph.blocks
+    children: list[list[int]] = [[] for _ in blocks]
+    for b, parent in enumerate(graph.idom):
+        if parent is not None:
+            children[parent].append(b)
+
+    leaders: dict[ir.IRVar, ir.IRVar] = {}
+    available: dict[tuple[object, ...], ir.IRVar] = {}
+    added_by_block: dict[int, list[tuple[object, ...]]] = {}
+    numbered: list[list[ir.Instruction]] = [[] for _ in blocks]
+
+    def leader(v: ir.IRVar) -> ir.IRVar:
+        return leaders.get(v, v)
+
+    work_stack = [(0, True)]
+    while work_stack:
+        b, entering = work_stack.pop()
+        if not entering:
+            for old_key in added_by_block.pop(b):
+                del available[old_key]
+            continue
+
+        added: list[tuple[object, ...]] = []
+        for insn in blocks[b].instructions:
+            key: tuple[object, ...] | None = None
+            match insn:
+                case ir.Copy():
+                    leaders[insn.dest] = leader(insn.source)
+                case ir.LoadIntConst() | ir.LoadBoolConst():
+                    key = (type(insn).__name__, insn.value)
+                case ir.Call() if insn.fun.name in all_intrinsics:
+                    args = [leader(a) for a in insn.args]
+                    if insn.fun.name in commutative_intrinsics:
+                        args.sort(key=lambda a: a.name)
+                    key = (insn.fun.name, *args)
+                case ir.Phi():
+                    sources = {leader(s) for s in insn.sources}
+                    if len(sources) == 1 and insn.dest not in sources:
+                        insn = ir.Copy(insn.location, sources.pop(), insn.dest)
+                        leaders[insn.dest] = insn.source
+                    else:
+                        key = ('phi', b, *(leader(s) for s in insn.sources))
+
+            if key is not None:
+                _, (dest,) = uses_and_defs(insn)
+                existing = available.get(key)
+                if existing is None:
+                    available[key] = dest
+                    added.append(key)
+                else:
+                    leaders[dest] = existing
+                    if not isinstance(insn, (ir.LoadIntConst, ir.LoadBoolConst)):
+                        insn = ir.Copy(insn.location, existing, dest)
+            numbered[b].append(insn)
+
+        added_by_block[b] = added
+        work_stack.append((b, False))
+        work_stack.extend((c, True) for c in reversed(children[b]))
+
+    return [insn for block in numbered for insn in block]
@@ -12,12 +12,12 @@ class SymTab(Generic[T]):
     parent: Optional["SymTab"] = None
 
     def get_symbol(self, name: str) -> T:
-        if name in self.locals:
-            return self.locals[name]
-        elif self.parent is not None:
-            return self.parent.get_symbol(name)
-        else:
-            raise TypeError(f"Variable not found: '{name}'")
+        symtab: SymTab | None = self
+        while symtab is not None:
+            if name in symtab.locals:
+                return symtab.locals[name]
+            symtab = symtab.parent
+        raise TypeError(f"Variable not found: '{name}'")
         
     def set_local(self, name: str, t: T) -> None:
         self.locals[name] = t
@@ -0,0 +1,66 @@
+from compiler import ir
+from compiler.ssa import sequentialize
+
+# Where a function jumps back to instead of calling itself, right after its parameter loads
+tail_call_label_name = 'tail_call_start'
+
+def _returns_result(instructions: list[ir.Instruction], i: int, labels: dict[str, int]) -> bool:
+    """Tells whether the result of the call at index `i` is returned without
+    anything else happening first. The result may be copied from variable
+    to variable on the way. A Unit function returns `unit` instead."""
+    call = instructions[i]
+    assert isinstance(call, ir.Call)
+    value = call.dest
+    visited = set()
+    i += 1
+    while i < len(instructions) and i not in visited:
+        visited.add(i)
+        match instructions[i]:
+            case ir.Copy(source=source, dest=dest):
+                if source == value:
+                    value = dest
+                elif dest == value:
+                    return False
+            case ir.Jump(label=label):
+                i = labels[label.name]
+                continue
+            case ir.Label():
+                pass
+            case ir.Return(value=returned):
+                return returned == value or returned == ir.IRVar('unit')
+            case _:
+                return False
+        i += 1
+    return False
+
+def eliminate_tail_calls(fun_name: str, instructions: list[ir.Instruction]) -> list[ir.Instruction]:
+    """Turns the calls of a function to itself whose result it returns right away
+    into copies of the arguments to the parameters and a jump back to the start
+    of the function, so that such recursion runs in constant stack space."""
+    labels = {insn.name: i for i, insn in enumerate(instructions) if isinstance(insn, ir.Label)}
+    tail_calls = [
+        i for i, insn in enumerate(instructions)
+        if isinstance(insn, ir.Call) and insn.fun.name == fun_name and _returns_result(instructions, i, labels)
+    ]
+    if not tail_calls:
+        return instructions
+
+    params = [insn.dest for insn in instructions if isinstance(insn, (ir.LoadIntParam, ir.LoadBoolParam))]
+    param_count = len(params)
+    start = ir.Label(instructions[0].location, tail_call_label_name)
+    temp_count = 0
+
+    def new_temp() -> ir.IRVar:
+        nonlocal temp_count
+        temp_count += 1
+        return ir.IRVar(f'tail_tmp{temp_count}')
+
+    result: list[ir.Instruction] = [*instructions[:param_count], start]
+    for i, insn in enumerate(instructions[param_count:], start=param_count):
+        if i in tail_calls:
+            assert isinstance(insn, ir.Call)
+            result.extend(sequentialize(list(zip(params, insn.args)), insn.location, new_temp))
+            result.append(ir.Jump(insn.location, start))
+        else:
+            result.append(insn)
+    return result
@@ -1,10 +1,16 @@
+import codecs
+import mmap
 import re
-from typing import Literal, cast, Any
+import sys
+from array import array
+from collections import deque
+from collections.abc import Sequence
+from typing import IO, Iterable, Iterator, Literal, cast, overload, Any
 from dataclasses import dataclass
 
-TokenType = Literal['int_literal', 'identifier', 'operator', 'punctuation', 'end']
+TokenType = Literal['int_literal', 'identifier', 'keyword', 'operator', 'punctuation', 'end']
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Location:
     line: int
     column: int
@@ -20,7 +26,7 @@ class Location:
 
 L = Location(line=1, column=1)
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Token:
     text: str
     type: TokenType
@@ -35,46 +41,265 @@ class Token:
             and loc_eq
         )
 
+# One master pattern, compiled once. The alternatives are tried in this order
+# at every position, so the order matters: comments must win over the '/' operator.
+# Group 'newline' matches a run of newlines and is used for token line and column,
+# 'skip' covers comments and whitespace.
+_token_re = re.compile('|'.join([
+    r'(?P<newline>\n+)',
+    r'(?P<skip>(?://|#)[^\n]*|[^\S\n]+)',
+    r'(?P<identifier>[a-zA-Z_][a-zA-Z0-9_]*)',
+    r'(?P<int_literal>[0-9]+)',
+    r'(?P<operator>==|!=|>=|<=|=>|\+|\-|\*|/|=|<|>|%)',
+    r'(?P<punctuation>\(|\)|{|}|\,|;|:)',
+]))
+
+# Texts of keyword, operator and punctuation tokens are interned,
+# so the parser's tables keyed on them are hit by identity
+keywords: dict[str, str] = {k: sys.intern(k) for k in [
+    'var', 'if', 'then', 'else', 'while', 'do', 'fun', 'return',
+    'and', 'or', 'not', 'true', 'false', 'break', 'continue'
+]}
+_symbols: dict[str, str] = {s: sys.intern(s) for s in [
+    '==', '!=', '>=', '<=', '=>', '+', '-', '*', '/', '=', '<', '>', '%',
+    '(', ')', '{', '}', ',', ';', ':'
+]}
+
+def _classify(token_type: str | None, text: str) -> tuple[TokenType, str]:
+    """Returns the final type and the interned text of a token matched by `_token_re`."""
+    if token_type == 'identifier':
+        keyword = keywords.get(text)
+        if keyword is not None:
+            return 'keyword', keyword
+        return 'identifier', sys.intern(text)
+    elif token_type == 'int_literal':
+        return 'int_literal', text
+    return cast(TokenType, token_type), _symbols[text]
+
 def tokenize(source_code: str) -> list[Token]:
-    token_re = [
-        ('newline', re.compile('\n+')), # newline for token line and column
-        ( None, re.compile(r'(//|#)[^\n]*|[^\S\n]+')), # comments, whitespaces as None
-        ('identifier', re.compile(r'[a-zA-Z_][a-zA-Z0-9_]*')),
-        ('int_literal', re.compile(r'[0-9]+')),
-        ('operator', re.compile(r'==|!=|>=|<=|=>|\+|\-|\*|/|=|<|>|%')),
-        ('punctuation', re.compile(r'\(|\)|{|}|\,|;|:')),
-    ]
+    position = 0
+    line = 1
+    column = 1
+    tokens: list[Token] = []
+    append = tokens.append
+
+    for match in _token_re.finditer(source_code):
+        start, end = match.span()
+        if start != position:
+            break
+        token_type = match.lastgroup
+        if token_type == 'newline':
+            line += end - start
+            column = 1
+        else:
+            if token_type != 'skip':
+                final_type, text = _classify(token_type, match.group())
+                append(Token(
+                    text=text,
+                    type=final_type,
+                    loc=Location(line=line, column=column)
+                ))
+            column += end - start
+        position = end
+
+    if position < len(source_code):
+        raise Exception(f"Invalid token near {source_code[position:position+10]}")
+
+    return tokens
+
+def tokenize_stream(source: IO[str] | IO[bytes] | mmap.mmap, chunk_size: int = 1 << 16) -> Iterator[Token]:
+    """Yields the same tokens as `tokenize`, reading the source lazily in chunks.
 
+    Bytes (from a binary file or an `mmap`) are decoded as UTF-8."""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
     position = 0
     line = 1
     column = 1
-    tokens = []
-
-    while position < len(source_code):
-        for token_type, regex in token_re:
-            match = regex.match(source_code, position)
-            if match:
-                token_text = match.group()
-
-                location = Location(line=line, column=column)
-
-                tokens.append(Token(
-                    text=token_text,
-                    type=cast(TokenType, token_type),
-                    loc=location
-                )) if token_type not in [None, 'newline'] else None
-
-                position += len(token_text)
-                if token_type == 'newline':
-                    line += 1
-                    column = 1
-                else:
-                    column += len(token_text)
-                break
+    at_eof = False
+
+    while not at_eof:
+        chunk = source.read(chunk_size)
+        at_eof = not chunk
+        text = decoder.decode(chunk, final=at_eof) if isinstance(chunk, bytes) else chunk
+        buffer = buffer[position:] + text
+        position = 0
+
+        for match in _token_re.finditer(buffer):
+            start, end = match.span()
+            if start != position:
+                raise Exception(f"Invalid token near {buffer[position:position+10]}")
+            if end == len(buffer) and not at_eof:
+                break # the match might continue in the next chunk
+            token_type = match.lastgroup
+            if token_type == 'newline':
+                line += end - start
+                column = 1
+            else:
+                if token_type != 'skip':
+                    final_type, text = _classify(token_type, match.group())
+                    yield Token(
+                        text=text,
+                        type=final_type,
+                        loc=Location(line=line, column=column)
+                    )
+                column += end - start
+            position = end
+
+    if position < len(buffer):
+        raise Exception(f"Invalid token near {buffer[position:position+10]}")
+
+token_types: tuple[TokenType, ...] = ('int_literal', 'identifier', 'keyword', 'operator', 'punctuation', 'end')
+_token_type_ids = {t: i for i, t in enumerate(token_types)}
+# Keywords are classified again when a compact token is accessed
+_compact_types = ['identifier' if t == 'keyword' else t for t in token_types]
+
+class TokenArray(Sequence[Token]):
+    """Compact token store for large inputs.
+
+    Tokens are kept in parallel arrays of type id, start offset, length,
+    line and column, and the text is sliced from the source only when a
+    token is accessed. Indexing returns an ordinary `Token`."""
+
+    def __init__(self, source_code: str) -> None:
+        self.source_code = source_code
+        self.type_ids = array('B')
+        self.starts = array('I')
+        self.lengths = array('I')
+        self.lines = array('I')
+        self.columns = array('I')
+
+    def append(self, token_type: TokenType, start: int, length: int, line: int, column: int) -> None:
+        self.type_ids.append(_token_type_ids[token_type])
+        self.starts.append(start)
+        self.lengths.append(length)
+        self.lines.append(line)
+        self.columns.append(column)
+
+    def __len__(self) -> int:
+        return len(self.type_ids)
+
+    @overload
+    def __getitem__(self, index: int) -> Token: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[Token]: ...
+
+    def __getitem__(self, index: int | slice) -> Token | list[Token]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        start = self.starts[index]
+        token_type, text = _classify(
+            _compact_types[self.type_ids[index]],
+            self.source_code[start:start + self.lengths[index]]
+        )
+        return Token(
+            text=text,
+            type=token_type,
+            loc=Location(line=self.lines[index], column=self.columns[index])
+        )
+
+    def nbytes(self) -> int:
+        """Returns the number of bytes used by the token columns, excluding the source."""
+        columns = [self.type_ids, self.starts, self.lengths, self.lines, self.columns]
+        return sum(c.buffer_info()[1] * c.itemsize for c in columns)
+
+def scan(
+    source_code: str,
+    position: int = 0,
+    line: int = 1,
+    column: int = 1
+) -> Iterator[tuple[TokenType, int, int, int, int]]:
+    """Yields `(type, start, end, line, column)` for each token from `position` on.
+
+    `position` must be at the start of a token, a comment or whitespace,
+    and `line` and `column` its location. The token text is `source_code[start:end]`."""
+    for match in _token_re.finditer(source_code, position):
+        start, end = match.span()
+        if start != position:
+            break
+        token_type = match.lastgroup
+        if token_type == 'newline':
+            line += end - start
+            column = 1
         else:
-            raise Exception(f"Invalid token near {source_code[position:position+10]}")
+            if token_type != 'skip':
+                if token_type == 'identifier' and match.group() in keywords:
+                    token_type = 'keyword'
+                yield cast(TokenType, token_type), start, end, line, column
+            column += end - start
+        position = end
+
+    if position < len(source_code):
+        raise Exception(f"Invalid token near {source_code[position:position+10]}")
 
+def tokenize_compact(source_code: str) -> TokenArray:
+    """Tokenizes like `tokenize`, but stores the tokens in a `TokenArray`."""
+    tokens = TokenArray(source_code)
+    append = tokens.append
+    for token_type, start, end, line, column in scan(source_code):
+        append(token_type, start, end - start, line, column)
     return tokens
 
+_no_token = Token(type='end', text='', loc=L)
+
+class TokenBuffer:
+    """Bounded lookahead over a token iterator.
+
+    Keeps only the previous token, the current one and up to `lookahead`
+    tokens after it, so the whole token list never has to be in memory.
+    Past the last token `peek` returns an 'end' token.
+
+    `position` is the index of the current token. To continue in the middle
+    of a token list, pass the token before the first one as `previous`
+    and its index as `position`."""
+
+    def __init__(
+        self,
+        tokens: Iterable[Token],
+        lookahead: int = 1,
+        previous: Token | None = None,
+        position: int = 0
+    ) -> None:
+        self._tokens = iter(tokens)
+        self._lookahead = lookahead
+        self._ahead: deque[Token] = deque()
+        self._previous = previous or _no_token
+        self._end: Token | None = None
+        self._current = self._next_token(self._previous)
+        self.position = position
+
+    def _next_token(self, last: Token) -> Token:
+        token = next(self._tokens, None)
+        if token is None:
+            if self._end is None:
+                self._end = Token(type='end', text='', loc=last.loc)
+            return self._end
+        return token
+
+    def peek(self, offset: int = 0) -> Token:
+        if offset == 0:
+            return self._current
+        if offset == -1:
+            return self._previous
+        if not 0 < offset <= self._lookahead:
+            raise IndexError(f'Can only look back 1 and ahead {self._lookahead} token(s), got offset {offset}')
+        while len(self._ahead) < offset:
+            if self._end is not None:
+                return self._end
+            last = self._ahead[-1] if self._ahead else self._current
+            self._ahead.append(self._next_token(last))
+        return self._ahead[offset - 1]
+
+    def advance(self) -> None:
+        if self._current is self._end:
+            return
+        self._previous = self._current
+        self.position += 1
+        if self._ahead:
+            self._current = self._ahead.popleft()
+        else:
+            self._current = self._next_token(self._current)
+
 if __name__ == "__main__":
-    print(tokenize("jee 3 \n +"))
\ No newline at end of file
+    print(tokenize("jee 3 \n +"))
@@ -0,0 +1,41 @@
+from typing import Any, Generator, TypeVar
+
+T = TypeVar('T')
+
+# A recursive step: a generator that yields the sub-steps it needs
+# and receives their results, finally returning its own result.
+Step = Generator[Any, Any, T]
+
+def run_steps(root: Step[T]) -> T:
+    """Runs a recursive computation written as nested `Step` generators.
+
+    Instead of calling itself, a step does `result = yield sub_step(...)`.
+    The pending steps are kept on an explicit stack, so the nesting depth
+    is limited by memory rather than by Python's recursion limit.
+    Exceptions propagate to the waiting steps like with ordinary calls."""
+    stack: list[Step[Any]] = [root]
+    value: Any = None
+    error: BaseException | None = None
+
+    while True:
+        step = stack[-1]
+        try:
+            if error is not None:
+                sub_step = step.throw(error)
+                error = None
+            else:
+                sub_step = step.send(value)
+        except StopIteration as result:
+            stack.pop()
+            if not stack:
+                return result.value  # type: ignore[no-any-return]
+            value = result.value
+            continue
+        except BaseException as e:
+            stack.pop()
+            if not stack:
+                raise
+            error = e
+            continue
+        stack.append(sub_step)
+        value = None
@@ -1,10 +1,11 @@
 from compiler import ast
 from compiler.symtab import SymTab
+from compiler.trampoline import Step, run_steps
 from compiler.types import Bool, Int, FunType, Type, Unit
 
 def typecheck(node: ast.Module, symtab: SymTab[Type]) -> Type:
     basic_types = ['Int', 'Bool', 'Unit']
-    def typecheck_expr(node: ast.Expression, symtab: SymTab[Type]) -> Type:
+    def typecheck_expr(node: ast.Expression, symtab: SymTab[Type]) -> Step[Type]:
         match node:
             case ast.Literal():
                 if isinstance(node.value, bool):
@@ -17,8 +18,8 @@ def typecheck(node: ast.Module, symtab: SymTab[Type]) -> Type:
                     raise Exception(f"Don't know the type of literal: {node.value} at {node.loc}")
                 
             case ast.BinaryOp():
-                t1 = typecheck_expr(node.left, symtab)
-                t2 = typecheck_expr(node.right, symtab)
+                t1 = yield typecheck_expr(node.left, symtab)
+                t2 = yield typecheck_expr(node.right, symtab)
                 if node.op == '=':
                     if t1 != t2:
                         raise TypeError(f'Operator {node.op} expected same type on each side, got {t1} and {t2}')
@@ -39,13 +40,13 @@ def typecheck(node: ast.Module, symtab: SymTab[Type]) -> Type:
                 return assign_type_to_expr(node, t)
                 
             case ast.IfExpression():
-                t1 = typecheck_expr(node.cond, symtab)
+                t1 = yield typecheck_expr(node.cond, symtab)
                 if t1 is not Bool:
                     raise TypeError(f'If condition was {t1}, expected boolean')
-                t2 = typecheck_expr(node.then_clause, symtab)
+                t2 = yield typecheck_expr(node.then_clause, symtab)
                 if node.else_clause is None:
                     return assign_type_to_expr(node, Unit)
-                t3 = typecheck_expr(node.else_clause, symtab)
+                t3 = yield typecheck_expr(node.else_clause, symtab)
                 if t2 != t3:
                     raise TypeError(f'Then and else had different types: {t2} and {t3}')
                 return assign_type_to_expr(node, t2)
@@ -54,7 +55,7 @@ def typecheck(node: ast.Module, symtab: SymTab[Type]) -> Type:
                 name = node.variable.name
                 if name in symtab.locals:
                     raise TypeError(f'Variable {name} is already declared in this scope')
-                t = typecheck_expr(node.value, symtab)
+                t = yield typecheck_expr(node.value, symtab)
                 if node.var_type:
                     if isinstance(node.var_type, ast.BasicTypeExpr):
                         if node.var_type.name not in basic_types:
@@ -74,13 +75,13 @@ def typecheck(node: ast.Module, symtab: SymTab[Type]) -> Type:
                 if node.expressions is not None:
                     symtab_block = symtab.create_inner_tab()
                     for expression in node.expressions:
-                        t = typecheck_expr(expression, symtab_block)
+                        t = yield typecheck_expr(expression, symtab_block)
                     return assign_type_to_expr(node, t)
                 return assign_type_to_expr(node, Unit)
             
             case ast.UnaryOp():
                 op_type = symtab.get_symbol(f'unary_{node.op}')
-                t = typecheck_expr(node.right, symtab)
+                t = yield typecheck_expr(node.right, symtab)
                 if op_type != t:
                     raise TypeError(f'Operator "unary_{node.op}" right side expected {op_type}, got {t}')
                 return assign_type_to_expr(node, t)
@@ -96,23 +97,23 @@ def typecheck(node: ast.Module, symtab: SymTab[Type]) -> Type:
                     if len(args) != len(fun_type.parameters):        
                         raise TypeError(f"Function expects {len(fun_type.parameters)} parameter(s) but {len(args)} were given")
                     for arg, param_t in zip(args, fun_type.parameters):
-                        arg_t = typecheck_expr(arg, symtab)
+                        arg_t = yield typecheck_expr(arg, symtab)
                         if arg_t != param_t:
                             raise TypeError(f"Function parameter at {arg.loc} has type {arg_t} but expects {param_t}")
                     return assign_type_to_expr(node, fun_type.return_type)
                 raise Exception(f'Unknown function: {fun_name}')
 
             case ast.WhileLoop():
-                t1 = typecheck_expr(node.cond, symtab)
+                t1 = yield typecheck_expr(node.cond, symtab)
                 if t1 is not Bool:
                     raise TypeError(f"While-loop condition was {t1}, expected boolean")
-                t2 = typecheck_expr(node.do, symtab)
+                t2 = yield typecheck_expr(node.do, symtab)
                 return assign_type_to_expr(node, Unit)
 
             case ast.Return():
                 if node.value is None:
                     return assign_type_to_expr(node, Unit)
-                return typecheck_expr(node.value, symtab)
+                return (yield typecheck_expr(node.value, symtab))
             
             case ast.BreakContinue():
                 return assign_type_to_expr(node, Unit)
@@ -144,7 +145,7 @@ def typecheck(node: ast.Module, symtab: SymTab[Type]) -> Type:
         return declared_return_t
     
     def check_function_return_type(node: ast.FunDefinition, symtab: SymTab) -> None:
-        actual_return_t = typecheck_expr(node.body, symtab)
+        actual_return_t = run_steps(typecheck_expr(node.body, symtab))
         declared_return_t = node.return_type.convert_to_basic_type()
         if actual_return_t != declared_return_t:
             raise TypeError(f'Function {node.name.name} expected return type {declared_return_t}, got {actual_return_t}')
@@ -158,7 +159,7 @@ def typecheck(node: ast.Module, symtab: SymTab[Type]) -> Type:
             check_function_return_type(fun, symtab)
 
         if node.expr:
-            expression_result_type = typecheck_expr(node.expr, symtab)
+            expression_result_type = run_steps(typecheck_expr(node.expr, symtab))
             node.expr.type = expression_result_type
             return expression_result_type
         else: # source code only includes function definition(s), no expression
@@ -0,0 +1,32 @@
+import os
+import subprocess
+from pathlib import Path
+from compiler.batch import compile_batch, find_source_files
+
+programs = {
+    'a.txt': 'print_int(1 + 2)',
+    'b.txt': 'fun f(x: Int): Int { return x * 2 }\nprint_int(f(21))',
+    'c.txt': 'print_int(true)',
+    'd.txt': 'var x = 5;\nwhile x > 3 do x = x - 1;\nx',
+}
+
+def test_compile_batch(tmp_path: Path) -> None:
+    for name, program in programs.items():
+        with open(os.path.join(tmp_path, name), 'w') as f:
+            f.write(program)
+    source_files = find_source_files([str(tmp_path)])
+    assert [os.path.basename(f) for f in source_files] == sorted(programs)
+
+    results = list(compile_batch(source_files, jobs=2))
+    assert [r.source_file for r in results] == source_files
+    assert [r.error is None for r in results] == [True, True, False, True]
+    assert results[2].error is not None and 'expects Int' in results[2].error
+
+    outputs = [
+        subprocess.run([r.output_file], capture_output=True, text=True).stdout
+        for r in results if r.error is None
+    ]
+    assert outputs == ['3\n', '42\n', '3\n']
+
+    # the executables have no extension, so they're not taken as sources
+    assert find_source_files([str(tmp_path)]) == source_files
@@ -0,0 +1,48 @@
+import os
+import subprocess
+from pathlib import Path
+from compiler import ir
+from compiler.assembler import assemble
+from compiler.assembly_generator import generate_assembly
+from tests.helpers import ir_of
+
+def code_lines(asm_code: str) -> list[str]:
+    return [line.strip() for line in asm_code.split('\n') if line.strip() and not line.startswith('#')]
+
+def test_loop_condition_jumps_on_flags() -> None:
+    source = 'var i = 0; while i < 10 do i = i + 1; print_int(i);'
+    for level in [0, 1]:
+        code = code_lines(generate_assembly(ir_of(source, level), peephole=level >= 1))
+        assert not any(line.startswith('set') for line in code)
+        assert 'cmpq $0' not in ' '.join(code)
+        assert any(line.startswith(('jl ', 'jge ')) for line in code)
+
+def test_not_swaps_the_branches() -> None:
+    instructions = ir_of('var i = 0; if not (i > 3) then print_int(i);')['main']
+    cond_jump = next(insn for insn in instructions if isinstance(insn, ir.CondJump))
+    assert instructions[instructions.index(cond_jump) - 1].fun.name == '>'  # type: ignore[attr-defined]
+    assert cond_jump.then_label.name.endswith('if_end')
+    assert not any(isinstance(insn, ir.Call) and insn.fun.name == 'unary_not' for insn in instructions)
+
+def test_comparison_used_later_is_kept() -> None:
+    source = 'var i = 0; var c = i < 3; if c then print_int(i); print_bool(c);'
+    code = code_lines(generate_assembly(ir_of(source)))
+    assert 'setl %al' in code
+
+def test_fused_branches_behave_the_same(tmp_path: Path) -> None:
+    cases = []
+    for op in ['<', '<=', '>', '>=', '==', '!=']:
+        for a, b in [(1, 2), (2, 2), (3, 2), (-5, 5)]:
+            cases.append(f'if {a} {op} {b} then print_bool(true) else print_bool(false);')
+            if op not in ['==', '!=']:  # Parentheses can't contain '==' or '!='
+                cases.append(f'if not ({a} {op} {b}) then print_bool(true) else print_bool(false);')
+    source = 'fun f(a: Int, b: Int): Int { var n = 0; while a + n < b do n = n + 1; n }\n' \
+        + 'print_int(f(3, 10));\nprint_int(f(10, 3));\n' + '\n'.join(cases)
+
+    outputs = []
+    for fuse_branches in [False, True]:
+        path = os.path.join(tmp_path, f'program_{fuse_branches}')
+        assemble(generate_assembly(ir_of(source), fuse_branches=fuse_branches), path)
+        outputs.append(subprocess.run([path], capture_output=True, text=True, check=True).stdout)
+    assert outputs[0] == outputs[1]
+    assert outputs[1].split('\n')[:2] == ['7', '0']
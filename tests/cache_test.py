@@ -0,0 +1,123 @@
+import os
+import pickle
+from pathlib import Path
+from compiler.cache import CachedFunction, CompilationCache, generate_cached
+from compiler.optimizer import OptimizationStats
+
+source = '''
+fun square(x: Int): Int {
+    return x * x
+}
+fun is_even(n: Int): Bool {
+    return n % 2 == 0
+}
+fun sum_squares(n: Int): Int {
+    var s = 0;
+    var i = 1;
+    while i <= n do {
+        if is_even(i) == true then s = s + square(i);
+        i = i + 1;
+    }
+    return s
+}
+print_int(sum_squares(10));
+'''
+
+def test_cache_reuses_functions(tmp_path: Path) -> None:
+    cache = CompilationCache(str(tmp_path))
+    uncached_ir, uncached_asm = generate_cached(source)
+
+    first_ir, first_asm = generate_cached(source, cache)
+    assert (cache.stats.hits, cache.stats.misses) == (0, 3)
+    second_ir, second_asm = generate_cached(source, cache)
+    assert (cache.stats.hits, cache.stats.misses) == (3, 3)
+
+    assert first_asm == second_asm == uncached_asm
+    assert {name: [str(i) for i in instrs] for name, instrs in second_ir.items()} \
+        == {name: [str(i) for i in instrs] for name, instrs in uncached_ir.items()}
+
+def test_cache_invalidates_changed_functions(tmp_path: Path) -> None:
+    cache = CompilationCache(str(tmp_path))
+    generate_cached(source, cache)
+
+    # moving a function around keeps its entry
+    moved = source.replace('print_int', '\n\nprint_int')
+    generate_cached(moved, cache)
+    assert (cache.stats.hits, cache.stats.misses) == (3, 3)
+
+    # a changed body misses only for that function
+    changed = source.replace('x * x', 'x * x + 1')
+    _, asm = generate_cached(changed, cache)
+    assert (cache.stats.hits, cache.stats.misses) == (5, 4)
+    assert asm == generate_cached(changed)[1]
+
+    # a changed signature misses for the callers too
+    changed = source.replace('fun is_even(n: Int): Bool {\n    return n % 2 == 0', 'fun is_even(n: Int): Int {\n    return n % 2')
+    changed = changed.replace('is_even(i) == true', 'is_even(i) == 0')
+    generate_cached(changed, cache)
+    assert (cache.stats.hits, cache.stats.misses) == (6, 6)
+
+def test_cache_evicts_least_recently_used(tmp_path: Path) -> None:
+    directory = str(tmp_path)
+    generate_cached(source, CompilationCache(directory))
+    sizes = sorted(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+    assert len(sizes) == 3
+
+    cache = CompilationCache(directory, max_size=sizes[-1])
+    generate_cached(source.replace('x * x', 'x * x + 1'), cache)
+    assert cache.stats.evictions == 3
+    assert len(os.listdir(directory)) == 1
+
+def test_cache_keeps_optimization_levels_apart(tmp_path: Path) -> None:
+    cache = CompilationCache(str(tmp_path))
+    _, asm_o0 = generate_cached(source, cache)
+    _, asm_o2 = generate_cached(source, cache, opt_level=2)
+    assert (cache.stats.hits, cache.stats.misses) == (0, 6)
+    assert asm_o2 == generate_cached(source, opt_level=2)[1]
+    assert asm_o0 != asm_o2
+
+def test_inlining_makes_callers_depend_on_callee_bodies(tmp_path: Path) -> None:
+    cache = CompilationCache(str(tmp_path))
+    generate_cached(source, cache, opt_level=2)
+    assert (cache.stats.hits, cache.stats.misses) == (0, 3)
+
+    # square is inlined into sum_squares, so both miss
+    changed = source.replace('x * x', 'x * x + 1')
+    _, asm = generate_cached(changed, cache, opt_level=2)
+    assert (cache.stats.hits, cache.stats.misses) == (1, 5)
+    assert asm == generate_cached(changed, opt_level=2)[1]
+
+class RunsCode:
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def __reduce__(self) -> tuple[object, tuple[str]]:
+        return (os.mkdir, (self.path,))
+
+def test_bad_entries_are_misses_and_removed(tmp_path: Path) -> None:
+    directory = str(tmp_path)
+    generate_cached(source, CompilationCache(directory))
+    paths = sorted(os.path.join(directory, name) for name in os.listdir(directory))
+    with open(paths[0], 'r+b') as f:
+        f.truncate(os.path.getsize(paths[0]) // 2)
+    with open(paths[1], 'wb') as f:
+        pickle.dump(RunsCode(os.path.join(directory, 'ran')), f)
+    with open(paths[2], 'wb') as f:
+        pickle.dump(['not', 'an', 'entry'], f)
+
+    cache = CompilationCache(directory)
+    _, asm = generate_cached(source, cache)
+    assert (cache.stats.hits, cache.stats.misses) == (0, 3)
+    assert asm == generate_cached(source)[1]
+    assert not os.path.exists(os.path.join(directory, 'ran'))
+    assert sorted(os.listdir(directory)) == sorted(os.path.basename(path) for path in paths)
+
+def test_failed_put_leaves_no_temporary_file(tmp_path: Path) -> None:
+    cache = CompilationCache(str(tmp_path))
+    entry = CachedFunction([], '', OptimizationStats(removed={'unpicklable': lambda: 0}))  # type: ignore
+    try:
+        cache.put('key', entry)
+        assert False
+    except (pickle.PicklingError, AttributeError):
+        pass
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,73 @@
+from compiler import ir
+from compiler.cfg import build_cfg
+from tests.helpers import ir_of
+
+nested_loops = '''
+var i = 0;
+while i < 3 do {
+    var j = 0;
+    while j < i do j = j + 1;
+    if i == 1 then print_int(i) else print_int(j);
+    i = i + 1;
+}
+'''
+
+def test_cfg_blocks_and_edges() -> None:
+    instructions = ir_of(nested_loops)['main']
+    graph = build_cfg('main', instructions)
+    names = [block.name for block in graph.blocks]
+    assert names == [
+        'entry', '1_while_start', '2_while_body', '4_while_start', '5_while_body',
+        '6_while_end', '7_then', '8_else', '9_if_end', '3_while_end'
+    ]
+    assert graph.instructions() == instructions
+
+    block = {name: i for i, name in enumerate(names)}
+    assert graph.blocks[block['1_while_start']].successors == [block['2_while_body'], block['3_while_end']]
+    assert sorted(graph.blocks[block['1_while_start']].predecessors) == [block['entry'], block['9_if_end']]
+    assert sorted(graph.blocks[block['9_if_end']].predecessors) == [block['7_then'], block['8_else']]
+
+def test_cfg_dominators_and_loops() -> None:
+    graph = build_cfg('main', ir_of(nested_loops)['main'])
+    block = {b.name: b.index for b in graph.blocks}
+
+    assert graph.idom[block['9_if_end']] == block['6_while_end']
+    assert graph.idom[block['3_while_end']] == block['1_while_start']
+    assert graph.dominates(block['2_while_body'], block['8_else'])
+    assert not graph.dominates(block['7_then'], block['9_if_end'])
+
+    frontiers = graph.dominance_frontiers()
+    assert frontiers[block['7_then']] == {block['9_if_end']}
+    assert frontiers[block['5_while_body']] == {block['4_while_start']}
+
+    outer, inner = graph.loops
+    assert outer.header == block['1_while_start'] and outer.depth() == 1
+    assert inner.header == block['4_while_start'] and inner.depth() == 2 and inner.parent is outer
+    assert inner.blocks == {block['4_while_start'], block['5_while_body']}
+    assert block['3_while_end'] not in outer.blocks
+    assert graph.loop_depth(block['5_while_body']) == 2
+
+def test_cfg_returns_and_unreachable_code() -> None:
+    source = '''
+fun f(x: Int): Int {
+    while true do {
+        if x > 0 then { return x }
+        break;
+    }
+    0
+}
+f(1)
+'''
+    graph = build_cfg('f', ir_of(source)['f'])
+    returns = [b for b in graph.blocks if isinstance(b.instructions[-1], ir.Return)]
+    assert len(returns) == 2
+    assert all(b.successors == [] for b in returns)
+    # the code after 'break' can't be reached
+    unreachable = [b for b in graph.blocks if not graph.reachable(b.index)]
+    assert unreachable and all(b.name.startswith('block') for b in unreachable)
+
+def test_cfg_dot() -> None:
+    dot = build_cfg('main', ir_of(nested_loops)['main']).to_dot()
+    assert dot.startswith('digraph "main" {')
+    assert 'b1 -> b2 [label="then"];' in dot
+    assert '(loop header, depth 2)' in dot
@@ -1,11 +1,13 @@
 import os
 import subprocess
 import sys
+import tempfile
 from dataclasses import dataclass
 
 from compiler.assembler import assemble
 from compiler.assembly_generator import generate_assembly
 from compiler.ir_generator import generate_ir
+from compiler.optimizer import optimization_levels, optimize_module
 from compiler.parser import parse
 from compiler.symtab import SymTab, top_level_symtab, root_types
 from compiler.tokenizer import tokenize
@@ -60,24 +62,26 @@ def find_test_cases() -> list[_TestCase]:
                     test_num += 1
     return test_cases
 
-for test_case in find_test_cases():
-    def run_test_case(test_case: _TestCase = test_case) -> None:
+for test_case, opt_level in [(t, level) for t in find_test_cases() for level in optimization_levels]:
+    def run_test_case(test_case: _TestCase = test_case, opt_level: int = opt_level) -> None:
         tokens = tokenize(test_case.program)
         ast_node = parse(tokens)
         typecheck(ast_node, SymTab(locals=dict(top_level_symtab)))
-        ir_instructions = generate_ir(root_types, ast_node)
-        asm_code = generate_assembly(ir_instructions)
-        assemble(asm_code, './compiled_test_program')
+        ir_instructions = optimize_module(generate_ir(root_types, ast_node), opt_level)
+        asm_code = generate_assembly(ir_instructions, peephole=opt_level >= 1)
+        with tempfile.TemporaryDirectory(prefix='compiler_test_') as workdir:
+            executable = os.path.join(workdir, 'compiled_test_program')
+            assemble(asm_code, executable, workdir)
 
-        compiled_outputs = subprocess.check_output(
-            ['./compiled_test_program'],
-            input=test_case.inputs,
-            text=True
-        ).strip().split('\n')
+            compiled_outputs = subprocess.check_output(
+                [executable],
+                input=test_case.inputs,
+                text=True
+            ).strip().split('\n')
 
         assert compiled_outputs == test_case.outputs, f"Test case {test_case.name} failed"
 
     sys.modules[__name__].__setattr__(
-        f'test_{test_case.name}',
+        f'test_{test_case.name}' + (f'_O{opt_level}' if opt_level else ''),
         run_test_case
     )
@@ -0,0 +1,87 @@
+import os
+import random
+from pathlib import Path
+from compiler import ir
+from compiler.constant_folding import fold_call, fold_constants
+from compiler.intrinsics import all_intrinsics
+from compiler.optimizer import optimize
+from compiler.ssa import to_ssa
+from tests.helpers import ir_of, run
+
+def intrinsic_calls(instructions: list[ir.Instruction]) -> list[ir.Call]:
+    return [i for i in instructions if isinstance(i, ir.Call) and i.fun.name in all_intrinsics]
+
+def random_expr(rng: random.Random, is_int: bool, depth: int) -> str:
+    if depth == 0:
+        if is_int:
+            return str(rng.choice([0, 1, 2, 3, 7, 100, 2**31, 2**62, 2**63 - 1]))
+        return rng.choice(['true', 'false'])
+    if is_int:
+        op = rng.choice(['+', '-', '*', '/', '%', 'unary_-'])
+        if op == 'unary_-':
+            return f'(-{random_expr(rng, True, depth - 1)})'
+        return f'({random_expr(rng, True, depth - 1)} {op} {random_expr(rng, True, depth - 1)})'
+    # Parentheses can't contain '==' or '!=', so they only appear at the top
+    op = rng.choice(['<', '<=', '>', '>=', 'not'])
+    if op == 'not':
+        return f'(not {random_expr(rng, False, depth - 1)})'
+    return f'({random_expr(rng, True, depth - 1)} {op} {random_expr(rng, True, depth - 1)})'
+
+def random_statement(rng: random.Random) -> str:
+    depth = rng.randint(1, 4)
+    if rng.random() < 0.6:
+        return f'print_int({random_expr(rng, True, depth)});'
+    if rng.random() < 0.3:
+        is_int = rng.random() < 0.5
+        op = rng.choice(['==', '!='])
+        return f'print_bool({random_expr(rng, is_int, depth)} {op} {random_expr(rng, is_int, depth)});'
+    return f'print_bool({random_expr(rng, False, depth)});'
+
+def test_folded_programs_print_the_same(tmp_path: Path) -> None:
+    rng = random.Random(15)
+    for _ in range(8):
+        source = ''.join(random_statement(rng) + '\n' for _ in range(25))
+
+        unoptimized = ir_of(source)
+        optimized = {name: optimize(instructions, 1) for name, instructions in unoptimized.items()}
+        expected = run(unoptimized, os.path.join(tmp_path, 'unoptimized'))
+        actual = run(optimized, os.path.join(tmp_path, 'optimized'))
+        assert (actual.returncode, actual.stdout) == (expected.returncode, expected.stdout), source
+
+        # Only divisions that trap, and what uses their results, are left
+        remaining = {call.fun.name for call in intrinsic_calls(optimized['main'])}
+        assert not remaining or remaining & {'/', '%'}
+        assert len(intrinsic_calls(optimized['main'])) < len(intrinsic_calls(unoptimized['main'])) / 2
+
+def test_division_by_zero_still_traps(tmp_path: Path) -> None:
+    optimized = {name: optimize(instructions, 1) for name, instructions in ir_of('print_int(1 / 0);').items()}
+    assert [call.fun.name for call in intrinsic_calls(optimized['main'])] == ['/']
+    assert run(optimized, os.path.join(tmp_path, 'program')).returncode != 0
+
+def test_identities_are_simplified() -> None:
+    source = '''
+fun f(x: Int, b: Bool): Int {
+    var y = x * 1 + 0 - 0;
+    var z = y / 1;
+    if b == true then { if z <= z then z - z + x * 0 else z % 1 + (0 * z) } else z
+}
+f(1, true)
+'''
+    folded = fold_constants(to_ssa(ir_of(source)['f']))
+    assert intrinsic_calls(folded) == []
+
+def test_fold_call_matches_machine_arithmetic() -> None:
+    assert fold_call('+', [2**63 - 1, 1]) == -2**63
+    assert fold_call('*', [2**62, 4]) == 0
+    assert fold_call('-', [-2**63, 1]) == 2**63 - 1
+    assert fold_call('/', [-7, 2]) == -3
+    assert fold_call('%', [-7, 2]) == -1
+    assert fold_call('%', [7, -2]) == 1
+    assert fold_call('/', [1, 0]) is None
+    assert fold_call('%', [1, 0]) is None
+    assert fold_call('/', [-2**63, -1]) is None
+    assert fold_call('unary_-', [-2**63]) == -2**63
+    assert fold_call('unary_not', [True]) is False
+    assert fold_call('==', [True, True]) is True
+    assert fold_call('<', [1, 2]) is True
+    assert fold_call('>=', [1, 2]) is False
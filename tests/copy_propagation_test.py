@@ -0,0 +1,72 @@
+from compiler import ir
+from compiler.copy_propagation import coalesce_copies, propagate_copies
+from compiler.optimizer import optimize
+from compiler.ssa import to_ssa
+from compiler.tokenizer import Location
+from tests.helpers import ir_of
+
+L = Location(0, 0)
+
+def copies(instructions: list[ir.Instruction]) -> list[ir.Copy]:
+    return [insn for insn in instructions if isinstance(insn, ir.Copy)]
+
+source = '''
+fun f(n: Int): Int {
+    var a = n;
+    var b = a;
+    var s = 0;
+    while b > 0 do {
+        var t = b;
+        s = s + t;
+        b = b - 1;
+    }
+    s
+}
+f(3)
+'''
+
+def test_copies_are_propagated_in_ssa() -> None:
+    ssa = to_ssa(ir_of(source)['f'])
+    assert copies(ssa)
+    result = propagate_copies(ssa)
+    assert copies(result) == []
+    # `b > 0` reads the phi of `b`, whose first source is `n` itself
+    phis = [insn for insn in result if isinstance(insn, ir.Phi)]
+    assert any(phi.sources[0] == ir.IRVar('x1_1') for phi in phis)
+
+def test_copies_from_phis_are_coalesced() -> None:
+    instructions = ir_of(source)['f']
+    assert len(copies(instructions)) == 6
+    assert copies(optimize(instructions, 1)) == []
+
+def test_interfering_copies_are_kept() -> None:
+    a, b, c = ir.IRVar('a'), ir.IRVar('b'), ir.IRVar('c')
+    print_int = ir.IRVar('print_int')
+    instructions: list[ir.Instruction] = [
+        ir.LoadIntConst(L, 1, a),
+        ir.Copy(L, a, b),
+        ir.LoadIntConst(L, 2, a),  # `b` must keep the old value
+        ir.Call(L, print_int, [b], c),
+        ir.Call(L, print_int, [a], c),
+        ir.Copy(L, c, c),
+    ]
+    assert [str(insn) for insn in coalesce_copies(instructions)] == [
+        str(insn) for insn in instructions[:-1]
+    ]
+
+def test_swapping_loop_keeps_its_copies() -> None:
+    source = '''
+var a = 1;
+var b = 2;
+var i = 0;
+while i < 3 do {
+    var t = a;
+    a = b;
+    b = t;
+    i = i + 1;
+}
+print_int(a);
+print_int(b);
+'''
+    result = optimize(ir_of(source)['main'], 1)
+    assert len(copies(result)) == 3
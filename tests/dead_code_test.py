@@ -0,0 +1,54 @@
+from compiler import ir
+from compiler.cache import generate_cached
+from compiler.dead_code import eliminate_dead_code, remove_unreachable_blocks
+from compiler.optimizer import OptimizationStats
+from compiler.ssa import to_ssa
+from tests.helpers import ir_of
+
+def calls(instructions: list[ir.Instruction]) -> list[str]:
+    return [i.fun.name for i in instructions if isinstance(i, ir.Call)]
+
+source = '''
+fun f(x: Int): Int {
+    var i = 0;
+    var unused = x * 2;
+    var counter = 0;
+    var trap = 1 / x;
+    while true do {
+        counter = counter + 1;
+        if i > x then break;
+        i = i + 1;
+        continue;
+        print_int(i);
+    }
+    return i
+}
+f(3);
+'''
+
+def test_unreachable_blocks_are_removed() -> None:
+    instructions = ir_of(source)['f']
+    assert 'print_int' in calls(instructions)
+    assert 'print_int' not in calls(remove_unreachable_blocks(instructions))
+
+def test_dead_code_is_removed() -> None:
+    instructions = to_ssa(ir_of(source)['f'])
+    result = eliminate_dead_code(instructions)
+    # `unused` is never read and `counter` only feeds itself around the loop,
+    # but the division stays in case it traps
+    assert calls(result) == ['/', '>', '+']
+    assert len(result) < len(instructions)
+
+def test_optimization_stats() -> None:
+    stats: dict[str, OptimizationStats] = {}
+    instructions, _ = generate_cached(source, opt_level=1, opt_stats=stats)
+    assert stats.keys() == {'main', 'f'}
+    f_stats = stats['f']
+    assert f_stats.instructions_after == len(instructions['f']) < f_stats.instructions_before
+    assert f_stats.removed['unreachable code'] > 0
+    assert f_stats.removed['dead code'] > 0
+    assert 'removed' in str(f_stats)
+
+    generate_cached(source, opt_stats=stats)
+    assert stats['f'].removed == {}
+    assert str(stats['f']) == f'{stats["f"].instructions_before} -> {stats["f"].instructions_before} instructions'
@@ -0,0 +1,72 @@
+import dataclasses
+import os
+import re
+import resource
+import subprocess
+from pathlib import Path
+from compiler import ir
+from compiler.assembler import assemble
+from compiler.assembly_generator import generate_assembly
+from tests.helpers import ir_of
+
+stack_limit = 1024 * 1024
+
+# A recursive function next to a main with lots of variables, which all used to
+# share one frame layout. The recursion crashes when it runs out of stack.
+source = '''
+fun deeper(n: Int): Int {
+    print_int(n);
+    var a = n * 2;
+    var b = a + n;
+    print_int(b - a);
+    return deeper(n + 1)
+}
+''' + ''.join(f'var v{i} = {i} * {i} + 1;\n' for i in range(100)) + 'deeper(1)\n'
+
+def frame_size(asm_code: str, fun_name: str) -> int:
+    match = re.search(rf'^{fun_name}:\n\npushq %rbp\nmovq %rsp, %rbp\nsubq \$(\d+), %rsp$', asm_code, re.MULTILINE)
+    assert match is not None
+    return int(match.group(1))
+
+def global_layout_frame_size(instructions: dict[str, list[ir.Instruction]]) -> int:
+    """The frame size when every IR variable of the program had its own slot in every function."""
+    variables: set[ir.IRVar] = set()
+    for insns in instructions.values():
+        for insn in insns:
+            for field in dataclasses.fields(insn):
+                value = getattr(insn, field.name)
+                values = value if isinstance(value, list) else [value]
+                variables.update(v for v in values if isinstance(v, ir.IRVar))
+    return 8 + 8 * len(variables)
+
+def max_recursion_depth(asm_code: str, workdir: str) -> int:
+    executable = os.path.join(workdir, 'deeper')
+    assemble(asm_code, executable, workdir)
+
+    def limit_stack() -> None:
+        resource.setrlimit(resource.RLIMIT_STACK, (stack_limit, stack_limit))
+
+    result = subprocess.run([executable], capture_output=True, text=True, preexec_fn=limit_stack)
+    assert result.returncode != 0
+    return int(result.stdout.split()[-2])
+
+def test_frames_are_per_function(tmp_path: Path) -> None:
+    instructions = ir_of(source)
+    before = global_layout_frame_size(instructions)
+
+    for allocate in [False, True]:
+        asm_code = generate_assembly(instructions, allocate)
+        after = frame_size(asm_code, 'deeper')
+        depth = max_recursion_depth(asm_code, str(tmp_path))
+        measured = f'allocate={allocate}: frame of deeper {before} -> {after} bytes, recursion depth {depth}'
+
+        assert after <= 8 * 8, measured
+        assert frame_size(asm_code, 'main') < before, measured
+        # each level also pushes the return address and %rbp
+        assert depth >= 0.9 * stack_limit / (after + 16), measured
+        assert depth > 5 * stack_limit / (before + 16), measured
+
+def test_slots_are_reused() -> None:
+    # a long chain of temporaries only needs a couple of slots without register allocation
+    asm_code = generate_assembly(ir_of(' + '.join(['1'] * 200)), allocate=False)
+    assert frame_size(asm_code, 'main') <= 8 * 8
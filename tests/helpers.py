@@ -0,0 +1,32 @@
+import subprocess
+from pathlib import Path
+from compiler import ir
+from compiler.assembler import assemble
+from compiler.assembly_generator import generate_assembly
+from compiler.ir_generator import generate_ir
+from compiler.optimizer import optimize_module
+from compiler.parser import parse
+from compiler.symtab import SymTab, root_types, top_level_symtab
+from compiler.tokenizer import tokenize
+from compiler.type_checker import typecheck
+
+def ir_of(source: str, level: int = 0) -> dict[str, list[ir.Instruction]]:
+    """Parses and type checks a program and returns the IR of its functions,
+    optimized with `optimize_module` at `level`."""
+    module = parse(tokenize(source))
+    typecheck(module, SymTab(locals=dict(top_level_symtab)))
+    instructions = generate_ir(root_types, module)
+    return optimize_module(instructions, level) if level else instructions
+
+def compile_program(instructions: dict[str, list[ir.Instruction]], path: str | Path, peephole: bool = False) -> str:
+    """Assembles the IR of a program into an executable at `path` and returns its path."""
+    assemble(generate_assembly(instructions, peephole=peephole), str(path))
+    return str(path)
+
+def run(
+    instructions: dict[str, list[ir.Instruction]],
+    path: str | Path,
+    peephole: bool = False
+) -> subprocess.CompletedProcess[str]:
+    """Compiles the IR of a program into an executable at `path` and runs it."""
+    return subprocess.run([compile_program(instructions, path, peephole)], capture_output=True, text=True)
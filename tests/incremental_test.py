@@ -0,0 +1,86 @@
+import random
+from compiler import ast
+from compiler.incremental import TextEdit, parse_incremental, reparse
+from compiler.parser import parse
+from compiler.tokenizer import tokenize
+
+source = '''fun square(x: Int): Int {
+    return x * x
+}
+
+fun count(n: Int): Unit {
+    var i = 0;   # counter
+    while i < n do {
+        print_int(square(i));
+        i = i + 1;
+    }
+}
+var a = 3;
+count(a);
+if a > 2 then { print_bool(true) } else { print_int(a) }
+{ a = a + 1 }
+print_int(a)
+'''
+
+snippets = [' ', '\n', '\n\n', 'x', '1', ';', '+ 2', '# c\n', '// c', '}', '{', '(', 'fun', 'var b = 1;', '  * a']
+
+def parse_or_error(source_code: str) -> ast.Module | str:
+    try:
+        return parse(tokenize(source_code))
+    except Exception:
+        return 'error'
+
+def apply(source_code: str, edit: TextEdit) -> str:
+    return source_code[:edit.start] + edit.text + source_code[edit.end:]
+
+def random_edit(rng: random.Random, source_code: str) -> TextEdit:
+    start = rng.randrange(len(source_code) + 1)
+    end = min(len(source_code), start + rng.choice([0, 0, 1, 3, 10]))
+    return TextEdit(start, end, rng.choice(snippets) if rng.random() < 0.8 else '')
+
+def test_reparse_equals_full_parse() -> None:
+    rng = random.Random(7)
+    for _ in range(300):
+        edit = random_edit(rng, source)
+        expected = parse_or_error(apply(source, edit))
+        try:
+            result = reparse(parse_incremental(source), edit)
+        except Exception:
+            assert expected == 'error', edit
+            continue
+        assert result.module == expected, edit
+        assert list(result.tokens) == tokenize(result.source_code)
+        assert [(t.loc.line, t.loc.column) for t in result.tokens] \
+            == [(t.loc.line, t.loc.column) for t in tokenize(result.source_code)]
+
+def test_reparse_chained_edits() -> None:
+    rng = random.Random(11)
+    parsed = parse_incremental(source)
+    for _ in range(200):
+        edit = random_edit(rng, parsed.source_code)
+        expected = parse_or_error(apply(parsed.source_code, edit))
+        if expected == 'error':
+            continue
+        parsed = reparse(parsed, edit)
+        assert parsed.module == expected, edit
+        assert parsed.module == parse(tokenize(parsed.source_code))
+
+def test_reparse_reuses_untouched_items() -> None:
+    parsed = parse_incremental(source)
+    square, count = parsed.module.funcs
+    top_level = parsed.module.expr
+    assert isinstance(top_level, ast.Block) and top_level.expressions is not None
+    declaration = top_level.expressions[0]
+
+    position = source.index('i + 1')
+    result = reparse(parsed, TextEdit(position, position + 1, 'i * 2\n'))
+
+    assert result.module == parse(tokenize(result.source_code))
+    assert result.module.funcs[0] is square
+    assert result.module.funcs[1] is not count
+    assert isinstance(result.module.expr, ast.Block) and result.module.expr.expressions is not None
+    assert result.module.expr.expressions[0] is declaration
+    fresh = parse(tokenize(result.source_code)).expr
+    assert isinstance(fresh, ast.Block) and fresh.expressions is not None
+    assert declaration.loc == fresh.expressions[0].loc
+    assert declaration.loc.line == 13
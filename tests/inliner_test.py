@@ -0,0 +1,92 @@
+import os
+from pathlib import Path
+from compiler import ir
+from compiler.inliner import bottom_up_order, inline_calls
+from compiler.optimizer import OptimizationStats, optimize_module
+from tests.helpers import ir_of, run
+
+def called(instructions: list[ir.Instruction]) -> set[str]:
+    return {insn.fun.name for insn in instructions if isinstance(insn, ir.Call)}
+
+def output_of(source: str, level: int, path: str) -> str:
+    process = run(ir_of(source, level), path, peephole=level >= 1)
+    assert process.returncode == 0, process.stderr
+    return process.stdout
+
+source = '''
+fun square(x: Int): Int {
+    return x * x
+}
+fun sum_of_squares(a: Int, b: Int): Int {
+    var r = square(a + b) - 2 * a * b;
+    if a > b then r = square(a) + square(b);
+    r
+}
+fun fib(n: Int): Int {
+    if n < 2 then n else fib(n - 1) + fib(n - 2)
+}
+fun is_even(n: Int): Bool {
+    if n == 0 then true else is_odd(n - 1)
+}
+fun is_odd(n: Int): Bool {
+    if n == 0 then false else is_even(n - 1)
+}
+print_int(sum_of_squares(3, 4));
+print_int(sum_of_squares(4, 3));
+print_int(fib(15));
+print_bool(is_even(7));
+'''
+
+def test_small_functions_are_inlined(tmp_path: Path) -> None:
+    stats: dict[str, OptimizationStats] = {}
+    optimized = optimize_module(ir_of(source), 2, stats)
+    assert 'square' not in called(optimized['sum_of_squares'])
+    assert 'sum_of_squares' not in called(optimized['main'])
+    assert stats['sum_of_squares'].inlined_calls == 3
+    assert output_of(source, 2, os.path.join(tmp_path, 'inlined')) == output_of(source, 0, os.path.join(tmp_path, 'program'))
+
+def test_recursion_is_not_unrolled() -> None:
+    optimized = optimize_module(ir_of(source), 2)
+    assert called(optimized['fib']) >= {'fib'}
+    assert called(optimized['is_even']) >= {'is_odd'}
+    assert called(optimized['is_odd']) >= {'is_even'}
+    # Recursive functions are still inlined into their other callers
+    assert 'fib' in called(optimized['main']) and 'is_odd' in called(optimized['main'])
+
+def test_only_levels_from_two_inline() -> None:
+    optimized = optimize_module(ir_of(source), 1)
+    assert 'square' in called(optimized['sum_of_squares'])
+
+def test_budget_limits_callee_size() -> None:
+    instructions = ir_of(source)
+    inlined, count = inline_calls(instructions['sum_of_squares'], {'square': instructions['square']}, budget=2)
+    assert count == 0 and inlined == instructions['sum_of_squares']
+    inlined, count = inline_calls(instructions['sum_of_squares'], {'square': instructions['square']})
+    assert count == 3
+    labels = [insn.name for insn in inlined if isinstance(insn, ir.Label)]
+    assert len(labels) == len(set(labels))
+
+def test_bottom_up_order() -> None:
+    graph = {
+        'main': {'a', 'd'},
+        'a': {'b'},
+        'b': {'a', 'c'},
+        'c': {'c'},
+        'd': set(),
+    }
+    assert bottom_up_order(graph) == [['c'], ['a', 'b'], ['d'], ['main']]
+
+many_calls_source = '''
+fun f1(x: Int): Int { x + 1 }
+fun f(x: Int): Int { x + 2 }
+var s = f1(1);
+var i = 0;
+''' + 's = s + f(i);\ni = i + 1;\n' * 11 + 'print_int(s)\n'
+
+def test_inlined_names_stay_apart(tmp_path: Path) -> None:
+    instructions = ir_of(many_calls_source)
+    inlined, count = inline_calls(instructions['main'], {'f1': instructions['f1'], 'f': instructions['f']})
+    assert count == 12
+    labels = [insn.name for insn in inlined if isinstance(insn, ir.Label)]
+    assert len(labels) == len(set(labels))
+    assert output_of(many_calls_source, 2, os.path.join(tmp_path, 'inlined')) == '79\n'
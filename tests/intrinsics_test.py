@@ -0,0 +1,32 @@
+from compiler.intrinsics import Immediate, IntrinsicArgs, Location, Operand, Register, StackSlot, all_intrinsics
+
+def emitted(name: str, args: list[Operand], result: Location) -> list[str]:
+    lines: list[str] = []
+    all_intrinsics[name](IntrinsicArgs(args, result, lines.append))
+    return lines
+
+def test_result_goes_straight_to_its_register() -> None:
+    assert emitted('+', [Register('%rbx'), Immediate(5)], Register('%rbx')) == ['addq $5, %rbx']
+    assert emitted('unary_-', [StackSlot(-8)], Register('%r12')) == ['movq -8(%rbp), %r12', 'negq %r12']
+    assert emitted('<', [Register('%rbx'), Immediate(10)], Register('%r12')) \
+        == ['movq %rbx, %rdx', 'cmpq $10, %rdx', 'setl %al', 'movzbq %al, %r12']
+
+def test_result_in_a_later_operand_is_computed_elsewhere() -> None:
+    assert emitted('-', [StackSlot(-8), Register('%rbx')], Register('%rbx')) \
+        == ['movq -8(%rbp), %rax', 'subq %rbx, %rax', 'movq %rax, %rbx']
+
+def test_result_in_stack_slot() -> None:
+    assert emitted('*', [StackSlot(-8), StackSlot(-16)], StackSlot(-8)) \
+        == ['movq -8(%rbp), %rax', 'imulq -16(%rbp), %rax', 'movq %rax, -8(%rbp)']
+
+def test_large_immediates_go_through_a_register() -> None:
+    assert emitted('+', [Register('%r12'), Immediate(2**40)], Register('%rbx')) \
+        == ['movq %r12, %rbx', 'movabsq $1099511627776, %rdx', 'addq %rdx, %rbx']
+    assert emitted('-', [Immediate(-2**63), Register('%rbx')], Register('%r12')) \
+        == ['movabsq $-9223372036854775808, %r12', 'subq %rbx, %r12']
+
+def test_division_by_immediate_that_must_trap() -> None:
+    assert emitted('/', [Immediate(7), Immediate(0)], Register('%rbx')) \
+        == ['pushq $0', 'movq $7, %rax', 'cqto', 'idivq (%rsp)', 'addq $8, %rsp', 'movq %rax, %rbx']
+    assert emitted('%', [Register('%rbx'), Immediate(-1)], Register('%rbx')) \
+        == ['pushq $-1', 'movq %rbx, %rax', 'cqto', 'idivq (%rsp)', 'addq $8, %rsp', 'movq %rdx, %rbx']
@@ -0,0 +1,93 @@
+import os
+import textwrap
+from pathlib import Path
+from compiler import ir
+from compiler.optimizer import optimize
+from tests.helpers import ir_of, run
+
+def loop_body(instructions: list[ir.Instruction], header: str) -> list[ir.Instruction]:
+    """Returns the instructions from the loop header up to the jump back to it."""
+    start = next(i for i, insn in enumerate(instructions) if isinstance(insn, ir.Label) and insn.name == header)
+    end = next(
+        i for i, insn in enumerate(instructions)
+        if isinstance(insn, ir.Jump) and insn.label.name == header and i > start
+    )
+    return instructions[start:end + 1]
+
+def calls(instructions: list[ir.Instruction]) -> list[str]:
+    return [i.fun.name for i in instructions if isinstance(i, ir.Call)]
+
+source = '''
+fun f(n: Int, k: Int): Int {
+    var s = 0;
+    var i = 0;
+    while i < n do {
+        s = s + i * k + (k + 3) * 5 + 1000 / k;
+        i = i + 1;
+    }
+    s
+}
+print_int(f(10, 7));
+'''
+
+def test_invariants_move_out_of_the_loop() -> None:
+    optimized = optimize(ir_of(source)['f'], 2)
+    body = loop_body(optimized, '1_while_start')
+    assert not any(isinstance(insn, (ir.LoadIntConst, ir.LoadBoolConst)) for insn in body)
+    # (k + 3) * 5 runs once, before the loop
+    assert sorted(calls(body)) == sorted(['<', '+', '+', '+', '+', '/', '+'])
+    assert '1_while_start_preheader' in [insn.name for insn in optimized if isinstance(insn, ir.Label)]
+
+def test_division_is_not_moved() -> None:
+    # The loop never runs, so hoisting 1 / k would trap on f(0, 0)
+    optimized = optimize(ir_of(source)['f'], 2)
+    assert '/' in calls(loop_body(optimized, '1_while_start'))
+
+def test_induction_variable_multiplication_becomes_addition() -> None:
+    optimized = optimize(ir_of(source)['f'], 2)
+    assert '*' not in calls(loop_body(optimized, '1_while_start'))
+    assert '*' in calls(optimize(ir_of(source)['f'], 1))
+
+def test_inlined_loops_get_their_own_preheaders() -> None:
+    # f's loop already has a preheader when it is inlined into main
+    main = ir_of(source, 2)['main']
+    labels = [insn.name for insn in main if isinstance(insn, ir.Label)]
+    assert '1_f_1_while_start_preheader' in labels
+    assert len(labels) == len(set(labels))
+
+def test_optimized_loops_behave_the_same(tmp_path: Path) -> None:
+    programs = [
+        source,
+        source.replace('f(10, 7)', 'f(0, 0)'),
+        '''
+        var total = 0;
+        var i = 10;
+        while i > -5 do {
+            var j = 0;
+            while j < i do {
+                total = total + j * i - i * 3 + j * j;
+                j = j + 2;
+            }
+            i = i - 1;
+        }
+        print_int(total);
+        ''',
+        '''
+        var i = 0;
+        var n = 0;
+        while true do {
+            i = i + 1;
+            if i % 3 == 0 then continue;
+            if i > 20 then break;
+            n = n + 7 * i;
+        }
+        print_int(n);
+        print_int(i * 1000);
+        ''',
+    ]
+    for number, program in enumerate(programs):
+        outputs = []
+        for level in [0, 2]:
+            process = run(ir_of(textwrap.dedent(program), level), os.path.join(tmp_path, f'program_{number}_O{level}'))
+            outputs.append((process.returncode, process.stdout))
+        assert outputs[0] == outputs[1], program
@@ -0,0 +1,69 @@
+import os
+import select
+import signal
+import subprocess
+from pathlib import Path
+from tests.helpers import compile_program, ir_of
+
+def test_output_larger_than_the_buffer(tmp_path: Path) -> None:
+    path = compile_program(ir_of('''
+var i = 0;
+while i < 50000 do {
+    print_int(i - 25000);
+    print_bool(i % 2 == 0);
+    i = i + 1;
+}
+'''), os.path.join(tmp_path, 'program'))
+    output = subprocess.run([path], capture_output=True, text=True, check=True).stdout
+    expected = ''.join(f'{i - 25000}\n{"true" if i % 2 == 0 else "false"}\n' for i in range(50000))
+    assert output == expected
+
+def test_output_is_flushed_before_reading(tmp_path: Path) -> None:
+    path = compile_program(ir_of('''
+print_int(1);
+var x = read_int();
+print_int(x + 1);
+x = read_int();
+print_int(x + 1)
+'''), os.path.join(tmp_path, 'program'))
+    process = subprocess.Popen([path], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    assert process.stdin is not None and process.stdout is not None
+    stdout = process.stdout
+
+    def read_line() -> bytes:
+        ready, _, _ = select.select([stdout], [], [], 10)
+        assert ready, 'output before read_int was not flushed'
+        return stdout.readline()
+
+    try:
+        for expected, given in [(b'1', b'10'), (b'11', b'20')]:
+            assert read_line() == expected + b'\n'
+            process.stdin.write(given + b'\n')
+            process.stdin.flush()
+        assert read_line() == b'21\n'
+    finally:
+        process.kill()
+        process.wait()
+
+def test_output_is_flushed_when_dividing_by_zero(tmp_path: Path) -> None:
+    path = compile_program(ir_of('''
+var zero = 0;
+print_int(1);
+print_bool(true);
+print_int(1 / zero)
+'''), os.path.join(tmp_path, 'program'))
+    result = subprocess.run([path], capture_output=True, text=True)
+    assert result.stdout == '1\ntrue\n'
+    assert result.returncode == -signal.SIGFPE
+
+def test_output_is_flushed_on_stack_overflow(tmp_path: Path) -> None:
+    path = compile_program(ir_of('''
+fun deep(n: Int): Int {
+    return deep(n + 1) + 1
+}
+print_int(42);
+deep(0)
+'''), os.path.join(tmp_path, 'program'))
+    result = subprocess.run([path], capture_output=True, text=True)
+    assert result.stdout == '42\n'
+    assert result.returncode == -signal.SIGSEGV
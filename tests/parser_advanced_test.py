@@ -1,4 +1,5 @@
-from compiler.tokenizer import tokenize, L, Location
+import io
+from compiler.tokenizer import tokenize, tokenize_compact, tokenize_stream, L, Location
 from compiler.parser import parse
 from compiler import ast
 
@@ -493,6 +494,29 @@ def test_parser_location() -> None:
         loc=Location(line=2, column=9)
     )
 
+def test_parser_operator_locations() -> None:
+    assert parser_helper('a = b = 1 + 2 * c') == ast.BinaryOp(
+        left=ast.Identifier(Location(line=1, column=1), 'a'),
+        op='=',
+        right=ast.BinaryOp(
+            left=ast.Identifier(Location(line=1, column=5), 'b'),
+            op='=',
+            right=ast.BinaryOp(
+                left=ast.Literal(Location(line=1, column=9), 1),
+                op='+',
+                right=ast.BinaryOp(
+                    left=ast.Literal(Location(line=1, column=13), 2),
+                    op='*',
+                    right=ast.Identifier(Location(line=1, column=17), 'c'),
+                    loc=Location(line=1, column=13)
+                ),
+                loc=Location(line=1, column=11)
+            ),
+            loc=Location(line=1, column=5)
+        ),
+        loc=Location(line=1, column=1)
+    )
+
 def test_parser_loops() -> None:
     assert parser_helper("while true do 2") == ast.WhileLoop(
         cond=ast.Literal(L, True),
@@ -550,3 +574,14 @@ def test_parser_functions() -> None:
     except Exception as e:
             assert 'Return' in str(e)
 
+
+def test_parser_token_stream() -> None:
+    source = '''
+fun square(x: Int): Int {
+    return x * x
+}
+var y = 3;
+if square(y) > 5 then { print_int(y) } else { print_bool(false) }
+'''
+    assert parse(tokenize_stream(io.StringIO(source), chunk_size=4)) == parse(tokenize(source))
+    assert parse(tokenize_compact(source)) == parse(tokenize(source))
@@ -123,6 +123,18 @@ def test_parser_error() -> None:
         assert False
     except Exception as e:
         assert 'expected ";"' in str(e)
+
+    try:
+        parser_helper('var while = 1')
+        assert False
+    except Exception as e:
+        assert 'Expected identifier, found "while"' in str(e)
+
+    try:
+        parser_helper('1 + then')
+        assert False
+    except Exception as e:
+        assert 'Unknown syntax' in str(e)
     
 
 def test_parser_comparison() -> None:
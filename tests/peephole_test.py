@@ -0,0 +1,86 @@
+from compiler.peephole import AsmInstruction, AsmLabel, AsmText, format_assembly, optimize_assembly, parse_assembly
+
+def optimized(code: str) -> tuple[list[str], dict[str, int]]:
+    stats: dict[str, int] = {}
+    lines = optimize_assembly(parse_assembly(code.strip().split('\n')), stats)
+    return [line for line in format_assembly(lines) if line.strip() and not line.startswith('#')], stats
+
+def test_parse_and_format() -> None:
+    lines = ['f:', '# Copy(x, y)', 'movq -8(%rbp), %rax', '', 'ret']
+    parsed = parse_assembly(lines)
+    assert parsed == [
+        AsmLabel('f'),
+        AsmText('# Copy(x, y)'),
+        AsmInstruction('movq', ['-8(%rbp)', '%rax']),
+        AsmText(''),
+        AsmInstruction('ret', []),
+    ]
+    assert format_assembly(parsed) == lines
+
+def test_redundant_moves() -> None:
+    code, stats = optimized('''
+f:
+movq -8(%rbp), %rax
+movq %rax, -16(%rbp)
+# Copy(x2, x3)
+movq -16(%rbp), %rax
+movq %rax, -8(%rbp)
+addq $1, %rax
+movq -16(%rbp), %rax
+movq %rax, %rax
+ret
+''')
+    assert code == [
+        'f:',
+        'movq -8(%rbp), %rax',
+        'movq %rax, -16(%rbp)',
+        'addq $1, %rax',
+        'movq -16(%rbp), %rax',
+        'ret',
+    ]
+    assert stats['redundant moves'] == 3
+
+def test_moves_are_forgotten_at_labels_and_calls() -> None:
+    code = [
+        'f:',
+        'movq %rax, -8(%rbp)',
+        '.Lf_loop:',
+        'movq -8(%rbp), %rax',
+        'movq %rax, -8(%rbp)',
+        'call g',
+        'movq -8(%rbp), %rax',
+        'setl %al',
+        'movq -8(%rbp), %rax',
+        'jmp .Lf_loop',
+    ]
+    result, stats = optimized('\n'.join(code))
+    assert result == code[:4] + code[5:]
+    assert stats['redundant moves'] == 1
+
+def test_jumps() -> None:
+    code, stats = optimized('''
+f:
+cmpq $0, %rax
+jne .Lf_then
+jmp .Lf_else
+.Lf_then:
+jmp .Lf_end
+movq $1, %rax
+.Lf_else:
+movq $2, %rax
+jmp .Lf_end
+.Lf_end:
+ret
+''')
+    assert code == [
+        'f:',
+        'cmpq $0, %rax',
+        'jne .Lf_end',
+        'movq $2, %rax',
+        '.Lf_end:',
+        'ret',
+    ]
+    assert stats['unreachable instructions'] == 2
+    assert stats['jump chains shortened'] >= 1
+    assert stats['jumps to next line'] >= 1
+    assert stats['unused labels'] == 2
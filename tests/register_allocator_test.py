@@ -0,0 +1,55 @@
+from compiler import ir
+from compiler.register_allocator import (
+    allocatable_registers, allocate_registers, live_intervals, live_variables, uses_and_defs
+)
+from tests.helpers import ir_of
+
+def assert_no_conflicts(instructions: list[ir.Instruction]) -> dict[ir.IRVar, str]:
+    live_out = live_variables(instructions)
+    allocation = allocate_registers(live_intervals(instructions, live_out))
+    for i, insn in enumerate(instructions):
+        _, defs = uses_and_defs(insn)
+        live = live_out[i] | set(defs)
+        registers = [allocation[v] for v in live if v in allocation]
+        assert len(registers) == len(set(registers)), f'{insn}: {registers}'
+    return allocation
+
+def test_liveness_across_loop() -> None:
+    instructions = ir_of('var i = 0;\nvar s = 0;\nwhile i < 10 do { s = s + i; i = i + 1 }\ns')['main']
+    live_out = live_variables(instructions)
+    back_edge = max(
+        i for i, insn in enumerate(instructions)
+        if isinstance(insn, ir.Jump) and insn.label.name.endswith('while_start')
+    )
+    # both the counter and the sum are needed in the next iteration
+    copies = [insn for insn in instructions if isinstance(insn, ir.Copy)]
+    assert {copies[0].dest, copies[1].dest} <= live_out[back_edge]
+
+def test_allocation_has_no_conflicts() -> None:
+    source = '''
+fun f(a: Int, b: Int): Int {
+    var c = a * b;
+    var d = c - a;
+    print_int(d);
+    return c + d
+}
+var x = 1;
+var y = 2;
+while x < 100 do {
+    x = x + f(x, y);
+    if x % 2 == 0 then { y = y + 1; } else { print_int(y); }
+}
+x + y
+'''
+    for instructions in ir_of(source).values():
+        registers = assert_no_conflicts(instructions)
+        assert registers
+        assert set(registers.values()) <= set(allocatable_registers)
+
+def test_allocation_spills_when_out_of_registers() -> None:
+    names = [f'v{i}' for i in range(12)]
+    source = ''.join(f'var {n} = {i};\n' for i, n in enumerate(names)) + ' + '.join(names)
+    instructions = ir_of(source)['main']
+    registers = assert_no_conflicts(instructions)
+    declared = [insn.dest for insn in instructions if isinstance(insn, ir.Copy)]
+    assert any(v not in registers for v in declared)
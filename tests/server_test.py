@@ -0,0 +1,75 @@
+import io
+import json
+import os
+import subprocess
+import threading
+from pathlib import Path
+from compiler.cache import CompilationCache
+from compiler.client import CompileClient
+from compiler.commands import run_command
+from compiler.server import make_server, serve_lines
+
+source = 'fun f(x: Int): Int { return x + 1 }\nprint_int(f(41))'
+
+def test_serve_lines() -> None:
+    requests = [
+        {'command': 'asm', 'source': source, 'id': 1},
+        {'command': 'typecheck', 'source': '1 + true'},
+        {'command': 'optimize', 'source': source},
+    ]
+    output = io.StringIO()
+    serve_lines(io.StringIO('\n'.join(json.dumps(r) for r in requests) + '\n\nnot json\n'), output)
+    responses = [json.loads(line) for line in output.getvalue().splitlines()]
+
+    assert responses[0] == {'ok': True, 'output': run_command('asm', source), 'id': 1}
+    assert responses[1]['ok'] is False and 'Operator +' in responses[1]['error']
+    assert responses[2] == {'ok': False, 'error': 'Unknown command: optimize'}
+    assert responses[3]['ok'] is False and 'Invalid JSON' in responses[3]['error']
+    assert len(responses) == 4
+
+def test_serve_socket(tmp_path: Path) -> None:
+    socket_path = os.path.join(tmp_path, 'compiler.sock')
+    output_file = os.path.join(tmp_path, 'program')
+    with make_server(socket_path) as server:
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            with CompileClient(socket_path) as client:
+                assert client.request('ir', source) == run_command('ir', source)
+                assert client.request('compile', source, output_file) is None
+                try:
+                    client.request('parse', '')
+                    assert False
+                except Exception as e:
+                    assert 'Empty input!' in str(e)
+        finally:
+            server.shutdown()
+            thread.join()
+
+    assert subprocess.run([output_file], capture_output=True, text=True).stdout == '42\n'
+
+def test_concurrent_clients_share_the_cache(tmp_path: Path) -> None:
+    socket_path = os.path.join(tmp_path, 'compiler.sock')
+    cache = CompilationCache(os.path.join(tmp_path, 'cache'))
+    outputs: list[str | None] = []
+
+    def compile_many() -> None:
+        with CompileClient(socket_path) as client:
+            for _ in range(5):
+                outputs.append(client.request('asm', source))
+
+    with make_server(socket_path, cache) as server:
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            clients = [threading.Thread(target=compile_many) for _ in range(8)]
+            for client in clients:
+                client.start()
+            for client in clients:
+                client.join()
+        finally:
+            server.shutdown()
+            thread.join()
+
+    assert len(outputs) == 40 and len(set(outputs)) == 1
+    assert (cache.stats.hits, cache.stats.misses) == (39, 1)
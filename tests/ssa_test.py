@@ -0,0 +1,90 @@
+from compiler import ir
+from compiler.register_allocator import uses_and_defs
+from compiler.ssa import from_ssa, gvn, sccp, to_ssa
+from compiler.tokenizer import Location
+from tests.helpers import ir_of
+
+L = Location(0, 0)
+
+def calls(instructions: list[ir.Instruction], fun: str) -> list[ir.Call]:
+    return [i for i in instructions if isinstance(i, ir.Call) and i.fun.name == fun]
+
+loop = '''
+var a = 1;
+var b = 2;
+var i = 0;
+while i < 5 do {
+    var t = a;
+    a = b;
+    b = t;
+    if i == 2 then a = a + 1 else b = b + 1;
+    i = i + 1;
+}
+print_int(a * b);
+'''
+
+def test_ssa_writes_each_variable_once() -> None:
+    ssa = to_ssa(ir_of(loop)['main'])
+    defs = [v for insn in ssa for v in uses_and_defs(insn)[1]]
+    assert len(defs) == len(set(defs))
+
+    phis = [insn for insn in ssa if isinstance(insn, ir.Phi)]
+    assert phis
+    for phi in phis:
+        assert len(phi.sources) == len(phi.labels) == 2
+    assert not any(isinstance(insn, ir.Phi) for insn in from_ssa(ssa))
+
+def test_out_of_ssa_orders_swapping_copies() -> None:
+    a, b, t = ir.IRVar('a'), ir.IRVar('b'), ir.IRVar('t')
+    instructions: list[ir.Instruction] = [
+        ir.Label(L, 'entry'),
+        ir.LoadIntConst(L, 1, a),
+        ir.LoadIntConst(L, 2, b),
+        ir.Label(L, 'loop'),
+        ir.Phi(L, [a, ir.IRVar('b2')], ['entry', 'loop'], ir.IRVar('a2')),
+        ir.Phi(L, [b, ir.IRVar('a2')], ['entry', 'loop'], ir.IRVar('b2')),
+        ir.Call(L, ir.IRVar('<'), [ir.IRVar('a2'), b], t),
+        ir.CondJump(L, t, ir.Label(L, 'loop'), ir.Label(L, 'end')),
+        ir.Label(L, 'end'),
+    ]
+    result = from_ssa(instructions)
+    # The back edge gets a block of its own, where the swap needs a temporary
+    edge = [str(i) for i in result[result.index(ir.Label(L, 'loop_to_loop')):]]
+    assert edge[:5] == [
+        'Label(loop_to_loop)',
+        'Copy(a2, ssa_tmp1)',
+        'Copy(b2, a2)',
+        'Copy(ssa_tmp1, b2)',
+        'Jump(Label(loop))',
+    ]
+    assert 'CondJump(t, Label(loop_to_loop), Label(end))' in [str(i) for i in result]
+
+def test_sccp_follows_constant_branches() -> None:
+    source = '''
+var x = 2;
+var y = x * 3;
+if y > 5 then { x = y + 1; } else print_int(0);
+print_int(x);
+'''
+    result = from_ssa(sccp(to_ssa(ir_of(source)['main'])))
+    assert not any(isinstance(i, ir.CondJump) for i in result)
+    assert [i.fun.name for i in result if isinstance(i, ir.Call)] == ['print_int']
+    assert any(isinstance(i, ir.LoadIntConst) and i.value == 7 for i in result)
+
+def test_sccp_keeps_values_changed_in_loops() -> None:
+    result = from_ssa(sccp(to_ssa(ir_of(loop)['main'])))
+    assert len(calls(result, '<')) == 1
+    assert len(calls(result, '*')) == 1
+
+def test_gvn_reuses_dominating_values() -> None:
+    source = '''
+    fun f(a: Int, b: Int): Int {
+        var s = a * b;
+        if a > b then s = s + b * a else s = s + a * b;
+        s + (a * b)
+    }
+    f(1, 2)
+    '''
+    instructions = ir_of(source)['f']
+    assert len(calls(instructions, '*')) == 4
+    assert len(calls(from_ssa(gvn(to_ssa(instructions))), '*')) == 1
@@ -0,0 +1,72 @@
+import os
+import random
+import subprocess
+from pathlib import Path
+from compiler.assembler import assemble
+from compiler.assembly_generator import generate_assembly
+from compiler.constant_folding import fold_call
+from compiler.intrinsics import signed_magic
+from tests.helpers import ir_of
+
+INT_MIN = -2**63
+INT_MAX = 2**63 - 1
+
+def asm_of(source: str, opt_level: int = 0) -> str:
+    return generate_assembly(ir_of(source, opt_level))
+
+def literal(value: int) -> str:
+    if value == INT_MIN:
+        return f'(-{INT_MAX} - 1)'
+    return f'(-{-value})' if value < 0 else str(value)
+
+def test_signed_magic() -> None:
+    # From Hacker's Delight, table 10-2
+    assert signed_magic(3) == (0x5555555555555556, 0)
+    assert signed_magic(5) == (0x6666666666666667, 1)
+    assert signed_magic(7) == (0x4924924924924925, 1)
+    assert signed_magic(-5) == (-0x6666666666666667, 1)
+
+def test_constant_operands_avoid_idivq_and_imulq() -> None:
+    code = asm_of('var a = 100; print_int(a / 8); print_int(a % 7); print_int(a * 16); print_int(a * 5);')
+    lines = [line.strip() for line in code.split('\n')]
+    assert 'idivq' not in code
+    assert not any(line.startswith('imulq') and ', ' in line and not line.startswith('imulq $') for line in lines)
+    assert 'sarq $3, %rax' in code and 'shlq $4, ' in code and ',4), ' in code
+
+def test_trapping_divisors_keep_idivq() -> None:
+    for divisor in ['0', '(-1)']:
+        assert 'idivq' in asm_of(f'fun f(a: Int): Int {{ a / {divisor} }} print_int(f(1));', 1)
+        assert 'idivq' in asm_of(f'fun f(a: Int): Int {{ a % {divisor} }} print_int(f(1));', 1)
+
+def test_matches_python_semantics(tmp_path: Path) -> None:
+    rng = random.Random(23)
+    divisors = [
+        1, 2, 3, 5, 7, 10, 16, 25, 100, 641, 1000003, 2**31 - 1, 2**31, 2**32 + 1, 2**62, 3**39, INT_MAX,
+        -2, -3, -7, -16, -100, -2**40, INT_MIN,
+    ]
+    values = [0, 1, -1, 2, -2, 7, -7, INT_MAX, INT_MIN, INT_MIN + 1, 2**32, -2**32 - 5]
+    # The operand is a parameter, so that only the constant is known
+    functions = {
+        (op, d): f'fun f{i}(a: Int): Int {{ a {op} {literal(d)} }}'
+        for i, (op, d) in enumerate((op, d) for op in ['/', '%', '*'] for d in divisors)
+    }
+    names = {key: f'f{i}' for i, key in enumerate(functions)}
+    statements = []
+    expected = []
+    for _ in range(800):
+        a = rng.choice(values) if rng.random() < 0.3 else rng.randint(INT_MIN, INT_MAX) >> rng.randint(0, 63)
+        op, d = rng.choice(list(functions))
+        result = fold_call(op, [a, d])
+        assert isinstance(result, int)
+        if result == INT_MIN:  # print_int can't print it
+            continue
+        statements.append(f'print_int({names[op, d]}({literal(a)}));')
+        expected.append(str(result))
+    source = '\n'.join([*functions.values(), *statements])
+
+    path = os.path.join(tmp_path, 'program')
+    code = asm_of(source, 1)
+    assert 'idivq' not in code
+    assemble(code, path)
+    output = subprocess.run([path], capture_output=True, text=True, check=True).stdout
+    assert output.split('\n')[:-1] == expected
@@ -0,0 +1,49 @@
+from compiler import ast
+from compiler.interpreter import interpret
+from compiler.ir_generator import generate_ir
+from compiler.parser import parse
+from compiler.symtab import SymTab, top_level_symtab, root_types
+from compiler.tokenizer import tokenize
+from compiler.type_checker import typecheck
+from compiler.types import Bool, Int, Type
+
+# Far deeper than Python's default recursion limit of 1000
+depth = 100_000
+
+def compile_to_ir(source: str) -> tuple[ast.Module, Type, int]:
+    module = parse(tokenize(source))
+    t = typecheck(module, SymTab(locals=dict(top_level_symtab)))
+    instructions = generate_ir(root_types, module)
+    return module, t, len(instructions['main'])
+
+def test_deeply_nested_blocks() -> None:
+    module, t, _ = compile_to_ir('{ ' * depth + '1' + ' }' * depth)
+    assert t == Int
+    node = module.expr
+    for _ in range(depth):
+        assert isinstance(node, ast.Block) and node.expressions is not None
+        node = node.expressions[0]
+    assert isinstance(node, ast.Literal) and node.value == 1
+
+def test_deeply_nested_parentheses_and_unary_ops() -> None:
+    _, t, _ = compile_to_ir('(' * depth + '1' + ')' * depth)
+    assert t == Int
+    _, t, instruction_count = compile_to_ir('-' * depth + '1')
+    assert t == Int
+    assert instruction_count == depth + 2 # the literal, negations and the final print
+    _, t, _ = compile_to_ir('not ' * depth + 'true')
+    assert t == Bool
+
+def test_long_else_if_chain() -> None:
+    chain = ''.join(f'if x == {i} then {i} else ' for i in range(depth // 4))
+    _, t, _ = compile_to_ir(f'var x = read_int(); {chain} -1')
+    assert t == Int
+
+def test_long_assignment_chain() -> None:
+    _, t, instruction_count = compile_to_ir('var x = 0; ' + 'x = ' * depth + '1')
+    assert t == Int
+    assert instruction_count > depth
+
+def test_deeply_nested_interpret() -> None:
+    assert interpret(parse(tokenize('1 + ' * depth + '1'))) == depth + 1
+    assert interpret(parse(tokenize('if 1 < 2 then ' * depth + '3'))) == 3
@@ -0,0 +1,46 @@
+import os
+from pathlib import Path
+from compiler import ir
+from compiler.tail_calls import eliminate_tail_calls
+from tests.helpers import ir_of, run
+
+def called(instructions: list[ir.Instruction]) -> list[str]:
+    return [insn.fun.name for insn in instructions if isinstance(insn, ir.Call)]
+
+source = '''
+fun count(n: Int, acc: Int): Int {
+    if n == 0 then acc else count(n - 1, acc + n)
+}
+fun swap(a: Int, b: Int, n: Int): Int {
+    if n == 0 then a * 10 + b else swap(b, a, n - 1)
+}
+fun countdown(n: Int): Unit {
+    if n > 0 then {
+        countdown(n - 1);
+    }
+}
+fun fib(n: Int): Int {
+    if n < 2 then n else fib(n - 1) + fib(n - 2)
+}
+countdown(10000000);
+print_int(swap(1, 2, 3));
+print_int(fib(10));
+count(10000000, 0)
+'''
+
+def test_tail_calls_become_jumps() -> None:
+    instructions = ir_of(source)
+    for name in ['count', 'swap', 'countdown']:
+        eliminated = eliminate_tail_calls(name, instructions[name])
+        assert name not in called(eliminated)
+        assert any(isinstance(insn, ir.Jump) and insn.label.name == 'tail_call_start' for insn in eliminated)
+
+def test_other_calls_stay() -> None:
+    instructions = ir_of(source)
+    assert called(eliminate_tail_calls('fib', instructions['fib'])).count('fib') == 2
+    assert eliminate_tail_calls('fib', instructions['fib']) == instructions['fib']
+
+def test_deep_tail_recursion_runs_in_constant_stack(tmp_path: Path) -> None:
+    process = run(ir_of(source, 1), os.path.join(tmp_path, 'program'))
+    assert process.returncode == 0
+    assert process.stdout.split('\n') == ['21', '55', str(10000000 * 10000001 // 2), '']
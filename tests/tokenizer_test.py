@@ -1,4 +1,8 @@
-from compiler.tokenizer import tokenize, Token, L, Location
+import io
+import mmap
+import os
+import tempfile
+from compiler.tokenizer import tokenize, tokenize_compact, tokenize_stream, Token, TokenBuffer, L, Location
 
 def test_tokenizer_basics() -> None:
     assert tokenize("test ") == [
@@ -6,9 +10,16 @@ def test_tokenizer_basics() -> None:
     ]
     
     assert tokenize("if  3\nwhile") == [
-        Token(type='identifier', text='if', loc=L),
+        Token(type='keyword', text='if', loc=L),
         Token(type='int_literal', text='3', loc=L),
-        Token(type='identifier', text='while', loc=L)
+        Token(type='keyword', text='while', loc=L)
+    ]
+
+    assert tokenize("iffy or not orange") == [
+        Token(type='identifier', text='iffy', loc=L),
+        Token(type='keyword', text='or', loc=L),
+        Token(type='keyword', text='not', loc=L),
+        Token(type='identifier', text='orange', loc=L)
     ]
 
     assert tokenize("-3+4") == [
@@ -50,4 +61,82 @@ def test_tokenizer_location() -> None:
         Token(type='identifier', text='jee', loc=Location(line=1, column=1)),
         Token(type='int_literal', text='3', loc=Location(line=1, column=5)),
         Token(type='operator', text='+', loc=Location(line=2, column=2))
-    ]
\ No newline at end of file
+    ]
+
+def test_tokenizer_comments_and_operators() -> None:
+    assert tokenize("a // b\n1/2 # c\nx>=y") == [
+        Token(type='identifier', text='a', loc=Location(line=1, column=1)),
+        Token(type='int_literal', text='1', loc=Location(line=2, column=1)),
+        Token(type='operator', text='/', loc=Location(line=2, column=2)),
+        Token(type='int_literal', text='2', loc=Location(line=2, column=3)),
+        Token(type='identifier', text='x', loc=Location(line=3, column=1)),
+        Token(type='operator', text='>=', loc=Location(line=3, column=2)),
+        Token(type='identifier', text='y', loc=Location(line=3, column=4)),
+    ]
+
+def test_tokenizer_invalid_token() -> None:
+    try:
+        tokenize("1 + $x")
+        assert False
+    except Exception as e:
+        assert str(e) == 'Invalid token near $x'
+
+
+stream_source = """var x = 10; // first line
+while x >= 1 do {
+    x = x - 1;   # second comment
+
+
+    print_int(x)
+}
+"""
+
+def test_tokenizer_stream_matches_tokenize() -> None:
+    expected = tokenize(stream_source)
+    for chunk_size in [1, 2, 3, 7, 64]:
+        streamed = list(tokenize_stream(io.StringIO(stream_source), chunk_size))
+        assert [(t.text, t.type, t.loc.line, t.loc.column) for t in streamed] \
+            == [(t.text, t.type, t.loc.line, t.loc.column) for t in expected]
+
+def test_tokenizer_stream_mmap() -> None:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'source.txt')
+        with open(path, 'w') as f:
+            f.write(stream_source)
+        with open(path, 'rb') as binary, mmap.mmap(binary.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            streamed = list(tokenize_stream(m, chunk_size=5))
+    assert [(t.text, t.type, t.loc.line, t.loc.column) for t in streamed] \
+        == [(t.text, t.type, t.loc.line, t.loc.column) for t in tokenize(stream_source)]
+
+def test_tokenizer_stream_invalid_token() -> None:
+    try:
+        list(tokenize_stream(io.StringIO("1 + !x"), chunk_size=5))
+        assert False
+    except Exception as e:
+        assert str(e) == 'Invalid token near !x'
+
+def test_token_buffer() -> None:
+    buffer = TokenBuffer(iter(tokenize("a + 1")))
+    assert buffer.peek() == Token(type='identifier', text='a', loc=L)
+    assert buffer.peek(1) == Token(type='operator', text='+', loc=L)
+    assert buffer.peek(-1).type == 'end'
+    buffer.advance()
+    buffer.advance()
+    assert buffer.peek(-1).text == '+'
+    assert buffer.peek(1).type == 'end'
+    buffer.advance()
+    assert buffer.peek() == Token(type='end', text='', loc=L)
+    assert (buffer.peek().loc.line, buffer.peek().loc.column) == (1, 5)
+
+def test_tokenizer_compact() -> None:
+    tokens = tokenize_compact(stream_source)
+    assert list(tokens) == tokenize(stream_source)
+    assert [(t.loc.line, t.loc.column) for t in tokens] \
+        == [(t.loc.line, t.loc.column) for t in tokenize(stream_source)]
+    assert tokens[-1] == Token(type='punctuation', text='}', loc=L)
+    assert (tokens[-1].loc.line, tokens[-1].loc.column) == (7, 1)
+    assert [(t.text, t.type, t.loc.line, t.loc.column) for t in tokens[1:3]] == [
+        ('x', 'identifier', 1, 5),
+        ('=', 'operator', 1, 7),
+    ]
+    assert tokens.nbytes() == len(tokens) * 17